@@ -138,3 +138,36 @@ DEFAULT_FROM_EMAIL = 'BudgetBuddy <rahulrajan232003@gmail.com>'  # Replace with
 
 # For development, you can use the console backend instead
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Scheduler dispatch
+# Due savings debits and recurring transactions are spread across a jitter
+# window and posted through a token bucket to avoid month-start write spikes.
+SCHEDULER_JITTER_WINDOW = 900  # seconds
+SCHEDULER_POSTINGS_PER_SECOND = 20  # 0 disables throttling
+SCHEDULER_BURST = 20
+
+# Live dashboard updates (Server-Sent Events)
+# Streams send a keepalive comment every SSE_HEARTBEAT_SECONDS and close after
+# SSE_MAX_DURATION_SECONDS; browsers reconnect and resume from the last event.
+SSE_HEARTBEAT_SECONDS = 20
+SSE_MAX_DURATION_SECONDS = 300
+
+# Caching
+# tracker.cache keeps per-user data under versioned keys in the cache named by
+# TRACKER_CACHE_ALIAS. The scheduler commands run in their own processes, so
+# the cache must be shared for their invalidations to reach the web server:
+# the default is a file cache on the local disk. Use Redis or Memcached when
+# the web server and scheduler run on different hosts, e.g.
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379/1',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+TRACKER_CACHE_ALIAS = 'default'
+TRACKER_CACHE_TIMEOUT = 60 * 60  # seconds
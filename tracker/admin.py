@@ -2,10 +2,12 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from .models import (
-    Transaction, ExpenseCategory, Expense, UserProfile,
-    Budget, SavingsGoal, RecurringTransaction,
-    TransactionNotification, Discussion, Comment
+    Transaction, ExpenseCategory, CategoryRule, Expense, UserProfile,
+    Budget, BudgetPeriodSpend, SavingsGoal, GoalContribution, RecurringTransaction,
+    TransactionNotification, Discussion, Comment, SchedulerRun, EmailOutbox,
+    LedgerEvent, ProjectionCheckpoint
 )
+from .journal import summarize_runs
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -33,6 +35,12 @@ class ExpenseCategoryAdmin(admin.ModelAdmin):
     search_fields = ('name', 'user__username')
     ordering = ('name',)
 
+class CategoryRuleAdmin(admin.ModelAdmin):
+    list_display = ('user', 'description_contains', 'min_amount', 'max_amount', 'category', 'priority', 'is_active')
+    list_filter = ('is_active', 'user')
+    search_fields = ('user__username', 'description_contains', 'category__name')
+    list_select_related = ('user', 'category')
+
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('transaction', 'category', 'get_amount', 'get_date', 'get_user')
     list_filter = ('category', 'transaction__date', 'transaction__user')
@@ -53,11 +61,15 @@ class ExpenseAdmin(admin.ModelAdmin):
     get_user.short_description = 'User'
 
 class BudgetAdmin(admin.ModelAdmin):
-    list_display = ('user', 'category', 'amount', 'start_date', 'end_date', 'is_active', 'get_spent', 'get_remaining')
+    list_display = ('user', 'category', 'amount', 'start_date', 'end_date', 'is_active', 'get_spent', 'get_remaining', 'forecast_spend')
     list_filter = ('is_active', 'start_date', 'end_date', 'user', 'category')
     search_fields = ('user__username', 'category__name')
     date_hierarchy = 'start_date'
     ordering = ('-created_at',)
+    list_select_related = ('user', 'category')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_spent()
 
     def get_spent(self, obj):
         return obj.spent
@@ -67,6 +79,33 @@ class BudgetAdmin(admin.ModelAdmin):
         return obj.remaining
     get_remaining.short_description = 'Remaining'
 
+class BudgetPeriodSpendAdmin(admin.ModelAdmin):
+    list_display = ('budget', 'period_start', 'spent', 'alert_level', 'updated_at')
+    list_filter = ('alert_level', 'period_start')
+    search_fields = ('budget__user__username', 'budget__category__name')
+    ordering = ('-period_start',)
+    list_select_related = ('budget__category',)
+    readonly_fields = ('updated_at',)
+
+class LedgerEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'entity', 'entity_id', 'action', 'created_at')
+    list_filter = ('entity', 'action', 'created_at')
+    search_fields = ('user__username',)
+    ordering = ('-id',)
+    list_select_related = ('user',)
+    readonly_fields = [field.name for field in LedgerEvent._meta.fields]
+
+    # The log is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class ProjectionCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_event_id', 'updated_at')
+    readonly_fields = ('gaps', 'updated_at')
+
 class SavingsGoalAdmin(admin.ModelAdmin):
     list_display = ('user', 'name', 'target_amount', 'current_amount', 'monthly_contribution', 
                    'start_date', 'target_date', 'completed', 'auto_debit_enabled', 'get_next_debit')
@@ -79,6 +118,14 @@ class SavingsGoalAdmin(admin.ModelAdmin):
         return obj.formatted_next_debit
     get_next_debit.short_description = 'Next Debit'
 
+class GoalContributionAdmin(admin.ModelAdmin):
+    list_display = ('goal', 'amount', 'date', 'source', 'transaction', 'created_at')
+    list_filter = ('source', 'date')
+    search_fields = ('goal__name', 'goal__user__username')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+    raw_id_fields = ('goal', 'transaction')
+
 class RecurringTransactionAdmin(admin.ModelAdmin):
     list_display = ('user', 'name', 'amount', 'transaction_type', 'frequency', 
                    'start_date', 'day_of_month', 'scheduled_time', 'is_active', 'last_processed')
@@ -87,12 +134,47 @@ class RecurringTransactionAdmin(admin.ModelAdmin):
     date_hierarchy = 'start_date'
     ordering = ('-created_at',)
 
+class SchedulerRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'started_at', 'duration', 'items_scanned', 'items_posted',
+                   'errors', 'queries', 'max_lag')
+    list_filter = ('job', 'started_at')
+    date_hierarchy = 'started_at'
+    ordering = ('-started_at',)
+    readonly_fields = [field.name for field in SchedulerRun._meta.fields]
+    percentile_window = 1000  # most recent runs per job included in the summary
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        # Percentiles of duration, lag and throughput over the latest runs of each job
+        summaries = []
+        for job, label in SchedulerRun.JOB_CHOICES:
+            runs = list(SchedulerRun.objects.filter(job=job).only(
+                'duration', 'items_posted', 'errors', 'max_lag'
+            )[:self.percentile_window])
+            if runs:
+                summaries.append({'job': label, **summarize_runs(runs)})
+        
+        extra_context = extra_context or {}
+        extra_context['scheduler_summaries'] = summaries
+        return super().changelist_view(request, extra_context=extra_context)
+
 class TransactionNotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'transaction', 'message', 'notification_type', 'is_read', 'created_at')
-    list_filter = ('notification_type', 'is_read', 'created_at', 'user')
-    search_fields = ('message', 'user__username', 'transaction__description')
+    list_filter = ('notification_type', 'template_code', 'is_read', 'created_at', 'user')
+    search_fields = ('user__username', 'transaction__description')
+    list_select_related = ('user', 'transaction')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject')
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
 
 class CommentInline(admin.TabularInline):
     model = Comment
@@ -124,10 +206,17 @@ admin.site.register(User, CustomUserAdmin)
 # Register all other models
 admin.site.register(Transaction, TransactionAdmin)
 admin.site.register(ExpenseCategory, ExpenseCategoryAdmin)
+admin.site.register(CategoryRule, CategoryRuleAdmin)
 admin.site.register(Expense, ExpenseAdmin)
 admin.site.register(Budget, BudgetAdmin)
+admin.site.register(BudgetPeriodSpend, BudgetPeriodSpendAdmin)
+admin.site.register(LedgerEvent, LedgerEventAdmin)
+admin.site.register(ProjectionCheckpoint, ProjectionCheckpointAdmin)
 admin.site.register(SavingsGoal, SavingsGoalAdmin)
+admin.site.register(GoalContribution, GoalContributionAdmin)
 admin.site.register(RecurringTransaction, RecurringTransactionAdmin)
 admin.site.register(TransactionNotification, TransactionNotificationAdmin)
+admin.site.register(SchedulerRun, SchedulerRunAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
 admin.site.register(Discussion, DiscussionAdmin)
 admin.site.register(Comment, CommentAdmin)
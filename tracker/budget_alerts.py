@@ -0,0 +1,181 @@
+"""Budget spend counters and threshold alerts, maintained at write time.
+
+Every budget has one BudgetPeriodSpend row per month holding its running
+spend. Signals on Expense and Transaction pass each change to
+record_expense_change as an (old, new) pair of contributions, and the amount
+moves between counters with F() updates. A counter is seeded from the
+aggregate the first time a budget is written to in a month (and again after
+the budget itself is edited). After that, an expense costs one counter
+update, never an aggregate scan.
+
+Alerts are raised by conditional UPDATEs on alert_level, so each threshold
+notifies once per period even when writes run concurrently. Lowering the
+spend below a threshold re-arms it.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Budget, BudgetPeriodSpend, Expense, Transaction, TransactionNotification
+
+ALERT_THRESHOLDS = (100, 80)  # percent of the budget amount, highest first
+ALERT_TEMPLATES = {
+    100: 'budget_exceeded',
+    80: 'budget_warning',
+}
+
+
+def contribution(user_id, category_id, day, amount):
+    """What an expense adds to its budgets: (user_id, category_id, date, amount), or None"""
+    if category_id is None:
+        return None
+    return (
+        user_id,
+        category_id,
+        Transaction._meta.get_field('date').to_python(day),
+        Transaction._meta.get_field('amount').to_python(amount),
+    )
+
+
+def stored_contribution(**lookup):
+    """Contribution of the expense matching lookup as it is in the database"""
+    row = Expense.objects.filter(**lookup).values_list(
+        'transaction__user_id', 'category_id', 'transaction__date', 'transaction__amount'
+    ).first()
+    return contribution(*row) if row else None
+
+
+def alert_level(spent, amount):
+    """Highest threshold the spend has reached"""
+    for level in ALERT_THRESHOLDS:
+        if spent >= _threshold(amount, level):
+            return level
+    return 0
+
+
+def _threshold(amount, level):
+    return amount * Decimal(level) / 100
+
+
+def _seed_counter(budget, period_start, day, delta):
+    """Create the month's counter from the aggregate; False if another writer got there first"""
+    spent = Budget.objects.with_spent(day).values_list('annotated_spent', flat=True).get(pk=budget.pk)
+    try:
+        with transaction.atomic():
+            BudgetPeriodSpend.objects.create(
+                budget=budget,
+                period_start=period_start,
+                spent=spent,
+                # Thresholds passed before this write were never going to alert now
+                alert_level=alert_level(spent - delta, budget.amount)
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def _raise_alert(budget, counters, transaction_obj):
+    for level in ALERT_THRESHOLDS:
+        claimed = counters.filter(
+            alert_level__lt=level,
+            spent__gte=_threshold(budget.amount, level)
+        ).update(alert_level=level)
+        if claimed:
+            spent = counters.values_list('spent', flat=True).get()
+            TransactionNotification.create_for(
+                transaction_obj,
+                ALERT_TEMPLATES[level],
+                category=budget.category.name,
+                budget=str(budget.amount),
+                spent=str(spent),
+                percentage=100 if budget.amount == 0 else int(spent * 100 / budget.amount)
+            )
+            return level
+    return 0
+
+
+def _rearm_alerts(budget, counters):
+    # Drop the alert level to the highest threshold still reached
+    for index, level in enumerate(ALERT_THRESHOLDS):
+        lower = ALERT_THRESHOLDS[index + 1] if index + 1 < len(ALERT_THRESHOLDS) else 0
+        counters.filter(
+            alert_level__gte=level,
+            spent__lt=_threshold(budget.amount, level)
+        ).update(alert_level=lower)
+
+
+def _update_counter(budget, period_start, day, delta, transaction_obj=None):
+    counters = BudgetPeriodSpend.objects.filter(budget=budget, period_start=period_start)
+    if not counters.update(spent=F('spent') + delta, updated_at=timezone.now()):
+        if not _seed_counter(budget, period_start, day, delta):
+            counters.update(spent=F('spent') + delta, updated_at=timezone.now())
+    if delta > 0 and transaction_obj is not None:
+        _raise_alert(budget, counters, transaction_obj)
+    elif delta < 0:
+        _rearm_alerts(budget, counters)
+
+
+def record_expense_change(old, new, transaction_obj=None):
+    """Move an expense's amount from the budget periods it counted in to the ones it counts in now.
+
+    old and new are contributions (see contribution()); either can be None
+    for a created or deleted expense. Alerts are raised against
+    transaction_obj when the change pushes a budget over a threshold.
+    """
+    if old == new:
+        return
+
+    # Net change per budget period, so an edit that stays in the same period is one update
+    deltas = {}
+    for change, sign in ((old, -1), (new, 1)):
+        if change is None:
+            continue
+        user_id, category_id, day, amount = change
+        for budget in Budget.objects.filter(
+            user_id=user_id,
+            category_id=category_id
+        ).active_on(day).select_related('category'):
+            entry = deltas.setdefault((budget.pk, day.replace(day=1)), [budget, day, 0])
+            entry[2] += sign * amount
+
+    with transaction.atomic():
+        for (_, period_start), (budget, day, delta) in deltas.items():
+            if delta:
+                _update_counter(budget, period_start, day, delta, transaction_obj)
+
+
+def reset_counters(budget):
+    """Forget a budget's counters so they are re-seeded after its amount or dates change"""
+    BudgetPeriodSpend.objects.filter(budget=budget).delete()
+
+
+def rebuild_counters(user_id, category_ids, months):
+    """Recompute the user's existing counters for the given categories and months from their expenses.
+
+    Used after bulk UPDATEs that move expenses without signals. Alert levels
+    are set to whatever the new spend has reached, without notifying, so
+    re-filing old expenses doesn't send alerts.
+    """
+    budgets = Budget.objects.filter(user_id=user_id, category_id__in=category_ids)
+    now = timezone.now()
+    rebuilt = 0
+    for month in months:
+        counters = list(
+            BudgetPeriodSpend.objects.filter(budget__in=budgets, period_start=month).select_related('budget')
+        )
+        if not counters:
+            continue
+        spent = dict(
+            Budget.objects.filter(
+                id__in=[counter.budget_id for counter in counters]
+            ).with_spent(month).values_list('id', 'annotated_spent')
+        )
+        for counter in counters:
+            counter.spent = spent[counter.budget_id]
+            counter.alert_level = alert_level(counter.spent, counter.budget.amount)
+            counter.updated_at = now
+        BudgetPeriodSpend.objects.bulk_update(counters, ['spent', 'alert_level', 'updated_at'])
+        rebuilt += len(counters)
+    return rebuilt
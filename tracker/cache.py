@@ -0,0 +1,193 @@
+"""Per-user versioned cache for expensive, user-specific data.
+
+Every cached value lives under a key namespaced by user and by the current
+version of a scope (the ledger-wide 'data' scope unless a caller picks its
+own). Signals bump a user's data version whenever one of their ledger rows is
+saved or deleted, which orphans all of their cached values at once without
+tracking individual keys. Code that changes ledger rows with bulk UPDATEs
+(which send no signals) must call bump_version itself.
+
+The backend is the cache alias named by TRACKER_CACHE_ALIAS, so it can be
+local memory, the file cache or a shared Memcached/Redis server. Hit, miss,
+set, eviction and invalidation counts are kept per process and periodically
+added to shared counters that the cache_stats command reports.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_TIMEOUT = 60 * 60  # seconds
+VERSION_KEY = 'tracker:{scope}:version:{user_id}'
+VALUE_KEY = 'tracker:u{user_id}:{scope}:v{version}:{name}'
+STATS_KEY = 'tracker:cache-stats:{counter}'
+STATS_COUNTERS = ('hits', 'misses', 'sets', 'evictions', 'invalidations')
+STATS_FLUSH_EVERY = 100  # events recorded locally before they are added to the shared counters
+RECENT_SETS_LIMIT = 10000  # keys remembered for spotting evictions
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'TRACKER_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'TRACKER_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+class CacheStats:
+    """Hit/miss/set/eviction/invalidation counters for this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(STATS_COUNTERS, 0)
+        self.unflushed = dict.fromkeys(STATS_COUNTERS, 0)
+        # Keys this process stored, with their expiry, so a premature miss
+        # can be told apart from a normal one and counted as an eviction
+        self.recent_sets = OrderedDict()
+
+    def record(self, counter):
+        with self.lock:
+            self.counts[counter] += 1
+            self.unflushed[counter] += 1
+            flush = sum(self.unflushed.values()) >= STATS_FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def remember_set(self, key, timeout):
+        expires_at = time.time() + timeout if timeout else None
+        with self.lock:
+            self.recent_sets[key] = expires_at
+            self.recent_sets.move_to_end(key)
+            while len(self.recent_sets) > RECENT_SETS_LIMIT:
+                self.recent_sets.popitem(last=False)
+
+    def was_evicted(self, key):
+        """True if the key was stored here and should not have expired yet"""
+        with self.lock:
+            if key not in self.recent_sets:
+                return False
+            expires_at = self.recent_sets.pop(key)
+        return expires_at is None or expires_at > time.time()
+
+    def flush(self):
+        """Add the locally recorded events to the shared counters"""
+        with self.lock:
+            pending = {counter: count for counter, count in self.unflushed.items() if count}
+            self.unflushed = dict.fromkeys(STATS_COUNTERS, 0)
+        cache = get_cache()
+        for counter, count in pending.items():
+            key = STATS_KEY.format(counter=counter)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, None):
+                    cache.incr(key, count)
+
+
+stats = CacheStats()
+
+
+def get_shared_stats():
+    """Counters accumulated by every process using the cache"""
+    stats.flush()
+    cache = get_cache()
+    values = cache.get_many([STATS_KEY.format(counter=counter) for counter in STATS_COUNTERS])
+    return {counter: values.get(STATS_KEY.format(counter=counter), 0) for counter in STATS_COUNTERS}
+
+
+def reset_shared_stats():
+    get_cache().delete_many([STATS_KEY.format(counter=counter) for counter in STATS_COUNTERS])
+
+
+def _initial_version():
+    # Versions start from the clock rather than 1, so a version lost with a
+    # restarted or cleared cache doesn't come back as one already handed out
+    # (in ETags, for instance) for different data
+    return time.time_ns() // 1000000
+
+
+def get_version(user_id, scope='data'):
+    """Current version of a user's scope"""
+    cache = get_cache()
+    key = VERSION_KEY.format(scope=scope, user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        initial = _initial_version()
+        cache.add(key, initial, None)
+        version = cache.get(key, initial)
+    return version
+
+
+async def aget_version(user_id, scope='data'):
+    cache = get_cache()
+    key = VERSION_KEY.format(scope=scope, user_id=user_id)
+    version = await cache.aget(key)
+    if version is None:
+        initial = _initial_version()
+        await cache.aadd(key, initial, None)
+        version = await cache.aget(key, initial)
+    return version
+
+
+def bump_version(user_id, scope='data'):
+    """Invalidate everything cached for the user under the scope"""
+    cache = get_cache()
+    key = VERSION_KEY.format(scope=scope, user_id=user_id)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        if not cache.add(key, version, None):
+            # Another process created it in the meantime
+            version = cache.incr(key)
+    stats.record('invalidations')
+    return version
+
+
+def user_key(user_id, name, *parts, scope='data'):
+    """Cache key for a value belonging to the user's current scope version"""
+    key = VALUE_KEY.format(user_id=user_id, scope=scope, version=get_version(user_id, scope), name=name)
+    if parts:
+        key += ':' + ':'.join(str(part) for part in parts)
+    return key
+
+
+def memoize(user_id, name, compute, *parts, timeout=None, scope='data'):
+    """Return the cached value for (user, name, parts), computing and storing it on a miss"""
+    cache = get_cache()
+    key = user_key(user_id, name, *parts, scope=scope)
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        stats.record('hits')
+        return value
+
+    stats.record('misses')
+    if stats.was_evicted(key):
+        stats.record('evictions')
+
+    value = compute()
+    timeout = get_timeout() if timeout is None else timeout
+    cache.set(key, value, timeout)
+    stats.remember_set(key, timeout)
+    stats.record('sets')
+    return value
+
+
+def cached_per_user(name, timeout=None, scope='data'):
+    """Decorator memoizing a function whose first argument is a user id.
+
+    The remaining positional arguments become part of the key, so they must
+    have stable string forms (ids, dates, short strings).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(user_id, *args):
+            return memoize(user_id, name, lambda: func(user_id, *args), *args, timeout=timeout, scope=scope)
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,170 @@
+"""Bulk recategorization of past expenses: category rules, category merges and auto-filing.
+
+All of them walk the user's history in id-ordered chunks. Each chunk costs
+one SELECT of expense ids plus set-based UPDATE ... WHERE id IN (...)
+statements for the expenses and their transactions' copy of the category.
+Rows never load into the ORM, and no per-row signals fire. Each chunk also
+records which categories and months it touched. At the end only those budget
+counters are rebuilt, and the user's cached data is invalidated once.
+"""
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+
+from . import categorizer
+from .budget_alerts import rebuild_counters
+from .events import bump_user_version
+from .fragments import invalidate_panel, panels_for_model
+from .models import Budget, BudgetPeriodSpend, CategoryRule, Expense, ExpenseCategory, Transaction
+
+RECATEGORIZE_CHUNK_SIZE = 2000
+
+
+class Recategorizer:
+    """Moves one user's expenses between categories in chunks and remembers what it changed"""
+
+    def __init__(self, user, chunk_size=RECATEGORIZE_CHUNK_SIZE, progress=None):
+        self.user_id = getattr(user, 'pk', user)
+        self.chunk_size = chunk_size
+        # Called with (moved, total) after every chunk
+        self.progress = progress
+        self.categories = set()
+        self.months = set()
+        self.moved = 0
+
+    def move(self, expenses, category):
+        """Put every expense in the queryset into category; returns how many changed"""
+        expenses = expenses.exclude(category=category)
+        total = expenses.count()
+        moved = 0
+        last_id = 0
+
+        while True:
+            rows = list(expenses.filter(id__gt=last_id).order_by('id').values_list('id', 'transaction_id')[:self.chunk_size])
+            if not rows:
+                break
+            ids, transaction_ids = zip(*rows)
+            last_id = ids[-1]
+
+            chunk = Expense.objects.filter(id__in=ids)
+            for category_id, month in chunk.annotate(
+                month=TruncMonth('transaction__date')
+            ).values_list('category_id', 'month').distinct():
+                self.categories.add(category_id)
+                self.months.add(month)
+            moved += chunk.update(category=category)
+            # Keep the transactions' copy of the category in step
+            Transaction.objects.filter(id__in=transaction_ids).update(category=category)
+
+            if self.progress:
+                self.progress(moved, total)
+
+        if moved:
+            self.categories.add(category.pk)
+        self.moved += moved
+        return moved
+
+    def finish(self):
+        """Rebuild the budget counters the moves touched and invalidate cached data; returns counters rebuilt"""
+        if not self.moved:
+            return 0
+        rebuilt = rebuild_counters(self.user_id, self.categories - {None}, self.months)
+
+        bump_user_version(self.user_id)
+        # The suggestion index learned from the old categories
+        categorizer.forget(self.user_id)
+        for panel in panels_for_model(Expense):
+            invalidate_panel(panel, self.user_id)
+        return rebuilt
+
+
+def apply_rules(user, rules=None, chunk_size=RECATEGORIZE_CHUNK_SIZE, progress=None):
+    """Apply category rules to all of the user's past expenses.
+
+    Rules default to the user's active ones. They run from lowest to highest
+    priority, so where several match, the highest priority's category is
+    the one that sticks. progress, if given, is called with (rule, moved,
+    total) after every chunk. Returns a list of (rule, moved) pairs.
+    """
+    if rules is None:
+        rules = CategoryRule.objects.filter(user=user, is_active=True)
+    rules = sorted(rules, key=lambda rule: (rule.priority, rule.id))
+
+    recategorizer = Recategorizer(user, chunk_size)
+    results = []
+    for rule in rules:
+        if progress:
+            recategorizer.progress = lambda moved, total, rule=rule: progress(rule, moved, total)
+        results.append((rule, recategorizer.move(rule.matching_expenses(), rule.category)))
+    recategorizer.finish()
+    return results
+
+
+def merge_categories(user, source, target, chunk_size=RECATEGORIZE_CHUNK_SIZE, progress=None):
+    """Move the user's expenses, budgets and rules from source to target, then remove source.
+
+    A budget on source is dropped if the user already budgets target,
+    otherwise it is moved across. A shared default source is hidden from the
+    user rather than deleted. Returns the number of expenses moved.
+    """
+    if source.pk == target.pk:
+        raise ValueError('Cannot merge a category into itself')
+
+    recategorizer = Recategorizer(user, chunk_size, progress)
+    moved = recategorizer.move(Expense.objects.filter(transaction__user=user, category=source), target)
+
+    with transaction.atomic():
+        source_budgets = Budget.objects.filter(user=user, category=source)
+        if Budget.objects.filter(user=user, category=target).exists():
+            source_budgets.delete()
+        else:
+            # Their counters held the source category's spend, so they are re-seeded
+            BudgetPeriodSpend.objects.filter(budget__in=source_budgets).delete()
+            source_budgets.update(category=target)
+        CategoryRule.objects.filter(user=user, category=source).update(category=target)
+
+        if source.is_default:
+            source.hidden_by.add(user)
+        else:
+            source.delete()
+
+    recategorizer.finish()
+    return moved
+
+
+def categorize_uncategorized(user, chunk_size=RECATEGORIZE_CHUNK_SIZE, progress=None):
+    """File the user's uncategorized expenses under the categories tracker.categorizer suggests.
+
+    Expenses without a convincing suggestion stay uncategorized. progress,
+    if given, is called with (scanned, filed) after every chunk. Returns
+    (scanned, filed).
+    """
+    user_id = getattr(user, 'pk', user)
+    uncategorized = Expense.objects.filter(transaction__user_id=user_id, category__isnull=True)
+    recategorizer = Recategorizer(user_id, chunk_size)
+    scanned = filed = 0
+    last_id = 0
+
+    while True:
+        rows = list(uncategorized.filter(id__gt=last_id).order_by('id').values_list(
+            'id', 'transaction__description', 'transaction__amount'
+        )[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        # One UPDATE per suggested category rather than one per expense
+        ids_by_category = {}
+        for expense_id, description, amount in rows:
+            category_id = categorizer.suggest_category(user_id, description, amount)
+            if category_id is not None:
+                ids_by_category.setdefault(category_id, []).append(expense_id)
+        categories = ExpenseCategory.objects.in_bulk(ids_by_category)
+        for category_id, ids in ids_by_category.items():
+            filed += recategorizer.move(Expense.objects.filter(id__in=ids), categories[category_id])
+
+        scanned += len(rows)
+        if progress:
+            progress(scanned, filed)
+
+    recategorizer.finish()
+    return scanned, filed
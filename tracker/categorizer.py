@@ -0,0 +1,225 @@
+"""Category suggestions for new expenses, learned from the user's past ones.
+
+Each user gets an in-memory index built from their categorized expenses
+with one query:
+
+* merchant prefixes: the first one and two significant words of a
+  description ("uber", "uber eats"), each mapped to category counts. The
+  longest known prefix wins when one category clearly dominates it;
+* tokens: every significant word mapped to category counts. Each word of a
+  new description votes with its category distribution.
+
+The user's category rules (see tracker.categorization) are checked before
+either index. A global index built the same way from expenses in the shared
+default categories, seeded with the default names themselves, answers when
+the user's own history has nothing to say. Its suggestions are mapped by
+name onto the categories the user can see.
+
+Indexes live in process memory for INDEX_TTL seconds. New expenses are
+learned into them as they are saved. Category, rule and bulk
+recategorization changes drop the user's index so that it is rebuilt.
+Suggesting is pure dictionary lookups, so bulk imports run at thousands of
+rows per second.
+"""
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from .models import CategoryRule, Expense, ExpenseCategory, Transaction
+
+INDEX_TTL = 15 * 60  # seconds
+MAX_CACHED_INDEXES = 1000
+USER_HISTORY_LIMIT = 20000  # most recent categorized expenses an index learns from
+GLOBAL_HISTORY_LIMIT = 50000
+MERCHANT_PREFIX_TOKENS = 2
+MERCHANT_MIN_SHARE = 0.6  # a prefix decides only when this share of its history agrees
+TOKEN_MIN_SCORE = 0.5
+
+# Digits are dropped with the rest of the punctuation: amounts, dates and reference numbers vary
+TOKEN_RE = re.compile(r'[a-z]+')
+STOPWORDS = {
+    'a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'my', 'of', 'on', 'the', 'to', 'via', 'with',
+    # Boilerplate added by the app and by bank exports
+    'recurring', 'expense', 'income', 'payment', 'paid', 'purchase', 'txn', 'ref', 'pos', 'upi',
+}
+
+
+def tokenize(description):
+    """Significant lower-case words of a description, in order"""
+    return [
+        token for token in TOKEN_RE.findall((description or '').lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class CategoryIndex:
+    """Merchant-prefix and token indexes over categorized descriptions"""
+
+    def __init__(self):
+        self.merchants = {}
+        self.tokens = {}
+        self.token_totals = Counter()
+        self.rules = []
+        # name -> id of every category the owner can pick (unused by the global index)
+        self.visible = {}
+        self.names = {}
+        self.built_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def learn(self, description, category_id):
+        tokens = tokenize(description)
+        if not tokens:
+            return
+        with self.lock:
+            for length in range(1, min(len(tokens), MERCHANT_PREFIX_TOKENS) + 1):
+                self.merchants.setdefault(' '.join(tokens[:length]), Counter())[category_id] += 1
+            for token in set(tokens):
+                self.tokens.setdefault(token, Counter())[category_id] += 1
+                self.token_totals[token] += 1
+
+    def _matching_rule(self, description, amount):
+        text = (description or '').lower()
+        for rule in self.rules:
+            if rule.description_contains and rule.description_contains.lower() not in text:
+                continue
+            if amount is not None and rule.min_amount is not None and amount < rule.min_amount:
+                continue
+            if amount is not None and rule.max_amount is not None and amount > rule.max_amount:
+                continue
+            if amount is None and (rule.min_amount is not None or rule.max_amount is not None):
+                continue
+            return rule.category_id
+        return None
+
+    def suggest(self, description, amount=None):
+        """Best category id for the description, or None when the history is not convincing"""
+        category_id = self._matching_rule(description, amount)
+        if category_id is not None:
+            return category_id
+
+        tokens = tokenize(description)
+        if not tokens:
+            return None
+
+        for length in range(min(len(tokens), MERCHANT_PREFIX_TOKENS), 0, -1):
+            counts = self.merchants.get(' '.join(tokens[:length]))
+            if counts:
+                category_id, count = counts.most_common(1)[0]
+                if count >= MERCHANT_MIN_SHARE * sum(counts.values()):
+                    return category_id
+                break
+
+        scores = Counter()
+        for token in set(tokens):
+            counts = self.tokens.get(token)
+            if counts:
+                total = self.token_totals[token]
+                for category_id, count in counts.items():
+                    scores[category_id] += count / total
+        if scores:
+            category_id, score = scores.most_common(1)[0]
+            if score >= TOKEN_MIN_SCORE:
+                return category_id
+        return None
+
+
+def build_user_index(user_id):
+    index = CategoryIndex()
+    for category in ExpenseCategory.objects.for_user(user_id):
+        index.visible[category.name] = category.id
+        index.names[category.id] = category.name
+    # Highest priority first, matching apply_rules where the highest priority wins
+    index.rules = list(
+        CategoryRule.objects.filter(user_id=user_id, is_active=True).order_by('-priority', '-id')
+    )
+    history = Transaction.objects.filter(
+        user_id=user_id,
+        category__isnull=False
+    ).order_by('-id').values_list('description', 'category_id')[:USER_HISTORY_LIMIT]
+    for description, category_id in history:
+        index.learn(description, category_id)
+    return index
+
+
+def build_global_index():
+    index = CategoryIndex()
+    for category in ExpenseCategory.objects.defaults():
+        index.names[category.id] = category.name
+        index.learn(category.name, category.id)
+    history = Transaction.objects.filter(
+        category__user__isnull=True
+    ).order_by('-id').values_list('description', 'category_id')[:GLOBAL_HISTORY_LIMIT]
+    for description, category_id in history:
+        index.learn(description, category_id)
+    return index
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+GLOBAL = 'global'
+
+
+def _get_index(key, build):
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and time.monotonic() - index.built_at < INDEX_TTL:
+            _indexes.move_to_end(key)
+            return index
+
+    index = build()
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def get_user_index(user_id):
+    return _get_index(user_id, lambda: build_user_index(user_id))
+
+
+def get_global_index():
+    return _get_index(GLOBAL, build_global_index)
+
+
+def forget(user_id):
+    """Drop the user's index so it is rebuilt on next use"""
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+def forget_all():
+    """Drop every loaded index, after a change to the shared default categories"""
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def learn(user_id, description, category_id):
+    """Teach an already loaded index about a newly categorized expense"""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is not None and category_id in index.names:
+        index.learn(description, category_id)
+
+
+def suggest_category(user_id, description, amount=None):
+    """Category id to file the user's expense under, or None"""
+    index = get_user_index(user_id)
+    category_id = index.suggest(description, amount)
+    if category_id is not None:
+        return category_id
+
+    global_index = get_global_index()
+    category_id = global_index.suggest(description)
+    if category_id is None:
+        return None
+    # The user may have hidden that default or replaced it with their own category of the same name
+    return index.visible.get(global_index.names[category_id])
+
+
+def file_expense(transaction_obj):
+    """Create the Expense row for an expense transaction in the suggested category"""
+    category_id = suggest_category(transaction_obj.user_id, transaction_obj.description, transaction_obj.amount)
+    return Expense.objects.create(transaction=transaction_obj, category_id=category_id)
@@ -0,0 +1,132 @@
+"""Daily and weekly notification digest emails.
+
+Users are processed in primary-key batches. Each batch costs a fixed number
+of grouped queries (notification totals, the latest notifications, and
+budgets with their month-to-date spend) no matter how many users it holds. The digest
+templates are loaded once per run, and the rendered emails go into the outbox
+with one bulk insert, for send_queued_emails to deliver over a single SMTP
+connection.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Budget, EmailOutbox, TransactionNotification, UserProfile
+
+DIGEST_PERIODS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(days=7),
+}
+DIGEST_RECENT_ITEMS = 5
+# Notifications that stand for a transaction of their own; budget alerts point
+# at the expense that crossed the threshold, so counting them would repeat it
+TRANSACTION_TEMPLATES = ('income_added', 'expense_added', 'recurring_posted', 'legacy')
+
+
+class DigestBuilder:
+    """Renders notification digests for batches of users"""
+
+    def __init__(self, period='daily', now=None):
+        self.period = period
+        self.now = now or timezone.now()
+        self.window_start = self.now - DIGEST_PERIODS[period]
+        self.today = timezone.localdate(self.now)
+        # Loaded once and reused for every digest in the run
+        self.html_template = get_template('tracker/email/digest.html')
+        self.text_template = get_template('tracker/email/digest.txt')
+
+    def recipients(self, after_id=0, limit=500):
+        """Next batch of users that can receive a digest, in primary-key order"""
+        return list(
+            User.objects.filter(
+                id__gt=after_id,
+                is_active=True,
+                userprofile__isnull=False
+            ).exclude(email='').order_by('id').only('id', 'username', 'email')[:limit]
+        )
+
+    def _pending_notifications(self, user_ids):
+        # Unread, inside the period and newer than the user's previous digest
+        return TransactionNotification.objects.filter(
+            Q(user__userprofile__last_digest_sent_at__isnull=True)
+            | Q(created_at__gt=F('user__userprofile__last_digest_sent_at')),
+            user_id__in=user_ids,
+            is_read=False,
+            created_at__gte=self.window_start,
+            created_at__lte=self.now
+        )
+
+    def build_batch(self, users):
+        """Return (user_id, unsaved EmailOutbox) pairs for the users that have something to report"""
+        user_ids = [user.id for user in users]
+        pending = self._pending_notifications(user_ids)
+
+        totals = {}
+        counted = Q(template_code__in=TRANSACTION_TEMPLATES)
+        for row in pending.order_by().values('user_id', 'notification_type').annotate(
+            count=Count('id', filter=counted),
+            total=Sum('transaction__amount', filter=counted)
+        ):
+            totals.setdefault(row['user_id'], {})[row['notification_type']] = row
+        if not totals:
+            return []
+
+        recent = {}
+        latest = pending.filter(user_id__in=list(totals)).select_related('transaction').annotate(
+            rank=Window(RowNumber(), partition_by=F('user_id'), order_by=F('created_at').desc())
+        ).filter(rank__lte=DIGEST_RECENT_ITEMS)
+        for notification in latest:
+            recent.setdefault(notification.user_id, []).append(notification)
+
+        budgets = {}
+        for budget in Budget.objects.filter(
+            user_id__in=list(totals)
+        ).active_on(self.today).select_related('category').with_spent(self.today):
+            budgets.setdefault(budget.user_id, []).append({
+                'category': budget.category.name,
+                'amount': budget.amount,
+                'spent': budget.spent,
+                'percentage_used': budget.percentage_used,
+            })
+
+        emails = []
+        for user in users:
+            if user.id not in totals:
+                continue
+            income = totals[user.id].get('income', {})
+            expense = totals[user.id].get('expense', {})
+            context = {
+                'user': user,
+                'period': self.period,
+                'income_count': income.get('count', 0),
+                'income_total': income.get('total') or 0,
+                'expense_count': expense.get('count', 0),
+                'expense_total': expense.get('total') or 0,
+                'notifications': sorted(recent.get(user.id, []), key=lambda n: n.created_at, reverse=True),
+                'budgets': budgets.get(user.id, []),
+            }
+            emails.append((user.id, EmailOutbox(
+                to_email=user.email,
+                subject=f"Your {self.period} BudgetBuddy summary",
+                body=self.text_template.render(context),
+                html_body=self.html_template.render(context)
+            )))
+        return emails
+
+    def queue_batch(self, users):
+        """Queue digests for a batch of users and stamp their profiles; returns the number queued"""
+        emails = self.build_batch(users)
+        if not emails:
+            return 0
+
+        with transaction.atomic():
+            EmailOutbox.objects.bulk_create([email for _, email in emails])
+            UserProfile.objects.filter(
+                user_id__in=[user_id for user_id, _ in emails]
+            ).update(last_digest_sent_at=self.now)
+        return len(emails)
@@ -0,0 +1,94 @@
+"""Spread scheduled postings out instead of firing them all at once.
+
+Savings goals default to a 00:00 debit time and recurring transactions to a
+00:00 scheduled time, so most scheduled work falls due in the same instant on
+the first of the month. This module gives every item a deterministic jitter
+inside a tolerance window and rate-limits postings with a token bucket, which
+keeps database write load flat at month boundaries.
+"""
+import hashlib
+import time as _time
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+
+DEFAULT_JITTER_WINDOW = 900  # seconds
+DEFAULT_POSTINGS_PER_SECOND = 20
+
+
+def get_jitter_window():
+    """Tolerance window (in seconds) that due items are spread across"""
+    return getattr(settings, 'SCHEDULER_JITTER_WINDOW', DEFAULT_JITTER_WINDOW)
+
+
+def jitter_offset(key, window=None):
+    """Return a stable offset in seconds within [0, window) for the given key"""
+    if window is None:
+        window = get_jitter_window()
+    window = int(window or 0)
+    if window <= 0:
+        return 0
+    digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % window
+
+
+def jittered_time(base_time, key, window=None):
+    """Shift a scheduled time of day by the item's jitter, capped at the end of the day"""
+    offset = jitter_offset(key, window)
+    if not offset:
+        return base_time
+    base = datetime.combine(date(2000, 1, 1), base_time)
+    shifted = base + timedelta(seconds=offset)
+    if shifted.date() != base.date():
+        return time(23, 59, 59)
+    return shifted.time()
+
+
+class TokenBucket:
+    """Token bucket limiting how many postings are made per second.
+
+    A rate of 0 (or None) disables throttling. The clock and sleep callables
+    can be swapped out so simulations don't have to wait in real time.
+    """
+
+    def __init__(self, rate, burst=None, clock=_time.monotonic, sleep=_time.sleep):
+        self.rate = float(rate or 0)
+        self.capacity = float(burst or max(self.rate, 1))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.last_refill = clock()
+        self.total_wait = 0.0
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """Take one token, sleeping until one is available. Returns the time waited."""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        self._refill()
+        if self.tokens < 1:
+            waited = (1 - self.tokens) / self.rate
+            self.sleep(waited)
+            self._refill()
+            # The sleep covered the deficit; don't spin on clock rounding
+            self.tokens = max(self.tokens, 1.0)
+
+        self.tokens -= 1
+        self.total_wait += waited
+        return waited
+
+
+def get_default_bucket():
+    """Build a token bucket from the SCHEDULER_* settings"""
+    return TokenBucket(
+        getattr(settings, 'SCHEDULER_POSTINGS_PER_SECOND', DEFAULT_POSTINGS_PER_SECOND),
+        burst=getattr(settings, 'SCHEDULER_BURST', None),
+    )
@@ -0,0 +1,63 @@
+"""Change notifications for connected dashboards.
+
+Every change to a user's ledger bumps their data version in tracker.cache.
+Server-Sent Events streams wait on an in-process wakeup and compare versions,
+so they only touch the database when something actually changed. Clients
+that can't use SSE poll the version endpoint instead, which is answered from
+the cache alone.
+
+Scheduler commands run in their own processes. Their version bumps reach
+the web server through the shared cache, so streams pick them up at the next
+heartbeat's version check.
+"""
+import asyncio
+import threading
+
+from .cache import aget_version, bump_version, get_version
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def get_user_version(user_id):
+    """Current data version for the user (seeded from a timestamp, see tracker.cache)"""
+    return get_version(user_id)
+
+
+async def aget_user_version(user_id):
+    return await aget_version(user_id)
+
+
+def bump_user_version(user_id):
+    """Record a change for the user and wake any streams waiting in this process"""
+    version = bump_version(user_id)
+    _wake_listeners(user_id)
+    return version
+
+
+def _wake_listeners(user_id):
+    with _listeners_lock:
+        listeners = list(_listeners.get(user_id, ()))
+    for loop, event in listeners:
+        loop.call_soon_threadsafe(event.set)
+
+
+async def wait_for_change(user_id, timeout):
+    """Wait until this process sees a change for the user, or the timeout expires"""
+    loop = asyncio.get_running_loop()
+    event = asyncio.Event()
+    listener = (loop, event)
+    with _listeners_lock:
+        _listeners.setdefault(user_id, set()).add(listener)
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        with _listeners_lock:
+            listeners = _listeners.get(user_id)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del _listeners[user_id]
@@ -0,0 +1,146 @@
+"""Month-end spend projections for budgets, computed in batches with NumPy.
+
+For a batch of budgets (from any number of users) two grouped queries load
+the daily spend of each budget's category for this month and for the
+previous HISTORY_MONTHS months. The rest is array arithmetic over one row per
+budget:
+
+* pace: spend to date plus the month's daily run rate over the remaining days
+  of the budget's window;
+* curve: spend to date divided by the share of a month's spend the category
+  has historically reached by this day of the month (only for budgets whose
+  window starts on the 1st, since the share assumes a whole month).
+
+The two are blended by how much of the window has elapsed, so early in the
+month the history counts most and the month's own pace takes over as it
+fills in. A projection never falls below what is already recorded for the
+month. Results are stored on the budgets by forecast_budgets, and views read
+them from the rows they already load.
+"""
+from decimal import Decimal
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from django.db.models import Sum
+from django.utils import timezone
+
+from .cache import bump_version
+from .fragments import invalidate_panel
+from .models import Budget, Transaction, month_bounds
+from .money import MINOR_PER_UNIT
+
+HISTORY_MONTHS = 3
+MIN_CURVE_SHARE = 0.1  # below this the historical curve says too little about the month total
+MAX_DAYS = 31
+
+
+def _daily_spend(budgets, start, end):
+    """Grouped daily spend in paise of the budgets' (user, category) pairs between start and end"""
+    return Transaction.objects.filter(
+        user_id__in={budget.user_id for budget in budgets},
+        category_id__in={budget.category_id for budget in budgets},
+        date__gte=start,
+        date__lte=end
+    ).values_list('user_id', 'category_id', 'date').annotate(
+        total=Sum('amount_minor')
+    ).order_by()
+
+
+class BudgetForecaster:
+    """Projects month-end spend for batches of budgets"""
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.today = timezone.localdate(self.now)
+        self.month_start, self.month_end = month_bounds(self.today)
+        self.history_start = self.month_start - relativedelta(months=HISTORY_MONTHS)
+
+    def forecast(self, budgets):
+        """Return one projected month-end spend (float) per budget, as an array"""
+        budgets = list(budgets)
+        if not budgets:
+            return np.zeros(0)
+
+        rows = {}
+        for index, budget in enumerate(budgets):
+            rows.setdefault((budget.user_id, budget.category_id), []).append(index)
+
+        # This month's spend in paise per budget per day, and the history per month per day
+        current = np.zeros((len(budgets), MAX_DAYS))
+        history = np.zeros((len(budgets), HISTORY_MONTHS, MAX_DAYS))
+        history_days = np.zeros(HISTORY_MONTHS, dtype=int)
+        for k in range(HISTORY_MONTHS):
+            month = self.history_start + relativedelta(months=k)
+            history_days[k] = (month_bounds(month)[1] - month).days + 1
+
+        for user_id, category_id, day, total in _daily_spend(budgets, self.history_start, self.month_end):
+            indexes = rows.get((user_id, category_id))
+            if not indexes:
+                continue
+            if day >= self.month_start:
+                current[indexes, day.day - 1] += total
+            else:
+                k = (day.year - self.history_start.year) * 12 + day.month - self.history_start.month
+                history[indexes, k, day.day - 1] += total
+
+        days = np.arange(MAX_DAYS)
+        today_index = self.today.day - 1
+        month_length = (self.month_end - self.month_start).days + 1
+
+        # Each budget's window inside this month, as day indexes
+        window_start = np.array([
+            max((budget.start_date - self.month_start).days, 0) for budget in budgets
+        ])
+        window_end = np.array([
+            min((budget.end_date - self.month_start).days, month_length - 1)
+            if budget.end_date else month_length - 1
+            for budget in budgets
+        ])
+        in_window = (days >= window_start[:, None]) & (days <= window_end[:, None])
+        current = np.where(in_window, current, 0.0)
+
+        recorded = current.sum(axis=1)
+        to_date = current[:, :today_index + 1].sum(axis=1)
+        elapsed = np.maximum(today_index - window_start + 1, 1)
+        remaining = np.maximum(window_end - today_index, 0)
+        window_length = np.maximum(window_end - window_start + 1, 1)
+
+        pace = to_date + to_date / elapsed * remaining
+
+        # Share of a month's spend reached by today's day of the month, over all history months
+        history_totals = history.sum(axis=2)
+        cutoff = np.minimum(today_index, history_days - 1)
+        reached = np.stack([
+            history[:, k, :cutoff[k] + 1].sum(axis=1) for k in range(HISTORY_MONTHS)
+        ], axis=1)
+        total = history_totals.sum(axis=1)
+        share = np.divide(reached.sum(axis=1), total, out=np.zeros_like(total), where=total > 0)
+        curve_valid = (share >= MIN_CURVE_SHARE) & (window_start == 0)
+        curve = np.divide(to_date, share, out=np.zeros_like(to_date), where=curve_valid)
+
+        weight = np.minimum(elapsed / window_length, 1.0)
+        projected = np.where(curve_valid, weight * pace + (1 - weight) * curve, pace)
+        return np.maximum(projected, recorded) / MINOR_PER_UNIT
+
+    def update(self, budgets):
+        """Forecast and store projections for the budgets; returns how many were updated"""
+        budgets = list(budgets)
+        if not budgets:
+            return 0
+        for budget, projected in zip(budgets, self.forecast(budgets)):
+            budget.forecast_spend = Decimal(f'{projected:.2f}')
+            budget.forecast_updated_at = self.now
+        Budget.objects.bulk_update(budgets, ['forecast_spend', 'forecast_updated_at'])
+
+        # bulk_update sends no signals, so cached budget data is invalidated here
+        for user_id in {budget.user_id for budget in budgets}:
+            bump_version(user_id)
+            invalidate_panel('recommendations', user_id)
+        return len(budgets)
+
+    def budgets_to_forecast(self, after_id=0, limit=500, user=None):
+        """Next batch of budgets active today, across all users, in primary-key order"""
+        budgets = Budget.objects.filter(id__gt=after_id).active_on(self.today)
+        if user is not None:
+            budgets = budgets.filter(user=user)
+        return list(budgets.order_by('id')[:limit])
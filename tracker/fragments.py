@@ -0,0 +1,118 @@
+"""Deferred dashboard panels.
+
+The recommendations, upcoming debits and pending recurring panels sit below
+the fold, so the dashboard shell renders without them and the browser fetches
+each one from its own endpoint. Rendered panels are cached per user through
+tracker.cache. Every panel has its own version scope, bumped by signals on the
+models it reads, and the current date is part of the key so date-relative
+panels roll over at midnight.
+"""
+from datetime import timedelta
+
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .cache import bump_version, memoize
+from .models import Budget, Expense, GoalContribution, RecurringTransaction, SavingsGoal, Transaction
+from .recommendations import FinancialRecommendationEngine
+
+PANEL_TIMEOUT = 60 * 60  # seconds
+
+
+def _recommendations_context(user, today):
+    recommendations = FinancialRecommendationEngine(user).analyze_financial_health()
+    # Only show high-confidence recommendations on dashboard
+    return {'recommendations': [r for r in recommendations if r['confidence'] >= 0.85][:3]}
+
+
+def _upcoming_debits_context(user, today):
+    upcoming_debits = []
+    goals = SavingsGoal.objects.filter(user=user, auto_debit_enabled=True, completed=False)
+    for goal in goals:
+        next_debit = goal.next_debit_date
+        if next_debit:
+            days_until = (next_debit - today).days
+            if 0 <= days_until <= 7:  # Show debits in next 7 days
+                upcoming_debits.append({
+                    'goal': goal,
+                    'date': next_debit,
+                    'days_until': days_until
+                })
+    upcoming_debits.sort(key=lambda debit: debit['date'])
+    return {'upcoming_debits': upcoming_debits}
+
+
+def _pending_recurring_context(user, today):
+    # Recurring transactions falling due today or tomorrow
+    tomorrow = today + timedelta(days=1)
+
+    upcoming_recurring = []
+    pending_transactions = []
+    recurring_transactions = RecurringTransaction.objects.filter(
+        user=user,
+        is_active=True,
+        day_of_month__in=[today.day, tomorrow.day]
+    )
+
+    for rt in recurring_transactions:
+        # Skip the ones already processed this month
+        if rt.last_processed and rt.last_processed.month == today.month:
+            continue
+        if rt.status == 'pending':
+            pending_transactions.append(rt)
+        else:
+            upcoming_recurring.append({
+                'name': rt.name,
+                'amount': rt.amount,
+                'type': rt.transaction_type,
+                'date': tomorrow if rt.day_of_month == tomorrow.day else today
+            })
+    return {
+        'upcoming_recurring': upcoming_recurring,
+        'pending_transactions': pending_transactions,
+    }
+
+
+# panel name -> (template, context builder, models whose changes invalidate it)
+PANELS = {
+    'recommendations': (
+        'tracker/includes/recommendations_panel.html',
+        _recommendations_context,
+        (Transaction, Expense, Budget, SavingsGoal),
+    ),
+    'upcoming_debits': (
+        'tracker/includes/upcoming_debits_panel.html',
+        _upcoming_debits_context,
+        # Contributions and debits move the goal with a queryset update, which sends no
+        # SavingsGoal signal; the GoalContribution row they create in the same transaction does
+        (SavingsGoal, GoalContribution),
+    ),
+    'pending_recurring': (
+        'tracker/includes/pending_recurring_panel.html',
+        _pending_recurring_context,
+        (RecurringTransaction,),
+    ),
+}
+
+
+def invalidate_panel(panel, user_id):
+    """Make the next request for the panel re-render it"""
+    bump_version(user_id, scope=f'panel:{panel}')
+
+
+def panels_for_model(model):
+    """Names of the panels that read the given model"""
+    return [name for name, (_, _, models) in PANELS.items() if model in models]
+
+
+def render_panel(panel, user):
+    """Rendered HTML for one panel, from the cache when nothing changed"""
+    template_name, build_context, _ = PANELS[panel]
+    today = timezone.now().date()
+    return memoize(
+        user.id, 'html',
+        lambda: render_to_string(template_name, build_context(user, today)),
+        today.isoformat(),
+        timeout=PANEL_TIMEOUT,
+        scope=f'panel:{panel}'
+    )
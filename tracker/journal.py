@@ -0,0 +1,123 @@
+"""Run journal for the scheduler jobs.
+
+Every batch invocation of the savings auto-debit and recurring transaction
+processors records one SchedulerRun row with its duration, how many items it
+scanned and posted, errors, the number of queries issued and the largest lag
+between an item falling due and actually being posted.
+"""
+import logging
+import math
+import time as _time
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import SchedulerRun
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerJournal:
+    """Context manager that measures one scheduler run and saves it on exit.
+
+    now is the run's clock reading at the start (defaults to the wall clock);
+    postings are timed against it advanced by the real time elapsed since.
+    """
+
+    def __init__(self, job, now=None):
+        self.job = job
+        self.now = now
+        self.items_scanned = 0
+        self.items_posted = 0
+        self.errors = 0
+        self.queries = 0
+        self.max_lag = None
+        self.run = None
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.started_at = timezone.now()
+        self._started = _time.perf_counter()
+        if self.now is None:
+            self.now = self.started_at
+        self._wrapper = connection.execute_wrapper(self._count_query)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._wrapper.__exit__(exc_type, exc, tb)
+        duration = _time.perf_counter() - self._started
+        if exc_type is not None:
+            self.errors += 1
+
+        try:
+            self.run = SchedulerRun.objects.create(
+                job=self.job,
+                started_at=self.started_at,
+                finished_at=timezone.now(),
+                duration=duration,
+                items_scanned=self.items_scanned,
+                items_posted=self.items_posted,
+                errors=self.errors,
+                queries=self.queries,
+                max_lag=self.max_lag,
+            )
+        except Exception as e:
+            # The journal must never break the run it is measuring
+            logger.error(f"Could not record {self.job} scheduler run: {str(e)}")
+        return False
+
+    def scanned(self, count=1):
+        self.items_scanned += count
+
+    def clock(self):
+        """The run's current time, including token-bucket waits and work done so far"""
+        return self.now + timedelta(seconds=_time.perf_counter() - self._started)
+
+    def posted(self, due_at=None, posted_at=None):
+        """Record a committed posting and how far behind its due time it happened (default: now)"""
+        self.items_posted += 1
+        if due_at is not None:
+            if posted_at is None:
+                posted_at = self.clock()
+            lag = max((posted_at - due_at).total_seconds(), 0.0)
+            if self.max_lag is None or lag > self.max_lag:
+                self.max_lag = lag
+
+    def error(self):
+        self.errors += 1
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)"""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize_runs(runs):
+    """Percentile summary of duration, lag and throughput for a list of runs"""
+    durations = [run.duration for run in runs]
+    lags = [run.max_lag for run in runs]
+    throughput = [run.items_posted / run.duration for run in runs if run.duration]
+    summary = {
+        'runs': len(runs),
+        'posted': sum(run.items_posted for run in runs),
+        'errors': sum(run.errors for run in runs),
+        'rows': [],
+    }
+    for label, values in (('Duration (s)', durations), ('Max lag (s)', lags), ('Postings/s', throughput)):
+        summary['rows'].append({
+            'label': label,
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': max((v for v in values if v is not None), default=None),
+        })
+    return summary
@@ -0,0 +1,143 @@
+"""Append-only ledger event log.
+
+Every change to a Transaction, SavingsGoal or GoalContribution appends one
+LedgerEvent. The event is written in the same database transaction as the
+change, so it exists exactly when the change committed. An event carries
+before and after snapshots of the fields projections read, as plain JSON
+(amounts in paise, dates in ISO format). Saves that leave the snapshot
+unchanged append nothing.
+
+Saves and deletes are recorded by signals. The one bulk UPDATE that moves a
+snapshot field, add_contribution's F() increment of a goal's current_amount,
+records its event explicitly. The other bulk UPDATEs only touch the
+transaction category copy and amount_minor, which no snapshot includes.
+
+Rows that predate the log get a 'backfilled' event from backfill(). It
+holds the state the row had when the log started.
+"""
+from django.db.models import Min
+
+from .models import GoalContribution, LedgerEvent, SavingsGoal, Transaction
+from .money import to_minor
+
+BACKFILL_BATCH_SIZE = 2000
+
+ENTITIES = {
+    Transaction: 'transaction',
+    SavingsGoal: 'goal',
+    GoalContribution: 'contribution',
+}
+
+
+def _iso_date(model, value):
+    # Views assign raw form strings to date fields, so normalise through the field
+    return model._meta.get_field('date').to_python(value).isoformat()
+
+
+def snapshot(instance):
+    """The projected fields of a row, as stored in an event"""
+    if isinstance(instance, Transaction):
+        return {
+            'type': instance.transaction_type,
+            'amount': to_minor(instance.amount),
+            'date': _iso_date(Transaction, instance.date),
+        }
+    if isinstance(instance, SavingsGoal):
+        return {'amount': to_minor(instance.current_amount)}
+    return {
+        'goal_id': instance.goal_id,
+        'amount': to_minor(instance.amount),
+        'date': _iso_date(GoalContribution, instance.date),
+    }
+
+
+def stored_snapshot(model, pk):
+    """Snapshot of the row as it is in the database, or None if it doesn't exist"""
+    instance = model.objects.filter(pk=pk).first()
+    return snapshot(instance) if instance else None
+
+
+def _owner_id(instance):
+    if isinstance(instance, GoalContribution):
+        return instance.goal.user_id
+    return instance.user_id
+
+
+def record(instance, action, before, after):
+    """Append an event for a change to instance; returns it, or None when nothing projected changed"""
+    if before == after:
+        return None
+    return LedgerEvent.objects.create(
+        user_id=_owner_id(instance),
+        entity=ENTITIES[type(instance)],
+        entity_id=instance.pk,
+        action=action,
+        before=before,
+        after=after
+    )
+
+
+def record_goal_amount(goal, added, after_amount):
+    """Append the event for a bulk increment of a goal's current_amount by added"""
+    after = to_minor(after_amount)
+    return record(goal, 'updated', {'amount': after - to_minor(added)}, {'amount': after})
+
+
+def _initial_states(entity):
+    """entity_id -> (user_id, state when the log started) for rows the log has seen change"""
+    events = LedgerEvent.objects.filter(entity=entity)
+    started = set(events.filter(action__in=('created', 'backfilled')).values_list('entity_id', flat=True))
+    first_ids = events.exclude(entity_id__in=started).values('entity_id').annotate(first_id=Min('id')).values('first_id')
+    return started, {
+        entity_id: (user_id, before)
+        for entity_id, user_id, before in LedgerEvent.objects.filter(id__in=first_ids).values_list(
+            'entity_id', 'user_id', 'before'
+        )
+    }
+
+
+def backfill(batch_size=BACKFILL_BATCH_SIZE, progress=None):
+    """Append a 'backfilled' event for every row whose history started before the log.
+
+    Rows the log has seen change get the 'before' of their first event.
+    Untouched rows get their current state. progress, if given, is called
+    with the running count after every batch. Returns the number of events
+    appended.
+    """
+    appended = 0
+    for model, entity in ENTITIES.items():
+        started, touched = _initial_states(entity)
+
+        events = [
+            LedgerEvent(user_id=user_id, entity=entity, entity_id=entity_id, action='backfilled', after=before)
+            for entity_id, (user_id, before) in touched.items()
+            if before is not None
+        ]
+        for start in range(0, len(events), batch_size):
+            appended += len(LedgerEvent.objects.bulk_create(events[start:start + batch_size]))
+            if progress:
+                progress(appended)
+
+        rows = model.objects.order_by('id')
+        if model is GoalContribution:
+            rows = rows.select_related('goal')
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            appended += len(LedgerEvent.objects.bulk_create([
+                LedgerEvent(
+                    user_id=_owner_id(instance),
+                    entity=entity,
+                    entity_id=instance.pk,
+                    action='backfilled',
+                    after=snapshot(instance)
+                )
+                for instance in batch
+                if instance.pk not in started and instance.pk not in touched
+            ]))
+            if progress:
+                progress(appended)
+    return appended
@@ -0,0 +1,248 @@
+import calendar
+import random
+import time as _time
+import tracemalloc
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from math import ceil
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from tracker.dispatch import TokenBucket
+from tracker.models import GoalContribution, RecurringTransaction, SavingsGoal, Transaction
+from tracker.tasks import check_scheduled_debits, process_recurring_transactions
+
+
+class QueryCounter:
+    """Database execute wrapper that counts the queries issued"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class SimulatedClock:
+    """Monotonic clock the token bucket sleeps against without waiting in real time"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the savings debit and recurring transaction schedulers with a simulated clock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Number of synthetic users')
+        parser.add_argument('--goals-per-user', type=int, default=2)
+        parser.add_argument('--recurring-per-user', type=int, default=3)
+        parser.add_argument('--months', type=int, default=12, help='Months of ticks to simulate')
+        parser.add_argument('--ticks-per-day', type=int, default=4,
+                            help='Scheduler runs per simulated day (an extra run always happens at 23:59:59)')
+        parser.add_argument('--start', default='2025-01-01', help='First simulated day (YYYY-MM-DD)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Token bucket postings per second, applied to the simulated clock (0 disables)')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data instead of rolling back')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date().replace(day=1)
+        except ValueError:
+            raise CommandError('--start must be a date in YYYY-MM-DD format')
+        if options['months'] < 1 or options['ticks_per_day'] < 1:
+            raise CommandError('--months and --ticks-per-day must be at least 1')
+
+        end = start + relativedelta(months=options['months'])
+        rng = random.Random(options['seed'])
+
+        # The engines scan every active goal and recurring transaction, so real
+        # data would be posted against the simulated clock
+        if (SavingsGoal.objects.filter(completed=False, auto_debit_enabled=True).exists()
+                or RecurringTransaction.objects.filter(is_active=True).exists()):
+            raise CommandError(
+                'Run the scheduler benchmark against an empty database; '
+                'active goals or recurring transactions already exist.'
+            )
+
+        with transaction.atomic():
+            users, goals, recurring = self._generate(rng, start, options)
+            self.stdout.write(
+                f"Generated {len(users)} users, {len(goals)} goals and {len(recurring)} recurring transactions"
+            )
+
+            expected_debits, expected_debit_total = self._expected_debits(goals, start, end)
+            expected_recurring, expected_recurring_total = self._expected_recurring(recurring, start, end)
+
+            stats = self._simulate(start, end, options)
+
+            actual_debits = GoalContribution.objects.filter(goal__user__in=users)
+            actual_debit_total = actual_debits.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+            actual_recurring = Transaction.objects.filter(
+                user__in=users,
+                description__startswith='Recurring '
+            )
+            actual_recurring_total = actual_recurring.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+            actual_debit_count = actual_debits.count()
+            actual_recurring_count = actual_recurring.count()
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        postings = stats['debits'] + stats['recurring']
+        elapsed = stats['elapsed']
+
+        self.stdout.write(f"Simulated {options['months']} months ({stats['ticks']} ticks) in {elapsed:.2f}s")
+        self.stdout.write(f"Savings debits posted: {stats['debits']} (expected {expected_debits})")
+        self.stdout.write(f"Recurring postings: {stats['recurring']} (expected {expected_recurring})")
+        self.stdout.write(f"Postings per second: {postings / elapsed if elapsed else 0:.1f}")
+        self.stdout.write(f"Queries issued: {stats['queries']} ({stats['queries'] / postings if postings else 0:.2f} per posting)")
+        self.stdout.write(f"Peak traced memory: {stats['peak_memory'] / (1024 * 1024):.2f} MiB")
+        if options['rate']:
+            self.stdout.write(f"Simulated throttle time: {stats['throttle_wait']:.1f}s at {options['rate']:g} postings/s")
+
+        mismatches = []
+        if stats['debits'] != expected_debits or actual_debit_count != expected_debits:
+            mismatches.append(f"savings debits: got {actual_debit_count}, expected {expected_debits}")
+        if actual_debit_total != expected_debit_total:
+            mismatches.append(f"savings debit total: got ₹{actual_debit_total}, expected ₹{expected_debit_total}")
+        if stats['recurring'] != expected_recurring or actual_recurring_count != expected_recurring:
+            mismatches.append(f"recurring postings: got {actual_recurring_count}, expected {expected_recurring}")
+        if actual_recurring_total != expected_recurring_total:
+            mismatches.append(f"recurring total: got ₹{actual_recurring_total}, expected ₹{expected_recurring_total}")
+
+        if mismatches:
+            raise CommandError('Scheduler totals do not match: ' + '; '.join(mismatches))
+
+        self.stdout.write(self.style.SUCCESS('All scheduler totals match the expected counts'))
+
+    def _generate(self, rng, start, options):
+        """Create synthetic users, goals and recurring transactions"""
+        prefix = f"bench_{options['seed']}_"
+
+        User.objects.bulk_create([
+            User(username=f"{prefix}{i}", password='!')
+            for i in range(options['users'])
+        ])
+        users = list(User.objects.filter(username__startswith=prefix).order_by('id'))
+
+        # Most items keep the midnight defaults to reproduce the day-1 herd
+        def pick_time():
+            if rng.random() < 0.6:
+                return time(0, 0)
+            return time(rng.randrange(24), rng.choice([0, 15, 30, 45]))
+
+        goals = []
+        recurring = []
+        for user in users:
+            for _ in range(options['goals_per_user']):
+                contribution = Decimal(rng.randrange(5, 200) * 50)
+                goals.append(SavingsGoal(
+                    user=user,
+                    name=f"Goal {len(goals)}",
+                    target_amount=contribution * rng.randrange(3, 24),
+                    monthly_contribution=contribution,
+                    debit_day=rng.randint(1, 31),
+                    debit_time=pick_time(),
+                ))
+            for _ in range(options['recurring_per_user']):
+                recurring.append(RecurringTransaction(
+                    user=user,
+                    name=f"Recurring {len(recurring)}",
+                    amount=Decimal(rng.randrange(1, 500) * 10),
+                    transaction_type=rng.choice(['income', 'expense']),
+                    frequency=rng.choice(['monthly', 'monthly', 'quarterly', 'yearly']),
+                    start_date=start - timedelta(days=rng.randrange(0, 400)),
+                    day_of_month=rng.randint(1, 31),
+                    scheduled_time=pick_time(),
+                ))
+
+        SavingsGoal.objects.bulk_create(goals)
+        RecurringTransaction.objects.bulk_create(recurring)
+
+        goals = list(SavingsGoal.objects.filter(user__in=users))
+        recurring = list(RecurringTransaction.objects.filter(user__in=users))
+        return users, goals, recurring
+
+    def _month_starts(self, start, end):
+        month = start
+        while month < end:
+            yield month
+            month += relativedelta(months=1)
+
+    def _expected_debits(self, goals, start, end):
+        """Each goal is debited once a month until its target is reached"""
+        months = len(list(self._month_starts(start, end)))
+        count = 0
+        total = Decimal('0')
+        for goal in goals:
+            debits = min(months, ceil(goal.target_amount / goal.monthly_contribution))
+            count += debits
+            total += goal.monthly_contribution * debits
+        return count, total
+
+    def _expected_recurring(self, recurring, start, end):
+        """Count postings from the documented schedule rules, independent of the engine"""
+        count = 0
+        total = Decimal('0')
+        for month in self._month_starts(start, end):
+            days_in_month = calendar.monthrange(month.year, month.month)[1]
+            for rt in recurring:
+                # Days past the end of a short month post on its last day
+                if rt.start_date > month.replace(day=min(rt.day_of_month, days_in_month)):
+                    continue
+                months_since_start = (month.year - rt.start_date.year) * 12 + month.month - rt.start_date.month
+                if rt.frequency == 'quarterly' and months_since_start % 3 != 0:
+                    continue
+                if rt.frequency == 'yearly' and month.month != rt.start_date.month:
+                    continue
+                count += 1
+                total += rt.amount
+        return count, total
+
+    def _simulate(self, start, end, options):
+        """Tick both engines through every simulated day with an injected clock"""
+        tick_seconds = 86400 // options['ticks_per_day']
+        tick_times = [
+            time(seconds // 3600, (seconds % 3600) // 60)
+            for seconds in range(0, 86400, tick_seconds)
+        ]
+        tick_times.append(time(23, 59, 59))
+
+        clock = SimulatedClock()
+        bucket = TokenBucket(options['rate'], clock=clock, sleep=clock.sleep)
+        counter = QueryCounter()
+        stats = {'debits': 0, 'recurring': 0, 'ticks': 0}
+
+        tracemalloc.start()
+        started = _time.perf_counter()
+        with connection.execute_wrapper(counter):
+            day = start
+            while day < end:
+                for tick_time in tick_times:
+                    now = timezone.make_aware(datetime.combine(day, tick_time), timezone.get_current_timezone())
+                    debits, _ = check_scheduled_debits(bucket=bucket, now=now)
+                    stats['debits'] += debits
+                    stats['recurring'] += process_recurring_transactions(bucket=bucket, now=now)
+                    stats['ticks'] += 1
+                day += timedelta(days=1)
+        stats['elapsed'] = _time.perf_counter() - started
+        _, stats['peak_memory'] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats['queries'] = counter.count
+        stats['throttle_wait'] = bucket.total_wait
+        return stats
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from tracker.cache import get_shared_stats, reset_shared_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit, miss, eviction and invalidation counts for the per-user cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = get_shared_stats()
+        lookups = stats['hits'] + stats['misses']
+
+        for counter, value in stats.items():
+            self.stdout.write(f"{counter.capitalize()}: {value}")
+        self.stdout.write(f"Hit ratio: {stats['hits'] / lookups * 100 if lookups else 0:.1f}%")
+
+        if options['reset']:
+            reset_shared_stats()
+            self.stdout.write(self.style.SUCCESS('Cache statistics reset'))
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.categorization import RECATEGORIZE_CHUNK_SIZE, categorize_uncategorized
+from tracker.models import Expense
+
+
+class Command(BaseCommand):
+    help = 'File uncategorized expenses under the categories suggested by their descriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only categorize this user\'s expenses')
+        parser.add_argument('--chunk-size', type=int, default=RECATEGORIZE_CHUNK_SIZE,
+                            help='Expenses suggested and updated per chunk')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['user']:
+            try:
+                user_ids = [User.objects.get(username=options['user']).pk]
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+        else:
+            user_ids = list(
+                Expense.objects.filter(category__isnull=True).values_list(
+                    'transaction__user_id', flat=True
+                ).distinct().order_by('transaction__user_id')
+            )
+
+        started = time.perf_counter()
+        total_scanned = total_filed = 0
+        for user_id in user_ids:
+            scanned, filed = categorize_uncategorized(user_id, chunk_size=options['chunk_size'])
+            self.stdout.write(f"  user {user_id}: filed {filed} of {scanned} uncategorized expenses")
+            total_scanned += scanned
+            total_filed += filed
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Expenses per second: {total_scanned / elapsed if elapsed else 0:.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully categorized {total_filed} of {total_scanned} expenses in {elapsed:.2f}s"
+        ))
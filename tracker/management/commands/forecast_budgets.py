@@ -0,0 +1,41 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.forecasting import BudgetForecaster
+
+
+class Command(BaseCommand):
+    help = 'Project month-end spend for every active budget (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Budgets forecast per batch of queries')
+        parser.add_argument('--user', help='Only forecast budgets of this username')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+
+        forecaster = BudgetForecaster()
+        started = time.perf_counter()
+        updated = 0
+        last_id = 0
+
+        while True:
+            budgets = forecaster.budgets_to_forecast(after_id=last_id, limit=options['batch_size'], user=user)
+            if not budgets:
+                break
+            last_id = budgets[-1].id
+            updated += forecaster.update(budgets)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Budgets per second: {updated / elapsed if elapsed else 0:.1f}")
+        self.stdout.write(self.style.SUCCESS(f"Successfully forecast {updated} budgets for {forecaster.today:%B %Y}"))
@@ -0,0 +1,72 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from tracker.models import TransactionNotification
+
+
+class Command(BaseCommand):
+    help = 'Delete (and optionally archive) read notifications older than a number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Keep read notifications newer than this many days')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--archive', help='Append the deleted rows to this JSON Lines file first')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be removed')
+        parser.add_argument('--recount', action='store_true', help='Rebuild every unread counter afterwards')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--days must be zero or more and --chunk-size at least 1')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = TransactionNotification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} read notifications older than {options['days']} days would be removed")
+            return
+
+        archive = open(options['archive'], 'a', encoding='utf-8') if options['archive'] else None
+        deleted = 0
+        try:
+            # Walk the table by primary key in short transactions so the
+            # prune never holds long locks on a busy notification table
+            while True:
+                with transaction.atomic():
+                    rows = list(
+                        expired.select_related('transaction').order_by('id')[:options['chunk_size']]
+                    )
+                    if not rows:
+                        break
+
+                    if archive:
+                        for row in rows:
+                            # The message is rendered from the transaction, which may not outlive the archive
+                            archive.write(json.dumps({
+                                'id': row.id,
+                                'user_id': row.user_id,
+                                'transaction_id': row.transaction_id,
+                                'template_code': row.template_code,
+                                'params': row.params,
+                                'message': row.message,
+                                'notification_type': row.notification_type,
+                                'created_at': row.created_at,
+                            }, cls=DjangoJSONEncoder) + '\n')
+                        archive.flush()
+
+                    TransactionNotification.objects.filter(id__in=[row.id for row in rows]).delete()
+                    deleted += len(rows)
+                self.stdout.write(f"Removed {deleted} notifications so far")
+        finally:
+            if archive:
+                archive.close()
+
+        if options['recount']:
+            profiles = TransactionNotification.recount_unread()
+            self.stdout.write(f"Recounted unread notifications for {profiles} profiles")
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully pruned {deleted} read notifications"))
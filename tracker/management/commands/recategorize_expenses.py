@@ -0,0 +1,56 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.categorization import RECATEGORIZE_CHUNK_SIZE, apply_rules, merge_categories
+from tracker.models import ExpenseCategory
+
+
+class Command(BaseCommand):
+    help = "Re-file a user's past expenses by applying their category rules, or merge one category into another"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--merge', nargs=2, type=int, metavar=('SOURCE_ID', 'TARGET_ID'),
+                            help='Merge the source category into the target instead of applying rules')
+        parser.add_argument('--chunk-size', type=int, default=RECATEGORIZE_CHUNK_SIZE,
+                            help='Expenses updated per UPDATE statement')
+
+    def report(self, label, moved, total):
+        self.stdout.write(f"  {label}: {moved}/{total}")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} not found")
+
+        started = time.perf_counter()
+        if options['merge']:
+            categories = ExpenseCategory.objects.for_user(user)
+            try:
+                source, target = (categories.get(id=category_id) for category_id in options['merge'])
+            except ExpenseCategory.DoesNotExist:
+                raise CommandError('Both categories must be visible to the user')
+            try:
+                moved = merge_categories(
+                    user, source, target,
+                    chunk_size=options['chunk_size'],
+                    progress=lambda done, total: self.report(f'{source.name} → {target.name}', done, total)
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            results = apply_rules(
+                user,
+                chunk_size=options['chunk_size'],
+                progress=lambda rule, done, total: self.report(rule, done, total)
+            )
+            moved = sum(count for _, count in results)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Expenses per second: {moved / elapsed if elapsed else 0:.1f}")
+        self.stdout.write(self.style.SUCCESS(f"Successfully recategorized {moved} expenses in {elapsed:.2f}s"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import ledger
+from tracker.projections import EVENT_BATCH_SIZE, PROJECTIONS, ProjectionRunner
+
+
+class Command(BaseCommand):
+    help = 'Fold new ledger events into the balance, monthly rollup and goal total projections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Empty the projections and replay the whole event log')
+        parser.add_argument('--backfill', action='store_true',
+                            help='First log rows that predate the event log')
+        parser.add_argument('--projection', action='append', choices=[p.name for p in PROJECTIONS],
+                            help='Only run this projection (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=EVENT_BATCH_SIZE,
+                            help='Events folded per database transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        if options['backfill']:
+            appended = ledger.backfill()
+            self.stdout.write(f"Backfilled {appended} events for rows that predate the log")
+
+        projections = PROJECTIONS
+        if options['projection']:
+            projections = [p for p in PROJECTIONS if p.name in options['projection']]
+        runner = ProjectionRunner(projections, batch_size=options['batch_size'])
+
+        started = time.perf_counter()
+        applied = runner.rebuild() if options['rebuild'] else runner.run()
+        elapsed = time.perf_counter() - started
+
+        for name, count in applied.items():
+            self.stdout.write(f"  {name}: {count} events")
+        total = sum(applied.values())
+        self.stdout.write(f"Events per second: {total / elapsed if elapsed else 0:.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully {'rebuilt' if options['rebuild'] else 'updated'} {len(applied)} projections "
+            f"from {total} events in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.digests import DIGEST_PERIODS, DigestBuilder
+
+
+class Command(BaseCommand):
+    help = 'Queue daily or weekly digest emails summarising unread notifications and budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=sorted(DIGEST_PERIODS), default='daily')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users summarised per batch of queries')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        builder = DigestBuilder(period=options['period'])
+        started = time.perf_counter()
+        users_scanned = queued = 0
+        last_id = 0
+
+        while True:
+            users = builder.recipients(after_id=last_id, limit=options['batch_size'])
+            if not users:
+                break
+            last_id = users[-1].id
+            users_scanned += len(users)
+            queued += builder.queue_batch(users)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Scanned {users_scanned} users in {elapsed:.2f}s")
+        self.stdout.write(f"Digests per second: {queued / elapsed if elapsed else 0:.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully queued {queued} {options['period']} digests; run send_queued_emails to deliver them"
+        ))
@@ -1,50 +1,64 @@
-from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from tracker.models import ExpenseCategory
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tracker.models import Budget, CategoryRule, Expense, ExpenseCategory, Transaction
+
 
 class Command(BaseCommand):
-    help = 'Updates existing users with new default categories'
-
-    def handle(self, *args, **kwargs):
-        # Define the new default categories
-        default_categories = [
-            'Food & Dining',
-            'Transportation',
-            'Housing',
-            'Entertainment',
-            'Utilities',
-            'Healthcare',
-            'Education',
-            'Shopping',
-            'Personal Care',
-            'Gifts & Donations',
-            'Travel',
-            'Insurance',
-            'Investments',
-            'Debt Payments',
-            'Other'
-        ]
-
-        # Get all users
-        users = User.objects.all()
-        updated_count = 0
-
-        for user in users:
-            # Get existing categories for this user
-            existing_categories = set(ExpenseCategory.objects.filter(user=user).values_list('name', flat=True))
-            
-            # Add missing categories
-            for category_name in default_categories:
-                if category_name not in existing_categories:
-                    ExpenseCategory.objects.create(
-                        name=category_name,
-                        user=user
-                    )
-                    updated_count += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(f'Added category "{category_name}" for user "{user.username}"')
-                    )
+    help = 'Folds per-user copies of the default categories into the shared default catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users processed per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        defaults = {category.name: category for category in ExpenseCategory.objects.defaults()}
+        if not defaults:
+            raise CommandError('No default categories found; run migrate first')
+        Hidden = ExpenseCategory.hidden_by.through
+
+        users_updated = folded = hidden = 0
+        last_id = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            copies = ExpenseCategory.objects.filter(user_id__in=user_ids, name__in=defaults)
+            copied = {}
+            for user_id, name in copies.values_list('user_id', 'name'):
+                copied.setdefault(user_id, set()).add(name)
+            if not copied:
+                continue
+
+            with transaction.atomic():
+                # Defaults a user had deleted from their copied set stay out of their list
+                created = Hidden.objects.bulk_create([
+                    Hidden(expensecategory_id=category.id, user_id=user_id)
+                    for user_id, names in copied.items()
+                    for name, category in defaults.items()
+                    if name not in names
+                ], ignore_conflicts=True)
+                hidden += len(created)
+
+                # Point expenses, budgets and rules at the shared rows, then drop the copies
+                # (rules cascade with their category, so they must move first)
+                for name, category in defaults.items():
+                    name_copies = copies.filter(name=name).values('id')
+                    Expense.objects.filter(category__in=name_copies).update(category=category)
+                    Transaction.objects.filter(category__in=name_copies).update(category=category)
+                    Budget.objects.filter(category__in=name_copies).update(category=category)
+                    CategoryRule.objects.filter(category__in=name_copies).update(category=category)
+                folded += copies.delete()[1].get(ExpenseCategory._meta.label, 0)
+            users_updated += len(copied)
 
+        self.stdout.write(f'Hid {hidden} default categories that users had removed')
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully updated categories for {updated_count} users')
-        ) 
\ No newline at end of file
+            self.style.SUCCESS(f'Successfully folded {folded} copied categories for {users_updated} users')
+        )
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0020_remove_transaction_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalContribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('source', models.CharField(choices=[('auto', 'Automatic debit'), ('manual', 'Manual debit'), ('funds', 'Added funds')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contributions', to='tracker.savingsgoal')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='tracker.transaction')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['goal', 'date'], name='tracker_goalcontrib_goal_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0021_goalcontribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(choices=[('auto_debits', 'Savings auto-debits'), ('recurring', 'Recurring transactions')], max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, help_text='Run time in seconds', null=True)),
+                ('items_scanned', models.PositiveIntegerField(default=0)),
+                ('items_posted', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('queries', models.PositiveIntegerField(default=0)),
+                ('max_lag', models.FloatField(blank=True, help_text='Largest delay in seconds between an item falling due and being posted', null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', 'started_at'], name='tracker_schedrun_job_started')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread_notifications(apps, schema_editor):
+    UserProfile = apps.get_model('tracker', 'UserProfile')
+    TransactionNotification = apps.get_model('tracker', 'TransactionNotification')
+    unread = TransactionNotification.objects.filter(
+        user=OuterRef('user'),
+        is_read=False
+    ).order_by().values('user').annotate(total=Count('id')).values('total')
+    UserProfile.objects.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0022_schedulerrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='transactionnotification',
+            index=models.Index(fields=['user', 'is_read', 'created_at'], name='tracker_notif_user_unread'),
+        ),
+        migrations.RunPython(count_unread_notifications, migrations.RunPython.noop),
+    ]
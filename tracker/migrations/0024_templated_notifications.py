@@ -0,0 +1,103 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:41
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+RENDERED_MESSAGE = re.compile(
+    r"^Your (?P<name>.+) of ₹(?P<amount>[\d.,]+) has been (?P<action>credited|debited) (?P<direction>to|from) your account\.$"
+)
+
+MESSAGE_TEMPLATES = {
+    'income_added': "Your {description} of ₹{amount} has been credited to your account.",
+    'expense_added': "Your {description} of ₹{amount} has been debited from your account.",
+    'recurring_posted': "Your {name} of ₹{amount} has been {action} to your account.",
+}
+
+
+def classify(notification):
+    """Template code and params reproducing a stored message, or the legacy fallback"""
+    message = notification.message
+    match = RENDERED_MESSAGE.match(message)
+    if match:
+        txn = notification.transaction
+        try:
+            amount_matches = Decimal(match['amount'].replace(',', '')) == txn.amount
+        except InvalidOperation:
+            amount_matches = False
+        expected_action = 'credited' if notification.notification_type == 'income' else 'debited'
+        if amount_matches and match['action'] == expected_action:
+            if match['name'] == txn.description and match['direction'] == 'to' and expected_action == 'credited':
+                return 'income_added', {}
+            if match['name'] == txn.description and match['direction'] == 'from':
+                return 'expense_added', {}
+            if match['direction'] == 'to':
+                return 'recurring_posted', {'name': match['name']}
+    return 'legacy', {'message': message}
+
+
+def templatize_messages(apps, schema_editor):
+    TransactionNotification = apps.get_model('tracker', 'TransactionNotification')
+    batch = []
+    for notification in TransactionNotification.objects.select_related('transaction').iterator(chunk_size=2000):
+        notification.template_code, notification.params = classify(notification)
+        batch.append(notification)
+        if len(batch) >= 2000:
+            TransactionNotification.objects.bulk_update(batch, ['template_code', 'params'])
+            batch = []
+    if batch:
+        TransactionNotification.objects.bulk_update(batch, ['template_code', 'params'])
+
+
+def render_messages(apps, schema_editor):
+    TransactionNotification = apps.get_model('tracker', 'TransactionNotification')
+    batch = []
+    for notification in TransactionNotification.objects.select_related('transaction').iterator(chunk_size=2000):
+        if notification.template_code == 'legacy':
+            notification.message = notification.params.get('message', '')
+        else:
+            notification.message = MESSAGE_TEMPLATES[notification.template_code].format(
+                description=notification.transaction.description,
+                amount=notification.transaction.amount,
+                action='credited' if notification.notification_type == 'income' else 'debited',
+                **notification.params
+            )[:255]
+        batch.append(notification)
+        if len(batch) >= 2000:
+            TransactionNotification.objects.bulk_update(batch, ['message'])
+            batch = []
+    if batch:
+        TransactionNotification.objects.bulk_update(batch, ['message'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0023_notification_unread_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionnotification',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='transactionnotification',
+            name='template_code',
+            field=models.CharField(choices=[('income_added', 'Income added'), ('expense_added', 'Expense added'), ('recurring_posted', 'Recurring transaction posted'), ('legacy', 'Legacy message')], default='legacy', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.RunPython(templatize_messages, render_messages),
+        # Gives the column a default so it can be re-added when unapplying
+        migrations.AlterField(
+            model_name='transactionnotification',
+            name='message',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='message',
+        ),
+    ]
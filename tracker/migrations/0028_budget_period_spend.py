@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0027_transaction_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionnotification',
+            name='template_code',
+            field=models.CharField(choices=[('income_added', 'Income added'), ('expense_added', 'Expense added'), ('recurring_posted', 'Recurring transaction posted'), ('budget_warning', 'Budget nearly used'), ('budget_exceeded', 'Budget reached'), ('legacy', 'Legacy message')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='BudgetPeriodSpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('alert_level', models.PositiveSmallIntegerField(choices=[(0, 'None'), (80, '80% used'), (100, 'Budget reached')], default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_spends', to='tracker.budget')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('budget', 'period_start'), name='tracker_budget_period_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0028_budget_period_spend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='forecast_spend',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='forecast_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
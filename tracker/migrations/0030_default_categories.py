@@ -0,0 +1,64 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Copied from ExpenseCategory.DEFAULT_NAMES as it was when the catalogue was introduced
+DEFAULT_CATEGORIES = [
+    'Food & Dining',
+    'Transportation',
+    'Housing',
+    'Entertainment',
+    'Utilities',
+    'Healthcare',
+    'Education',
+    'Shopping',
+    'Personal Care',
+    'Gifts & Donations',
+    'Travel',
+    'Insurance',
+    'Investments',
+    'Debt Payments',
+    'Other',
+]
+
+
+def seed_default_categories(apps, schema_editor):
+    ExpenseCategory = apps.get_model('tracker', 'ExpenseCategory')
+    existing = set(ExpenseCategory.objects.filter(user__isnull=True).values_list('name', flat=True))
+    ExpenseCategory.objects.bulk_create([
+        ExpenseCategory(name=name, user=None) for name in DEFAULT_CATEGORIES if name not in existing
+    ])
+
+
+def remove_unused_default_categories(apps, schema_editor):
+    # Defaults still referenced by expenses or budgets block the reverse on purpose
+    ExpenseCategory = apps.get_model('tracker', 'ExpenseCategory')
+    ExpenseCategory.objects.filter(
+        user__isnull=True,
+        expense__isnull=True,
+        budgets__isnull=True
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0029_budget_forecast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expensecategory',
+            name='hidden_by',
+            field=models.ManyToManyField(blank=True, related_name='hidden_categories', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='expensecategory',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(seed_default_categories, remove_unused_default_categories),
+    ]
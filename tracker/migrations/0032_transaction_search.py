@@ -0,0 +1,58 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    # External-content table: it stores only the index and reads text from tracker_transaction
+    "CREATE VIRTUAL TABLE tracker_transaction_fts USING fts5("
+    "description, content='tracker_transaction', content_rowid='id')",
+    "CREATE TRIGGER tracker_transaction_fts_insert AFTER INSERT ON tracker_transaction BEGIN "
+    "INSERT INTO tracker_transaction_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER tracker_transaction_fts_delete AFTER DELETE ON tracker_transaction BEGIN "
+    "INSERT INTO tracker_transaction_fts(tracker_transaction_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER tracker_transaction_fts_update AFTER UPDATE OF description ON tracker_transaction BEGIN "
+    "INSERT INTO tracker_transaction_fts(tracker_transaction_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    "INSERT INTO tracker_transaction_fts(rowid, description) VALUES (new.id, new.description); END",
+    "INSERT INTO tracker_transaction_fts(tracker_transaction_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS tracker_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS tracker_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS tracker_transaction_fts_update",
+    "DROP TABLE IF EXISTS tracker_transaction_fts",
+]
+MYSQL_FORWARD = ["CREATE FULLTEXT INDEX tracker_txn_description_ft ON tracker_transaction (description)"]
+MYSQL_REVERSE = ["DROP INDEX tracker_txn_description_ft ON tracker_transaction"]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    # Other backends have no index; tracker.search falls back to LIKE there
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'mysql': MYSQL_FORWARD})
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_REVERSE, 'mysql': MYSQL_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0031_categoryrule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date'], name='tracker_txn_user_date'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_CHUNK_SIZE = 10000
+
+
+def copy_expense_categories(apps, schema_editor):
+    Transaction = apps.get_model('tracker', 'Transaction')
+    Expense = apps.get_model('tracker', 'Expense')
+    category = Subquery(Expense.objects.filter(transaction_id=OuterRef('pk')).values('category_id')[:1])
+    # One UPDATE per id range keeps each statement's locks short on a large table
+    last_id = Transaction.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id + 1, BACKFILL_CHUNK_SIZE):
+        Transaction.objects.filter(
+            id__gte=start,
+            id__lt=start + BACKFILL_CHUNK_SIZE,
+            transaction_type='expense'
+        ).update(category_id=category)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0032_transaction_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='category',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='tracker.expensecategory'),
+        ),
+        # Filled before the composite index exists, so the backfill doesn't maintain it row by row
+        migrations.RunPython(copy_expense_categories, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'category', 'date'], name='tracker_txn_user_cat_date'),
+        ),
+    ]
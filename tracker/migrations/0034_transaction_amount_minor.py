@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:54
+
+from django.db import migrations, models
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+BACKFILL_CHUNK_SIZE = 10000
+
+
+def fill_amount_minor(apps, schema_editor):
+    Transaction = apps.get_model('tracker', 'Transaction')
+    # Rounded before the cast: SQLite keeps decimals as floats, where 12.34 * 100 is 1233.999...
+    paise = Cast(Round(F('amount') * 100), BigIntegerField())
+    last_id = Transaction.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id + 1, BACKFILL_CHUNK_SIZE):
+        Transaction.objects.filter(id__gte=start, id__lt=start + BACKFILL_CHUNK_SIZE).update(amount_minor=paise)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0033_transaction_category'),
+    ]
+
+    # The column stays nullable: making it NOT NULL would rebuild the table on SQLite,
+    # dropping the full-text search triggers from 0032
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_minor',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_amount_minor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0035_ledger_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectioncheckpoint',
+            name='gaps',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
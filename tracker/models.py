@@ -2,12 +2,15 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import datetime, time, date, timedelta
-from django.db.models import Sum
+from django.db.models import Sum, F, Q, Count, OuterRef, Subquery, Value, DecimalField
+from django.db.models.functions import Coalesce, Greatest, Least
+from decimal import Decimal
 from math import ceil
 from dateutil.relativedelta import relativedelta
 from django.db import transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 import logging
+from .dispatch import jittered_time
 
 class Transaction(models.Model):
     TRANSACTION_TYPE_CHOICES = [
@@ -17,19 +20,78 @@ class Transaction(models.Model):
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # The amount in paise, written from amount on every save (see tracker.money)
+    amount_minor = models.BigIntegerField(null=True, blank=True, editable=False)
     description = models.CharField(max_length=255)
     date = models.DateField(default=timezone.now)
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPE_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Copy of the Expense row's category, kept in step by signals and bulk recategorization,
+    # so category aggregates read this table alone. Only expenses have one.
+    category = models.ForeignKey(
+        'ExpenseCategory', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='transactions'
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='tracker_txn_user_updated'),
+            # Newest-first listing pages; the description full-text index is created by migration 0032
+            models.Index(fields=['user', 'date'], name='tracker_txn_user_date'),
+            # Category sums over a date range
+            models.Index(fields=['user', 'category', 'date'], name='tracker_txn_user_cat_date'),
+        ]
     
     def __str__(self):
         return f"{self.transaction_type}: {self.amount} - {self.description}"
 
+class ExpenseCategoryQuerySet(models.QuerySet):
+    def defaults(self):
+        """The shared default catalogue"""
+        return self.filter(user__isnull=True)
+
+    def for_user(self, user):
+        """The user's own categories plus the defaults they haven't hidden or replaced with one of the same name"""
+        own_names = ExpenseCategory.objects.filter(user=user).values('name')
+        return self.filter(
+            Q(user=user)
+            | (Q(user__isnull=True) & ~Q(hidden_by=user) & ~Q(name__in=own_names))
+        )
+
 class ExpenseCategory(models.Model):
+    # Seeded as shared rows (user is null) by migration 0030 and referenced by every user
+    DEFAULT_NAMES = [
+        'Food & Dining',
+        'Transportation',
+        'Housing',
+        'Entertainment',
+        'Utilities',
+        'Healthcare',
+        'Education',
+        'Shopping',
+        'Personal Care',
+        'Gifts & Donations',
+        'Travel',
+        'Insurance',
+        'Investments',
+        'Debt Payments',
+        'Other'
+    ]
+
     name = models.CharField(max_length=100)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Null for the shared default categories
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # Users who removed this default category from their own list
+    hidden_by = models.ManyToManyField(User, blank=True, related_name='hidden_categories')
+    
+    objects = ExpenseCategoryQuerySet.as_manager()
     
     def __str__(self):
         return self.name
+
+    @property
+    def is_default(self):
+        return self.user_id is None
     
     class Meta:
         verbose_name_plural = "Expense Categories"
@@ -41,6 +103,42 @@ class Expense(models.Model):
     def __str__(self):
         return f"{self.transaction.amount} - {self.category.name if self.category else 'Uncategorized'}"
 
+class CategoryRule(models.Model):
+    """Assigns a category to a user's expenses whose description and amount match"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_rules')
+    category = models.ForeignKey(ExpenseCategory, on_delete=models.CASCADE, related_name='rules')
+    description_contains = models.CharField(max_length=100, blank=True)
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Where several rules match an expense, the highest priority wins
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['priority', 'id']
+
+    def __str__(self):
+        conditions = []
+        if self.description_contains:
+            conditions.append(f'description contains "{self.description_contains}"')
+        if self.min_amount is not None:
+            conditions.append(f'amount >= ₹{self.min_amount}')
+        if self.max_amount is not None:
+            conditions.append(f'amount <= ₹{self.max_amount}')
+        return f"{' and '.join(conditions) or 'any expense'} → {self.category.name}"
+
+    def matching_expenses(self):
+        """The rule owner's expenses this rule applies to"""
+        expenses = Expense.objects.filter(transaction__user_id=self.user_id)
+        if self.description_contains:
+            expenses = expenses.filter(transaction__description__icontains=self.description_contains)
+        if self.min_amount is not None:
+            expenses = expenses.filter(transaction__amount__gte=self.min_amount)
+        if self.max_amount is not None:
+            expenses = expenses.filter(transaction__amount__lte=self.max_amount)
+        return expenses
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     reset_word = models.CharField(max_length=100, default='')
@@ -48,6 +146,9 @@ class UserProfile(models.Model):
     otp = models.CharField(max_length=6, null=True, blank=True)
     otp_created_at = models.DateTimeField(null=True, blank=True)
     otp_expires_at = models.DateTimeField(null=True, blank=True)
+    # Denormalized count of unread TransactionNotifications, kept in step by signals
+    unread_notifications = models.PositiveIntegerField(default=0)
+    last_digest_sent_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return self.user.username
@@ -81,6 +182,44 @@ class UserProfile(models.Model):
             
         return False
 
+def month_bounds(day):
+    """First and last day of the month containing day"""
+    month_start = day.replace(day=1)
+    if day.month == 12:
+        next_month = day.replace(year=day.year + 1, month=1, day=1)
+    else:
+        next_month = day.replace(month=day.month + 1, day=1)
+    return month_start, next_month - timedelta(days=1)
+
+class BudgetQuerySet(models.QuerySet):
+    def active_on(self, day):
+        """Active budgets whose start/end dates include the given day"""
+        return self.filter(is_active=True, start_date__lte=day).filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=day)
+        )
+
+    def with_spent(self, today=None):
+        """Annotate each budget's spend for the month, computed in the same query.
+
+        Spend is the total of the user's expenses in the budget's category
+        during the month containing today, clipped to the budget's own start
+        and end dates. Budget.spent, remaining and percentage_used read the
+        annotation instead of running a query per budget.
+        """
+        month_start, month_end = month_bounds(today or datetime.now().date())
+        # A range scan of the (user, category, date) index on Transaction, with no join
+        spend = Transaction.objects.filter(
+            user=OuterRef('user'),
+            category=OuterRef('category'),
+            date__gte=Greatest(Value(month_start), OuterRef('start_date')),
+            date__lte=Least(Value(month_end), Coalesce(OuterRef('end_date'), Value(month_end)))
+        ).order_by().values('category').annotate(total=Sum('amount')).values('total')
+        return self.annotate(annotated_spent=Coalesce(
+            Subquery(spend),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ))
+
 class Budget(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
     category = models.ForeignKey(ExpenseCategory, on_delete=models.CASCADE, related_name='budgets')
@@ -90,32 +229,46 @@ class Budget(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Projected spend for the month, written by the forecast_budgets command
+    forecast_spend = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    forecast_updated_at = models.DateTimeField(null=True, blank=True)
+
+    objects = BudgetQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.category.name} - ₹{self.amount}"
 
     @property
     def spent(self):
-        # Get the current date
-        current_date = datetime.now().date()
-        # Get the start of the current month
-        current_month_start = current_date.replace(day=1)
-        # Get the end of the current month
-        if current_date.month == 12:
-            next_month = current_date.replace(year=current_date.year + 1, month=1, day=1)
-        else:
-            next_month = current_date.replace(month=current_date.month + 1, day=1)
-        current_month_end = next_month - timedelta(days=1)
-
-        # Calculate total spent in this category for the current month, including future expenses
-        total = Expense.objects.filter(
-            category=self.category,
-            transaction__user=self.user,
-            transaction__date__gte=current_month_start,
-            transaction__date__lte=current_month_end
-        ).aggregate(total=Sum('transaction__amount'))['total'] or 0
+        # Loaded by Budget.objects.with_spent()
+        if 'annotated_spent' in self.__dict__:
+            return self.annotated_spent
+
+        # Calculate total spent in this category for the current month, including future expenses,
+        # within the budget's own dates
+        current_month_start, current_month_end = month_bounds(datetime.now().date())
+        start_date = self.start_date.date() if isinstance(self.start_date, datetime) else self.start_date
+        period_start = max(current_month_start, start_date)
+        period_end = min(current_month_end, self.end_date or current_month_end)
+        if period_start > period_end:
+            return 0
+        total = Transaction.objects.filter(
+            user_id=self.user_id,
+            category_id=self.category_id,
+            date__gte=period_start,
+            date__lte=period_end
+        ).aggregate(total=Sum('amount'))['total'] or 0
         return total
 
+    def forecast_for(self, today):
+        """The stored month-end projection if it was made this month, else None"""
+        if self.forecast_spend is None or self.forecast_updated_at is None:
+            return None
+        forecast_date = timezone.localdate(self.forecast_updated_at)
+        if (forecast_date.year, forecast_date.month) != (today.year, today.month):
+            return None
+        return self.forecast_spend
+
     @property
     def remaining(self):
         return self.amount - self.spent
@@ -126,6 +279,29 @@ class Budget(models.Model):
             return 100
         return (self.spent / self.amount) * 100
 
+class BudgetPeriodSpend(models.Model):
+    """Running spend of a budget in one month, kept current by tracker.budget_alerts on expense writes"""
+    ALERT_LEVEL_CHOICES = [
+        (0, 'None'),
+        (80, '80% used'),
+        (100, 'Budget reached'),
+    ]
+
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='period_spends')
+    period_start = models.DateField()
+    spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Highest threshold already notified for this period
+    alert_level = models.PositiveSmallIntegerField(choices=ALERT_LEVEL_CHOICES, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'period_start'], name='tracker_budget_period_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.budget} ({self.period_start:%b %Y}): ₹{self.spent}"
+
 class SavingsGoal(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='savings_goals')
     name = models.CharField(max_length=100)
@@ -230,23 +406,44 @@ class SavingsGoal(models.Model):
         time_str = self.debit_time.strftime('%I:%M %p') if self.debit_time else '12:00 AM'
         return f"{next_date.strftime('%b %d, %Y')} at {time_str}"
 
-    def process_scheduled_debit(self, force=False):
-        """Attempt to process a scheduled debit if it's due or forced"""
+    @property
+    def effective_debit_time(self):
+        """Debit time shifted by this goal's dispatch jitter so goals don't all fire at once"""
+        return jittered_time(self.debit_time, f"goal:{self.pk}")
+
+    def scheduled_debit_at(self, now):
+        """Aware datetime this month's scheduled debit falls due (including jitter)"""
+        debit_date = self._calculate_future_debit_date(now.date().replace(day=1))
+        return timezone.make_aware(
+            datetime.combine(debit_date, self.effective_debit_time),
+            timezone.get_current_timezone()
+        )
+
+    def process_scheduled_debit(self, force=False, bucket=None, now=None):
+        """Attempt to process a scheduled debit if it's due or forced.
+
+        `now` is the clock reading to evaluate the schedule against (defaults to
+        timezone.now()). When a token bucket is given, a token is taken right
+        before posting so batch runs stay within the configured postings per second.
+        """
         logger = logging.getLogger(__name__)
         
         if not self.auto_debit_enabled or self.completed:
             logger.debug(f"Goal {self.id} - Auto-debit not enabled or goal completed")
             return False, "Auto-debit not enabled or goal completed"
         
-        now = timezone.now()
+        if now is None:
+            now = timezone.now()
         current_date = now.date()
         current_time = now.time()
         
         # If force is true, ALWAYS process regardless of other conditions
         if force:
-            logger.info(f"Goal {self.id} - Processing forced debit")
+            logger.debug(f"Goal {self.id} - Processing forced debit")
             # Skip all checks when forced
-            return self._execute_debit(current_date, current_time, "Manually forced debit")
+            if bucket:
+                bucket.acquire()
+            return self._execute_debit(current_date, current_time, "Manually forced debit", claim=False)
         
         # Regular checks for non-forced debits
         # If we already debited today, don't process again
@@ -254,55 +451,114 @@ class SavingsGoal(models.Model):
             logger.debug(f"Goal {self.id} - Already debited today")
             return False, "Already debited today"
         
+        # Only one scheduled debit per month; the catch-up path must not repeat it
+        if self.last_debit_date and self.last_debit_date >= current_date.replace(day=1):
+            logger.debug(f"Goal {self.id} - Already debited this month")
+            return False, "Already debited this month"
+        
         # Calculate the debit date for this month
         this_month_debit_date = self._calculate_future_debit_date(current_date.replace(day=1))
         
         # Check if today is the scheduled debit day
         if current_date == this_month_debit_date:
-            # On the scheduled day, check if we've reached the target time
-            if current_time >= self.debit_time:
-                logger.info(f"Goal {self.id} - Processing regular scheduled debit")
+            # On the scheduled day, check if we've reached the (jittered) target time
+            if current_time >= self.effective_debit_time:
+                logger.debug(f"Goal {self.id} - Processing regular scheduled debit")
+                if bucket:
+                    bucket.acquire()
                 return self._execute_debit(current_date, current_time, "Regular scheduled debit")
             else:
                 logger.debug(f"Goal {self.id} - Waiting for scheduled time {self.debit_time.strftime('%H:%M')}")
                 return False, f"Waiting for scheduled time {self.debit_time.strftime('%H:%M')}"
         elif current_date > this_month_debit_date and current_date.month == this_month_debit_date.month:
             # If we're past the debit day but still in the same month, process it immediately
-            logger.info(f"Goal {self.id} - Catching up on missed debit")
+            logger.debug(f"Goal {self.id} - Catching up on missed debit")
+            if bucket:
+                bucket.acquire()
             return self._execute_debit(current_date, current_time, "Catching up on missed debit")
         
         logger.debug(f"Goal {self.id} - Not scheduled debit day (scheduled for {this_month_debit_date})")
         return False, f"Not scheduled debit day (scheduled for {this_month_debit_date})"
 
-    def _execute_debit(self, current_date, current_time, status_message="Regular debit"):
+    def add_contribution(self, amount, current_date, source, description, debit_time=None, claim=True):
+        """Atomically move money into this goal and record the linked transaction.
+
+        The balance is changed with an F() expression and completion is decided
+        by a conditional UPDATE, so concurrent contributions never overwrite
+        each other. When debit_time is given the contribution is recorded as the
+        goal's debit for current_date and, with claim=True, only succeeds if no
+        other run has debited the goal that month; otherwise nothing is written
+        and None is returned.
+        """
+        now = timezone.now()
+        
+        with transaction.atomic():
+            goal_rows = SavingsGoal.objects.filter(pk=self.pk)
+            updates = {
+                'current_amount': F('current_amount') + amount,
+                'updated_at': now,
+            }
+            if debit_time is not None:
+                if claim:
+                    goal_rows = goal_rows.exclude(last_debit_date__gte=current_date.replace(day=1))
+                updates['last_debit_date'] = current_date
+                updates['last_debit_time'] = debit_time
+            
+            if not goal_rows.update(**updates):
+                return None
+            
+            # The F() update skips save(), so its ledger event is recorded here
+            from .ledger import record_goal_amount
+            current_amount = SavingsGoal.objects.values_list('current_amount', flat=True).get(pk=self.pk)
+            record_goal_amount(self, amount, current_amount)
+            
+            transaction_obj = Transaction.objects.create(
+                user_id=self.user_id,
+                amount=amount,
+                description=description,
+                date=current_date,
+                transaction_type='expense'  # Expense because money is being set aside
+            )
+            
+            GoalContribution.objects.create(
+                goal=self,
+                transaction=transaction_obj,
+                amount=amount,
+                date=current_date,
+                source=source
+            )
+            
+            # Mark the goal complete only if this contribution pushed it over the target
+            SavingsGoal.objects.filter(
+                pk=self.pk,
+                completed=False,
+                current_amount__gte=F('target_amount')
+            ).update(completed=True)
+        
+        self.refresh_from_db(fields=['current_amount', 'completed', 'last_debit_date', 'last_debit_time', 'updated_at'])
+        return transaction_obj
+
+    def _execute_debit(self, current_date, current_time, status_message="Regular debit", claim=True):
         """Execute the actual debit transaction"""
         logger = logging.getLogger(__name__)
         
-        logger.info(f"Executing debit for goal {self.name} ({self.id}): {status_message}")
+        logger.debug(f"Executing debit for goal {self.name} ({self.id}): {status_message}")
         
         try:
-            with transaction.atomic():
-                # Create transaction for the debit
-                transaction_obj = Transaction.objects.create(
-                    user=self.user,
-                    amount=self.monthly_contribution,
-                    description=f"Automatic contribution to savings goal: {self.name}",
-                    date=current_date,
-                    transaction_type='expense'  # Expense because money is being set aside
-                )
-                
-                # Update the goal amount
-                self.current_amount += self.monthly_contribution
-                self.last_debit_date = current_date
-                self.last_debit_time = current_time
-                
-                # Check if goal is now complete
-                if self.current_amount >= self.target_amount:
-                    self.completed = True
-                
-                self.save()
-                logger.info(f"Successfully processed debit for goal {self.name}: {self.monthly_contribution}")
-                return True, f"Successfully debited ₹{self.monthly_contribution} ({status_message})"
+            transaction_obj = self.add_contribution(
+                self.monthly_contribution,
+                current_date,
+                source='auto',
+                description=f"Automatic contribution to savings goal: {self.name}",
+                debit_time=current_time,
+                claim=claim
+            )
+            if transaction_obj is None:
+                logger.debug(f"Goal {self.id} - Debit for {current_date:%B %Y} already claimed by another run")
+                return False, "Already debited this month"
+            
+            logger.debug(f"Successfully processed debit for goal {self.name}: {self.monthly_contribution}")
+            return True, f"Successfully debited ₹{self.monthly_contribution} ({status_message})"
                 
         except Exception as e:
             logger.error(f"Error processing debit for goal {self.name}: {str(e)}")
@@ -311,29 +567,42 @@ class SavingsGoal(models.Model):
     def _execute_manual_debit(self, current_date, current_time):
         """Execute a manually forced debit (when already debited once today)"""
         try:
-            with transaction.atomic():
-                # Create transaction for the manual contribution
-                transaction_obj = Transaction.objects.create(
-                    user=self.user,
-                    amount=self.monthly_contribution,
-                    description=f"Manual contribution to savings goal: {self.name}",
-                    date=current_date,
-                    transaction_type='expense'  # Expense because money is being set aside
-                )
-                
-                # Update the goal amount (but don't update last_debit_date)
-                self.current_amount += self.monthly_contribution
-                
-                # Check if goal is now complete
-                if self.current_amount >= self.target_amount:
-                    self.completed = True
-                
-                self.save()
-                return True, f"Successfully added ₹{self.monthly_contribution} (additional manual debit)"
+            # Manual debits don't update last_debit_date
+            self.add_contribution(
+                self.monthly_contribution,
+                current_date,
+                source='manual',
+                description=f"Manual contribution to savings goal: {self.name}"
+            )
+            return True, f"Successfully added ₹{self.monthly_contribution} (additional manual debit)"
                 
         except Exception as e:
             return False, f"Error processing manual debit: {str(e)}"
 
+class GoalContribution(models.Model):
+    """Ledger of money moved into a savings goal, used for goal history and timelines"""
+    SOURCE_CHOICES = [
+        ('auto', 'Automatic debit'),
+        ('manual', 'Manual debit'),
+        ('funds', 'Added funds'),
+    ]
+
+    goal = models.ForeignKey(SavingsGoal, on_delete=models.CASCADE, related_name='contributions')
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    date = models.DateField(default=timezone.now)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['goal', 'date'], name='tracker_goalcontrib_goal_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.goal.name}: ₹{self.amount} on {self.date}"
+
 class RecurringTransaction(models.Model):
     TRANSACTION_TYPES = [
         ('income', 'Income'),
@@ -373,20 +642,34 @@ class RecurringTransaction(models.Model):
     def __str__(self):
         return f"{self.name} - {self.amount} ({self.get_frequency_display()})"
 
-    def should_process_today(self):
-        today = date.today()
-        now = datetime.now().time()
+    @property
+    def effective_scheduled_time(self):
+        """Scheduled time shifted by this transaction's dispatch jitter"""
+        return jittered_time(self.scheduled_time, f"recurring:{self.pk}")
+
+    def scheduled_at(self, now):
+        """Aware datetime the posting for now's date falls due (including jitter)"""
+        return timezone.make_aware(
+            datetime.combine(now.date(), self.effective_scheduled_time),
+            timezone.get_current_timezone()
+        )
+
+    def should_process_today(self, now=None):
+        if now is None:
+            now = timezone.now()
+        today = now.date()
+        current_time = now.time()
         
-        # If it's already been processed this month
-        if self.last_processed and self.last_processed.month == today.month:
+        # If it's already been processed this month (of this year)
+        if self.last_processed and (self.last_processed.year, self.last_processed.month) == (today.year, today.month):
             return False
         
         # Check if today is the processing day
         if today.day != self.day_of_month:
             return False
             
-        # Check if it's time to process
-        if now < self.scheduled_time:
+        # Check if it's time to process (shifted by the dispatch jitter)
+        if current_time < self.effective_scheduled_time:
             return False
         
         # For monthly transactions
@@ -404,9 +687,9 @@ class RecurringTransaction(models.Model):
         
         return False
 
-    def process_transaction(self):
+    def process_transaction(self, now=None):
         """Process the recurring transaction and create a new transaction record"""
-        today = date.today()
+        today = (now or timezone.now()).date()
         
         try:
             with transaction.atomic():
@@ -418,15 +701,12 @@ class RecurringTransaction(models.Model):
                     date=today,
                     transaction_type=self.transaction_type
                 )
+                if self.transaction_type == 'expense':
+                    from .categorizer import file_expense
+                    file_expense(transaction_obj)
                 
                 # Create notification
-                action_word = "credited" if self.transaction_type == "income" else "debited"
-                TransactionNotification.objects.create(
-                    user=self.user,
-                    transaction=transaction_obj,
-                    message=f"Your {self.name} of ₹{self.amount} has been {action_word} to your account.",
-                    notification_type=self.transaction_type
-                )
+                TransactionNotification.create_for(transaction_obj, 'recurring_posted', name=self.name)
                 
                 # Update last processed date and status
                 self.last_processed = today
@@ -439,25 +719,260 @@ class RecurringTransaction(models.Model):
             self.save()
             return False, str(e)
 
+class SchedulerRun(models.Model):
+    """One invocation of a batch scheduler job, for throughput and lag monitoring"""
+    JOB_CHOICES = [
+        ('auto_debits', 'Savings auto-debits'),
+        ('recurring', 'Recurring transactions'),
+    ]
+
+    job = models.CharField(max_length=20, choices=JOB_CHOICES)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True, help_text="Run time in seconds")
+    items_scanned = models.PositiveIntegerField(default=0)
+    items_posted = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    queries = models.PositiveIntegerField(default=0)
+    max_lag = models.FloatField(
+        null=True, blank=True,
+        help_text="Largest delay in seconds between an item falling due and being posted"
+    )
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job', 'started_at'], name='tracker_schedrun_job_started'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_job_display()} at {self.started_at:%Y-%m-%d %H:%M:%S}"
+
 class TransactionNotification(models.Model):
     NOTIFICATION_TYPES = [
         ('income', 'Income'),
         ('expense', 'Expense'),
     ]
     
+    # Messages are rendered at display time from the linked transaction plus a
+    # few stored parameters, so rewording one never needs a data migration
+    MESSAGE_TEMPLATES = {
+        'income_added': "Your {description} of ₹{amount} has been credited to your account.",
+        'expense_added': "Your {description} of ₹{amount} has been debited from your account.",
+        'recurring_posted': "Your {name} of ₹{amount} has been {action} to your account.",
+        'budget_warning': "You have used {percentage}% of your {category} budget: ₹{spent} of ₹{budget}.",
+        'budget_exceeded': "You have reached your {category} budget: ₹{spent} spent of ₹{budget}.",
+        'legacy': "{message}",
+    }
+    TEMPLATE_CHOICES = [
+        ('income_added', 'Income added'),
+        ('expense_added', 'Expense added'),
+        ('recurring_posted', 'Recurring transaction posted'),
+        ('budget_warning', 'Budget nearly used'),
+        ('budget_exceeded', 'Budget reached'),
+        ('legacy', 'Legacy message'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE)
-    message = models.CharField(max_length=255)
+    template_code = models.CharField(max_length=20, choices=TEMPLATE_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
     notification_type = models.CharField(max_length=10, choices=NOTIFICATION_TYPES)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', 'created_at'], name='tracker_notif_user_unread'),
+        ]
     
     def __str__(self):
         return f"{self.notification_type}: {self.message}"
 
+    @property
+    def message(self):
+        """The notification text, rendered from its template"""
+        context = {
+            'description': self.transaction.description,
+            'amount': self.transaction.amount,
+            'action': 'credited' if self.notification_type == 'income' else 'debited',
+            **self.params,
+        }
+        template = self.MESSAGE_TEMPLATES.get(self.template_code, self.MESSAGE_TEMPLATES['legacy'])
+        try:
+            return template.format_map(context)
+        except (KeyError, ValueError):
+            return self.params.get('message', '')
+
+    @classmethod
+    def create_for(cls, transaction_obj, template_code, **params):
+        """Create a notification about a transaction using one of MESSAGE_TEMPLATES"""
+        return cls.objects.create(
+            user_id=transaction_obj.user_id,
+            transaction=transaction_obj,
+            template_code=template_code,
+            params=params,
+            notification_type=transaction_obj.transaction_type
+        )
+
+    @classmethod
+    def unread_count(cls, user):
+        """Unread notifications for the user, read from the profile counter"""
+        count = UserProfile.objects.filter(user=user).values_list('unread_notifications', flat=True).first()
+        if count is None:
+            # Users created outside registration have no profile to hold the counter
+            count = cls.objects.filter(user=user, is_read=False).count()
+        return count
+
+    @classmethod
+    def mark_read(cls, user, ids=None):
+        """Mark all (or only the given) unread notifications of a user read with one UPDATE"""
+        notifications = cls.objects.filter(user=user, is_read=False)
+        if ids is not None:
+            notifications = notifications.filter(id__in=ids)
+        
+        with transaction.atomic():
+            updated = notifications.update(is_read=True)
+            if updated:
+                UserProfile.objects.filter(user=user).update(
+                    unread_notifications=Greatest(F('unread_notifications') - updated, 0)
+                )
+        return updated
+
+    @classmethod
+    def recount_unread(cls, user=None):
+        """Rebuild the unread counters from the notification table"""
+        unread = cls.objects.filter(
+            user=OuterRef('user'),
+            is_read=False
+        ).order_by().values('user').annotate(total=Count('id')).values('total')
+        profiles = UserProfile.objects.all()
+        if user is not None:
+            profiles = profiles.filter(user=user)
+        return profiles.update(
+            unread_notifications=Coalesce(Subquery(unread), 0)
+        )
+
+class EmailOutbox(models.Model):
+    """Outgoing email written in the request transaction and sent later by send_queued_emails"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name_plural = 'Email outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='tracker_outbox_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
+
+class LedgerEvent(models.Model):
+    """Append-only record of one change to a transaction, goal or goal contribution.
+
+    before and after are snapshots of the fields projections read (None for
+    a created or deleted row). Rows are only ever inserted; see
+    tracker.projections for the read models folded from them.
+    """
+    ENTITY_CHOICES = [
+        ('transaction', 'Transaction'),
+        ('goal', 'Savings goal'),
+        ('contribution', 'Goal contribution'),
+    ]
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+        ('backfilled', 'Backfilled'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_events')
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    entity_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    before = models.JSONField(null=True, blank=True)
+    after = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity', 'entity_id'], name='tracker_event_entity'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.entity} {self.entity_id} {self.action}"
+
+class ProjectionCheckpoint(models.Model):
+    """Id of the last ledger event a projection has folded in"""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    # Ids below last_event_id not seen yet, mapped to when the next later event was written
+    gaps = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at event {self.last_event_id}"
+
+class AccountBalance(models.Model):
+    """Projection: a user's all-time totals in paise"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='account_balance')
+    income_minor = models.BigIntegerField(default=0)
+    expense_minor = models.BigIntegerField(default=0)
+    balance_minor = models.BigIntegerField(default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} balance {self.balance_minor}"
+
+class MonthlyRollup(models.Model):
+    """Projection: a user's income and expenses in paise for one month"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_rollups')
+    month = models.DateField()
+    income_minor = models.BigIntegerField(default=0)
+    expense_minor = models.BigIntegerField(default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['user', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='tracker_rollup_user_month_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.month:%Y-%m}"
+
+class GoalTotal(models.Model):
+    """Projection: a savings goal's amount and contributions in paise.
+
+    goal_id is a plain column rather than a foreign key: replays fold events
+    for goals that have since been deleted.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='goal_totals')
+    goal_id = models.BigIntegerField(unique=True)
+    amount_minor = models.BigIntegerField(default=0)
+    contributed_minor = models.BigIntegerField(default=0)
+    contribution_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Goal {self.goal_id} total {self.amount_minor}"
+
 # Remove or comment out the Receipt model class
 
 class Discussion(models.Model):
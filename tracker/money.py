@@ -0,0 +1,40 @@
+"""Money as whole paise, for arithmetic over many rows.
+
+Amounts are stored as two-place DecimalFields in rupees, and those stay the
+source of truth. Transaction.amount_minor holds the same amount as an
+integer number of paise. A pre_save signal writes it on every save. Sums,
+running balances and the NumPy analytics read that column. Their arithmetic
+is exact, they vectorize as int64 arrays, and no Decimal object is created
+per row. Values go back to rupees with from_minor() only at the edges, for
+display, JSON and stored results.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.db.models import BigIntegerField, Case, F, When
+
+MINOR_PER_UNIT = 100
+
+# amount_minor counted positive for income and negative for expenses
+SIGNED_MINOR = Case(
+    When(transaction_type='income', then=F('amount_minor')),
+    default=-F('amount_minor'),
+    output_field=BigIntegerField()
+)
+
+
+def to_minor(amount):
+    """Paise in a rupee amount (Decimal, str, int or float), rounded half up"""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * MINOR_PER_UNIT).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    """Rupee Decimal with two places for a number of paise"""
+    return Decimal(int(minor)).scaleb(-2)
+
+
+def minor_array(values):
+    """int64 array of paise values, with missing (NULL) totals as 0"""
+    return np.fromiter((value or 0 for value in values), dtype=np.int64)
@@ -0,0 +1,199 @@
+"""Read models folded from the ledger event log.
+
+Each projection turns an event into per-row deltas: the effect of its
+after snapshot minus the effect of its before snapshot. The runner folds
+events in id order, one batch at a time. A batch's deltas are summed in
+memory and written with one SELECT, one bulk_update and one bulk_create,
+in the same database transaction that advances the projection's
+checkpoint. A batch is therefore applied exactly once, and a run resumes
+where the last one stopped. A full rebuild empties the read model, resets
+the checkpoint and replays the whole log the same way.
+
+Event ids are allocated before their transaction commits, so a later id
+can become visible before an earlier one. When a batch skips over ids, the
+checkpoint keeps them as gaps and every run folds in any that have since
+appeared. A gap is dropped once the event written after it is older than
+GAP_SECONDS; by then the id belongs to a rolled back or deleted row rather
+than to a commit still in flight.
+
+Folding is pure addition. The rows of a deleted goal fold down to zero
+rather than disappearing, so the order of events within the log never
+matters.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AccountBalance, GoalTotal, LedgerEvent, MonthlyRollup, ProjectionCheckpoint
+
+EVENT_BATCH_SIZE = 5000
+GAP_SECONDS = 60 * 60
+
+
+class Projection:
+    """Folds ledger events into rows of model keyed on key_fields"""
+    name = None
+    model = None
+    key_fields = ()
+
+    def effects(self, event, state):
+        """(key, {field: amount}) pairs a snapshot adds to the read model"""
+        raise NotImplementedError
+
+    def deltas(self, event):
+        for state, sign in ((event.before, -1), (event.after, 1)):
+            if state is None:
+                continue
+            for key, values in self.effects(event, state):
+                yield key, {field: sign * value for field, value in values.items()}
+
+    def apply(self, events):
+        """Fold a batch of events into the read model; returns the number of rows written"""
+        totals = {}
+        for event in events:
+            for key, delta in self.deltas(event):
+                totals.setdefault(key, Counter()).update(delta)
+        if not totals:
+            return 0
+
+        existing = {}
+        first_field = self.key_fields[0]
+        for row in self.model.objects.filter(**{f'{first_field}__in': {key[0] for key in totals}}):
+            existing[tuple(getattr(row, field) for field in self.key_fields)] = row
+
+        changed = set()
+        created = []
+        for key, delta in totals.items():
+            row = existing.get(key)
+            if row is None:
+                created.append(self.model(**dict(zip(self.key_fields, key)), **delta))
+                continue
+            for field, value in delta.items():
+                setattr(row, field, getattr(row, field) + value)
+                changed.add(field)
+
+        updated = [row for key, row in existing.items() if key in totals]
+        if updated:
+            self.model.objects.bulk_update(updated, sorted(changed))
+        self.model.objects.bulk_create(created)
+        return len(updated) + len(created)
+
+    def reset(self):
+        self.model.objects.all().delete()
+
+
+class BalanceProjection(Projection):
+    name = 'balances'
+    model = AccountBalance
+    key_fields = ('user_id',)
+
+    def effects(self, event, state):
+        if event.entity != 'transaction':
+            return
+        amount = state['amount']
+        if state['type'] == 'income':
+            values = {'income_minor': amount, 'balance_minor': amount}
+        else:
+            values = {'expense_minor': amount, 'balance_minor': -amount}
+        yield (event.user_id,), {**values, 'transaction_count': 1}
+
+
+class MonthlyRollupProjection(Projection):
+    name = 'monthly_rollups'
+    model = MonthlyRollup
+    key_fields = ('user_id', 'month')
+
+    def effects(self, event, state):
+        if event.entity != 'transaction':
+            return
+        month = date.fromisoformat(state['date']).replace(day=1)
+        field = 'income_minor' if state['type'] == 'income' else 'expense_minor'
+        yield (event.user_id, month), {field: state['amount'], 'transaction_count': 1}
+
+
+class GoalTotalProjection(Projection):
+    name = 'goal_totals'
+    model = GoalTotal
+    key_fields = ('goal_id', 'user_id')
+
+    def effects(self, event, state):
+        if event.entity == 'goal':
+            yield (event.entity_id, event.user_id), {'amount_minor': state['amount']}
+        elif event.entity == 'contribution':
+            yield (state['goal_id'], event.user_id), {
+                'contributed_minor': state['amount'],
+                'contribution_count': 1,
+            }
+
+
+PROJECTIONS = (BalanceProjection(), MonthlyRollupProjection(), GoalTotalProjection())
+
+
+class ProjectionRunner:
+    """Brings projections up to date with the ledger, batch by batch"""
+
+    def __init__(self, projections=PROJECTIONS, batch_size=EVENT_BATCH_SIZE, gap_seconds=GAP_SECONDS, progress=None):
+        self.projections = projections
+        self.batch_size = batch_size
+        self.gap_seconds = gap_seconds
+        # Called with (projection, events applied so far) after every batch
+        self.progress = progress
+
+    def run(self):
+        """Fold every event each projection hasn't seen; returns {name: events applied}"""
+        expire_before = timezone.now() - timedelta(seconds=self.gap_seconds)
+        return {projection.name: self._catch_up(projection, expire_before) for projection in self.projections}
+
+    def rebuild(self):
+        """Empty the read models and replay the whole log into them"""
+        for projection in self.projections:
+            with transaction.atomic():
+                projection.reset()
+                ProjectionCheckpoint.objects.update_or_create(
+                    name=projection.name, defaults={'last_event_id': 0, 'gaps': {}}
+                )
+        return self.run()
+
+    def _catch_up(self, projection, expire_before):
+        applied = 0
+        while True:
+            with transaction.atomic():
+                # The row lock keeps concurrent runners from folding the same batch twice
+                checkpoint, _ = ProjectionCheckpoint.objects.select_for_update().get_or_create(name=projection.name)
+                gaps = checkpoint.gaps
+                late = []
+                if gaps:
+                    late = list(LedgerEvent.objects.filter(id__in=[int(event_id) for event_id in gaps]))
+                events = list(LedgerEvent.objects.filter(
+                    id__gt=checkpoint.last_event_id
+                ).order_by('id')[:self.batch_size])
+
+                for event in late:
+                    del gaps[str(event.id)]
+                previous_id = checkpoint.last_event_id
+                for event in events:
+                    if event.created_at > expire_before:
+                        for missing_id in range(previous_id + 1, event.id):
+                            gaps[str(missing_id)] = event.created_at.isoformat()
+                    previous_id = event.id
+                expired = [
+                    event_id for event_id, written_at in gaps.items()
+                    if datetime.fromisoformat(written_at) <= expire_before
+                ]
+                for event_id in expired:
+                    del gaps[event_id]
+
+                if late or events:
+                    projection.apply(late + events)
+                    checkpoint.last_event_id = previous_id
+                if late or events or expired:
+                    checkpoint.save(update_fields=['last_event_id', 'gaps', 'updated_at'])
+            if not events:
+                applied += len(late)
+                break
+            applied += len(late) + len(events)
+            if self.progress:
+                self.progress(projection, applied)
+        return applied
@@ -2,7 +2,8 @@ from datetime import datetime, timedelta
 from django.db.models import Avg, Sum, Count, F, Q
 from django.utils import timezone
 import numpy as np
-from .models import Transaction, Budget, SavingsGoal, Expense
+from .models import Transaction, Budget, SavingsGoal
+from .money import MINOR_PER_UNIT, minor_array
 from decimal import Decimal
 from sklearn.preprocessing import StandardScaler
 import pandas as pd
@@ -95,50 +96,52 @@ class FinancialRecommendationEngine:
         try:
             periods = [30, 90, 180]  # Analyze multiple time periods
             savings_trends = []
+            now = timezone.now()
+            
+            # Income and expense totals in paise for every period, in one query
+            totals = Transaction.objects.filter(
+                user=self.user,
+                date__gte=now - timedelta(days=max(periods))
+            ).aggregate(**{
+                f'{transaction_type}_{days}': Sum('amount_minor', filter=Q(
+                    transaction_type=transaction_type,
+                    date__gte=now - timedelta(days=days)
+                ))
+                for days in periods
+                for transaction_type in ('income', 'expense')
+            })
             
             for days in periods:
-                period_start = timezone.now() - timedelta(days=days)
-                
-                income = Transaction.objects.filter(
-                    user=self.user,
-                    transaction_type='income',
-                    date__gte=period_start
-                ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-
-                expenses = Transaction.objects.filter(
-                    user=self.user,
-                    transaction_type='expense',
-                    date__gte=period_start
-                ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
+                income = totals[f'income_{days}'] or 0
+                expenses = totals[f'expense_{days}'] or 0
 
                 if income > 0:
-                    savings_rate = ((income - expenses) / income) * Decimal('100')
-                    savings_trends.append(float(savings_rate))
+                    savings_trends.append((income - expenses) / income * 100)
 
             if savings_trends:
-                current_rate = Decimal(str(savings_trends[0]))
+                current_rate = savings_trends[0]
                 # Use simple difference instead of gradient for more stability
                 if len(savings_trends) > 1:
-                    trend = Decimal(str(savings_trends[0] - savings_trends[-1]))
+                    trend = savings_trends[0] - savings_trends[-1]
                 else:
-                    trend = Decimal('0')
+                    trend = 0.0
                 
                 # Update risk score
-                self.risk_scores['savings'] = self._calculate_risk_score(float(current_rate), 20, 40)
+                self.risk_scores['savings'] = self._calculate_risk_score(current_rate, 20, 40)
                 
-                if current_rate < Decimal('20'):
+                if current_rate < 20:
                     priority = 1 if trend < 0 else 2
                     confidence = 0.9
                     self.recommendations.append({
                         'title': 'Critical: Improve Savings Rate',
                         'description': f'Your current savings rate of {current_rate:.1f}% is below recommended levels and {"declining" if trend < 0 else "stable"}.',
-                        'action': self._generate_savings_action(float(current_rate), float(trend)),
+                        'action': self._generate_savings_action(current_rate, trend),
                         'type': 'warning',
                         'confidence': confidence,
                         'priority': priority,
-                        'metric': float(current_rate)
+                        'metric': current_rate
                     })
-                elif trend < Decimal('-5'):  # Significant decline
+                elif trend < -5:  # Significant decline
                     self.recommendations.append({
                         'title': 'Declining Savings Rate',
                         'description': f'Your savings rate has decreased by {abs(trend):.1f}% over the analyzed period.',
@@ -146,7 +149,7 @@ class FinancialRecommendationEngine:
                         'type': 'warning',
                         'confidence': 0.85,
                         'priority': 2,
-                        'metric': float(trend)
+                        'metric': trend
                     })
         except Exception as e:
             print(f"Error in savings rate analysis: {str(e)}")
@@ -197,22 +200,19 @@ class FinancialRecommendationEngine:
                 date__gte=six_months_ago
             )
             .values('date__month')
-            .annotate(total=Sum('amount'))
+            .annotate(total=Sum('amount_minor'))
             .order_by('date__month')
         )
 
         if income_data:
-            # Convert all values to Decimal for consistent calculations
-            monthly_incomes = [Decimal(str(entry['total'])) for entry in income_data]
-            mean_income = sum(monthly_incomes) / len(monthly_incomes) if monthly_incomes else Decimal('0')
+            # Monthly totals in paise; the coefficient of variation is the same in any unit
+            monthly_incomes = minor_array(entry['total'] for entry in income_data)
+            mean_income = monthly_incomes.mean()
             
             if mean_income > 0:
-                # Calculate standard deviation using Decimal
-                squared_diff_sum = sum((income - mean_income) ** 2 for income in monthly_incomes)
-                std_dev = (squared_diff_sum / len(monthly_incomes)) ** Decimal('0.5')
-                cv = (std_dev / mean_income) * Decimal('100')
+                cv = monthly_incomes.std() / mean_income * 100
                 
-                if cv > Decimal('20'):  # High income variability
+                if cv > 20:  # High income variability
                     self.recommendations.append({
                         'title': 'Variable Income Alert',
                         'description': f'Your income shows {cv:.1f}% variability month-to-month.',
@@ -260,11 +260,11 @@ class FinancialRecommendationEngine:
         )
 
         monthly_debt = (
-            Expense.objects.filter(
-                transaction__user=self.user,
+            Transaction.objects.filter(
+                user=self.user,
                 category__name__icontains='debt',
-                transaction__date__gte=timezone.now() - timedelta(days=30)
-            ).aggregate(Sum('transaction__amount'))['transaction__amount__sum'] or 0
+                date__gte=timezone.now() - timedelta(days=30)
+            ).aggregate(Sum('amount'))['amount__sum'] or 0
         )
 
         if monthly_income > 0:
@@ -285,13 +285,16 @@ class FinancialRecommendationEngine:
         one_month_ago = timezone.now() - timedelta(days=30)
         
         essential_categories = ['housing', 'utilities', 'groceries', 'healthcare']
+        # Goal contributions are expense transactions without an Expense row; they aren't discretionary
         discretionary_spending = (
-            Expense.objects.filter(
-                transaction__user=self.user,
-                transaction__date__gte=one_month_ago
+            Transaction.objects.filter(
+                user=self.user,
+                transaction_type='expense',
+                expense_details__isnull=False,
+                date__gte=one_month_ago
             ).exclude(
                 category__name__in=essential_categories
-            ).aggregate(Sum('transaction__amount'))['transaction__amount__sum'] or 0
+            ).aggregate(Sum('amount'))['amount__sum'] or 0
         )
 
         total_spending = (
@@ -370,12 +373,12 @@ class FinancialRecommendationEngine:
                 date__gte=three_months_ago
             )
             .values('date')
-            .annotate(total=Sum('amount'))
+            .annotate(total=Sum('amount_minor'))
             .order_by('date')
         )
 
         if daily_expenses:
-            amounts = [float(entry['total']) for entry in daily_expenses]
+            amounts = minor_array(entry['total'] for entry in daily_expenses) / MINOR_PER_UNIT
             dates = pd.to_datetime([entry['date'] for entry in daily_expenses])
             
             # Convert to pandas series for time series analysis
@@ -416,15 +419,17 @@ class FinancialRecommendationEngine:
         one_month_ago = timezone.now() - timedelta(days=30)
         
         user_categories = (
-            Expense.objects.filter(
-                transaction__user=self.user,
-                transaction__date__gte=one_month_ago
+            Transaction.objects.filter(
+                user=self.user,
+                transaction_type='expense',
+                expense_details__isnull=False,
+                date__gte=one_month_ago
             )
             .values('category__name')
             .annotate(
-                total=Sum('transaction__amount'),
+                total=Sum('amount'),
                 count=Count('id'),
-                avg_transaction=Avg('transaction__amount')
+                avg_transaction=Avg('amount')
             )
             .order_by('-total')
         )
@@ -486,23 +491,19 @@ class FinancialRecommendationEngine:
                 date__gte=one_month_ago
             )
             .values('date')
-            .annotate(total=Sum('amount'))
+            .annotate(total=Sum('amount_minor'))
             .order_by('date')
         )
 
         if daily_expenses:
-            # Convert Decimal to float for numpy calculations
-            daily_amounts = [float(entry['total']) for entry in daily_expenses]
-            std_dev = np.std(daily_amounts)
-            mean = np.mean(daily_amounts)
-            
-            # Convert to Decimal for comparison
-            std_dev = Decimal(str(std_dev))
-            mean = Decimal(str(mean))
+            # Daily totals in paise; the ratio of spread to mean doesn't depend on the unit
+            daily_amounts = minor_array(entry['total'] for entry in daily_expenses)
+            std_dev = daily_amounts.std()
+            mean = daily_amounts.mean()
             
-            if std_dev > mean * Decimal('0.5'):  # High variation in daily spending
+            if std_dev > mean * 0.5:  # High variation in daily spending
                 confidence = 0.75
-                variation_metric = float((std_dev/mean)*100)  # Convert back to float for display
+                variation_metric = float(std_dev / mean * 100)
                 self.recommendations.append({
                     'title': 'Irregular Spending Pattern',
                     'description': 'Your daily spending shows high variation, which might indicate impulse purchases.',
@@ -515,17 +516,14 @@ class FinancialRecommendationEngine:
 
     def _analyze_budget_adherence(self):
         """Analyze budget adherence and provide recommendations"""
-        current_date = timezone.now()
+        current_date = timezone.now().date()
         
-        # Get active budgets that include the current date
-        budgets = Budget.objects.filter(
-            user=self.user,
-            is_active=True,
-            start_date__lte=current_date,
-            end_date__gte=current_date
+        # Get active budgets that include the current date, with their spend loaded in the same query
+        budgets = list(
+            Budget.objects.filter(user=self.user).active_on(current_date).select_related('category').with_spent(current_date)
         )
         
-        if not budgets.exists():
+        if not budgets:
             self.recommendations.append({
                 'title': 'No Active Budgets',
                 'description': 'You haven\'t set up any active budgets for the current period.',
@@ -538,7 +536,7 @@ class FinancialRecommendationEngine:
             self.risk_scores['budget'] = 0
         else:
             over_budget_count = 0
-            total_budgets = budgets.count()
+            total_budgets = len(budgets)
             
             for budget in budgets:
                 if budget.spent > budget.amount:
@@ -552,6 +550,19 @@ class FinancialRecommendationEngine:
                         'priority': 1,
                         'metric': float((budget.spent / budget.amount) * 100)
                     })
+                else:
+                    # Month-end projection stored on the budget by forecast_budgets
+                    forecast = budget.forecast_for(current_date)
+                    if forecast is not None and forecast > budget.amount:
+                        self.recommendations.append({
+                            'title': f'Projected Overrun: {budget.category.name}',
+                            'description': f'At your current pace you\'ll spend about ₹{forecast:.2f} on {budget.category.name} this month, ₹{(forecast - budget.amount):.2f} over budget.',
+                            'action': f'Slow down {budget.category.name} spending for the rest of the month to stay within ₹{budget.amount:.2f}.',
+                            'type': 'warning',
+                            'confidence': 0.8,
+                            'priority': 2,
+                            'metric': float((forecast / budget.amount) * 100) if budget.amount else 100.0
+                        })
             
             # Calculate overall budget adherence score
             adherence_score = ((total_budgets - over_budget_count) / total_budgets) * 100 if total_budgets > 0 else 0
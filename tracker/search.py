@@ -0,0 +1,186 @@
+"""Transaction listing: description search, filters and keyset-paginated pages.
+
+Descriptions are searched through the database's own full-text index,
+created by migration 0032 for the backend in use:
+
+* MySQL: a FULLTEXT index, queried with MATCH ... AGAINST in boolean mode;
+* SQLite: an FTS5 table mirroring tracker_transaction.description, kept in
+  step by triggers and joined back by rowid.
+
+Every search word must match the start of a word in the description. On
+MySQL, words shorter than the server's minimum token size are not indexed,
+so they are matched with LIKE among the rows the index has already narrowed
+down. Other backends use LIKE throughout.
+
+Pages are keyed on (date, id), newest first, so a page deep in the history
+costs the same as the first. A page's running balances are worked out from
+one cached aggregate: the balance through the page's newest row. The code
+then walks back over the rows the page spans.
+"""
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections
+from django.db.models import FloatField, Q, Sum
+from django.db.models.expressions import RawSQL
+
+from .cache import cached_per_user
+from .models import Transaction
+from .money import SIGNED_MINOR, from_minor
+
+PAGE_SIZE = 50
+FULLTEXT_INDEX = 'tracker_txn_description_ft'
+FTS_TABLE = 'tracker_transaction_fts'
+MYSQL_MIN_TOKEN_SIZE = 3  # innodb_ft_min_token_size default
+
+
+def search_terms(query):
+    """Lower-case words of a search query; operators and punctuation are dropped"""
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def search_descriptions(transactions, query):
+    """Restrict a Transaction queryset to rows whose description matches every word of query"""
+    terms = search_terms(query)
+    if not terms:
+        return transactions
+
+    vendor = connections[transactions.db].vendor
+    if vendor == 'sqlite':
+        return transactions.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (' '.join(f'"{term}"*' for term in terms),)
+        ))
+
+    if vendor == 'mysql':
+        indexed = [term for term in terms if len(term) >= MYSQL_MIN_TOKEN_SIZE]
+        if indexed:
+            transactions = transactions.alias(relevance=RawSQL(
+                f'MATCH ({Transaction._meta.db_table}.description) AGAINST (%s IN BOOLEAN MODE)',
+                (' '.join(f'+{term}*' for term in indexed),),
+                output_field=FloatField()
+            )).filter(relevance__gt=0)
+        terms = [term for term in terms if len(term) < MYSQL_MIN_TOKEN_SIZE]
+
+    for term in terms:
+        transactions = transactions.filter(description__icontains=term)
+    return transactions
+
+
+def parse_filters(params):
+    """Listing filters from request parameters; values that don't parse are left out"""
+    filters = {
+        'type': params.get('type', 'all'),
+        'q': params.get('q', '').strip(),
+        'start_date': None,
+        'end_date': None,
+        'category': None,
+        'min_amount': None,
+        'max_amount': None,
+    }
+    for name in ('start_date', 'end_date'):
+        try:
+            filters[name] = date.fromisoformat(params.get(name, ''))
+        except ValueError:
+            pass
+    for name in ('min_amount', 'max_amount'):
+        try:
+            value = Decimal(params.get(name, ''))
+            if not value.is_finite():
+                raise ValueError(value)
+            filters[name] = value
+        except (InvalidOperation, ValueError):
+            pass
+    if params.get('category', '').isdigit():
+        filters['category'] = int(params['category'])
+    return filters
+
+
+def filter_transactions(transactions, filters):
+    """Apply parse_filters() output to a Transaction queryset"""
+    if filters['type'] in ('income', 'expense'):
+        transactions = transactions.filter(transaction_type=filters['type'])
+    if filters['start_date']:
+        transactions = transactions.filter(date__gte=filters['start_date'])
+    if filters['end_date']:
+        transactions = transactions.filter(date__lte=filters['end_date'])
+    if filters['category']:
+        transactions = transactions.filter(category_id=filters['category'])
+    if filters['min_amount'] is not None:
+        transactions = transactions.filter(amount__gte=filters['min_amount'])
+    if filters['max_amount'] is not None:
+        transactions = transactions.filter(amount__lte=filters['max_amount'])
+    return search_descriptions(transactions, filters['q'])
+
+
+def make_cursor(transaction_obj):
+    return f'{transaction_obj.date:%Y-%m-%d}.{transaction_obj.id}'
+
+
+def parse_cursor(cursor):
+    """(date, id) from a cursor, or None when it is missing or malformed"""
+    try:
+        day, pk = (cursor or '').split('.')
+        return date.fromisoformat(day), int(pk)
+    except ValueError:
+        return None
+
+
+def _before(day, pk):
+    return Q(date__lt=day) | Q(date=day, id__lt=pk)
+
+
+def _at_or_before(day, pk):
+    return Q(date__lt=day) | Q(date=day, id__lte=pk)
+
+
+@cached_per_user('balance_through')
+def balance_through(user_id, cursor):
+    """The user's balance in paise after the transaction at cursor, over all their transactions"""
+    return Transaction.objects.filter(user_id=user_id).filter(_at_or_before(*parse_cursor(cursor))).aggregate(
+        balance=Sum(SIGNED_MINOR)
+    )['balance'] or 0
+
+
+def with_balances(user_id, page):
+    """Pair each transaction of a newest-first page with the user's balance after it"""
+    if not page:
+        return []
+    newest, oldest = page[0], page[-1]
+    balance = balance_through(user_id, make_cursor(newest))
+
+    # Filtered-out transactions between the page's rows move the balance too
+    spanned = Transaction.objects.filter(user_id=user_id).filter(
+        _at_or_before(newest.date, newest.id)
+    ).exclude(
+        _before(oldest.date, oldest.id)
+    ).order_by('-date', '-id').values_list('id', 'transaction_type', 'amount_minor')
+
+    balances = {}
+    for pk, transaction_type, amount in spanned.iterator():
+        balances[pk] = balance
+        balance -= amount if transaction_type == 'income' else -amount
+    return [
+        {'transaction': transaction_obj, 'balance': from_minor(balances[transaction_obj.id])}
+        for transaction_obj in page
+    ]
+
+
+def transaction_page(user, filters, cursor=None, page_size=PAGE_SIZE):
+    """One newest-first page of the user's filtered transactions with running balances.
+
+    Returns (rows, next_cursor), where rows are {'transaction', 'balance'}
+    dicts and next_cursor is None on the last page.
+    """
+    transactions = filter_transactions(Transaction.objects.filter(user=user), filters)
+    position = parse_cursor(cursor)
+    if position:
+        transactions = transactions.filter(_before(*position))
+    page = list(transactions.order_by('-date', '-id')[:page_size + 1])
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = make_cursor(page[-1])
+    return with_balances(user.id, page), next_cursor
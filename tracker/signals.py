@@ -0,0 +1,204 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from . import categorizer, ledger
+from .budget_alerts import contribution, record_expense_change, reset_counters, stored_contribution
+from .events import bump_user_version
+from .fragments import invalidate_panel, panels_for_model
+from .money import to_minor
+from .models import (
+    Budget, CategoryRule, Expense, ExpenseCategory, GoalContribution, RecurringTransaction,
+    SavingsGoal, Transaction, TransactionNotification, UserProfile
+)
+
+# Every model whose rows feed cached per-user data
+LEDGER_MODELS = (
+    Transaction, Expense, ExpenseCategory, Budget, SavingsGoal,
+    GoalContribution, RecurringTransaction, TransactionNotification,
+)
+
+
+def _owner_id(instance):
+    """The id of the user a ledger row belongs to"""
+    if isinstance(instance, Expense):
+        return instance.transaction.user_id
+    if isinstance(instance, GoalContribution):
+        return instance.goal.user_id
+    return instance.user_id
+
+
+def _cascading_from(origin, *models):
+    """Whether a delete is part of a cascade started by deleting one of models (an instance or queryset)"""
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+def ledger_changed(sender, instance, **kwargs):
+    """Invalidate the user's cached data and wake their dashboards once the change commits"""
+    if sender is TransactionNotification and instance.is_read and kwargs.get('signal') is post_delete:
+        # Read notifications aren't shown anywhere, so pruning them changes nothing
+        return
+    user_id = _owner_id(instance)
+    if user_id is None:
+        return
+    panels = panels_for_model(sender)
+
+    def invalidate():
+        bump_user_version(user_id)
+        for panel in panels:
+            invalidate_panel(panel, user_id)
+    transaction.on_commit(invalidate)
+
+
+for _model in LEDGER_MODELS:
+    post_save.connect(ledger_changed, sender=_model, dispatch_uid=f'ledger_{_model.__name__}_save')
+    post_delete.connect(ledger_changed, sender=_model, dispatch_uid=f'ledger_{_model.__name__}_delete')
+
+
+@receiver(m2m_changed, sender=ExpenseCategory.hidden_by.through)
+def category_visibility_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Hiding or restoring a default category changes the affected users' category lists"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    user_ids = [instance.pk] if reverse else list(pk_set or ())
+
+    def invalidate():
+        for user_id in user_ids:
+            bump_user_version(user_id)
+            categorizer.forget(user_id)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=ExpenseCategory)
+@receiver(post_delete, sender=ExpenseCategory)
+@receiver(post_save, sender=CategoryRule)
+@receiver(post_delete, sender=CategoryRule)
+def categorizer_inputs_changed(sender, instance, **kwargs):
+    """Rebuild the owner's category suggestions; a shared default changes everyone's"""
+    if instance.user_id is None:
+        transaction.on_commit(categorizer.forget_all)
+    else:
+        transaction.on_commit(lambda: categorizer.forget(instance.user_id))
+
+
+@receiver(post_save, sender=TransactionNotification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """Keep the profile's unread counter in step with new notifications"""
+    if created and not instance.is_read:
+        UserProfile.objects.filter(user_id=instance.user_id).update(
+            unread_notifications=F('unread_notifications') + 1
+        )
+
+
+@receiver(post_delete, sender=TransactionNotification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        UserProfile.objects.filter(user_id=instance.user_id).update(
+            unread_notifications=Greatest(F('unread_notifications') - 1, 0)
+        )
+
+
+@receiver(pre_save, sender=Transaction)
+def set_amount_minor(sender, instance, **kwargs):
+    """Keep the paise copy of the amount in step with the amount"""
+    instance.amount_minor = to_minor(instance.amount)
+
+
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Transaction)
+def remember_stored_expense(sender, instance, raw=False, **kwargs):
+    """Note what an expense counted towards before the save changes it"""
+    if raw or instance.pk is None:
+        return
+    lookup = {'pk': instance.pk} if sender is Expense else {'transaction_id': instance.pk}
+    instance._stored_contribution = stored_contribution(**lookup)
+    if sender is Transaction:
+        # The Expense row owns the category; don't let a stale in-memory copy overwrite it
+        instance.category_id = instance._stored_contribution[1] if instance._stored_contribution else None
+
+
+@receiver(post_save, sender=Expense)
+def expense_saved(sender, instance, created, raw=False, **kwargs):
+    """Copy the category to the transaction, move the amount between budget counters, raise alerts and learn the category"""
+    if raw:
+        return
+    transaction_obj = instance.transaction
+    old = instance.__dict__.pop('_stored_contribution', None)
+    if transaction_obj.category_id != instance.category_id:
+        Transaction.objects.filter(pk=transaction_obj.pk).update(category_id=instance.category_id)
+        transaction_obj.category_id = instance.category_id
+    record_expense_change(
+        old,
+        contribution(transaction_obj.user_id, instance.category_id, transaction_obj.date, transaction_obj.amount),
+        transaction_obj
+    )
+    if instance.category_id is not None and (old is None or old[1] != instance.category_id):
+        transaction.on_commit(lambda: categorizer.learn(
+            transaction_obj.user_id, transaction_obj.description, instance.category_id
+        ))
+
+
+@receiver(post_save, sender=Transaction)
+def expense_transaction_saved(sender, instance, created, raw=False, **kwargs):
+    old = instance.__dict__.pop('_stored_contribution', None)
+    if raw or old is None:
+        return
+    # Saving the transaction can change an expense's amount or date, never its category
+    record_expense_change(old, contribution(instance.user_id, old[1], instance.date, instance.amount), instance)
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, origin=None, **kwargs):
+    # The user's budgets and their counters go in the same cascade
+    if _cascading_from(origin, User):
+        return
+    transaction_obj = instance.transaction
+    if transaction_obj.category_id is not None:
+        Transaction.objects.filter(pk=transaction_obj.pk).update(category_id=None)
+        transaction_obj.category_id = None
+    record_expense_change(
+        contribution(transaction_obj.user_id, instance.category_id, transaction_obj.date, transaction_obj.amount),
+        None
+    )
+
+
+@receiver(post_save, sender=Budget)
+def budget_saved(sender, instance, created, **kwargs):
+    # The amount or dates may have changed, so counters are re-seeded on the next expense
+    if not created:
+        reset_counters(instance)
+
+
+@receiver(pre_save, sender=Transaction)
+@receiver(pre_save, sender=SavingsGoal)
+@receiver(pre_save, sender=GoalContribution)
+def remember_ledger_state(sender, instance, raw=False, **kwargs):
+    """Snapshot the stored row so the ledger event can carry its before state"""
+    if raw or instance.pk is None:
+        return
+    instance._ledger_before = ledger.stored_snapshot(sender, instance.pk)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_save, sender=SavingsGoal)
+@receiver(post_save, sender=GoalContribution)
+def record_ledger_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    before = instance.__dict__.pop('_ledger_before', None)
+    if raw:
+        return
+    # A partial save leaves the other fields as stored, and the instance may hold stale copies of them
+    after = ledger.stored_snapshot(sender, instance.pk) if update_fields else ledger.snapshot(instance)
+    ledger.record(instance, 'created' if created else 'updated', before, after)
+
+
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=SavingsGoal)
+@receiver(post_delete, sender=GoalContribution)
+def record_ledger_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the user cascades to their events too; an event written now would point at a removed user
+    if _cascading_from(origin, User):
+        return
+    ledger.record(instance, 'deleted', ledger.snapshot(instance), None)
@@ -4,14 +4,33 @@ import logging
 from datetime import datetime, date
 from django.db import transaction
 from .models import RecurringTransaction, Transaction, TransactionNotification
+from .categorizer import file_expense
+from .dispatch import get_default_bucket
+from .journal import SchedulerJournal
 
 logger = logging.getLogger(__name__)
 
-def check_scheduled_debits(force=False, user=None):
-    """Check savings goals for scheduled debits, filtered by user if specified"""
+def check_scheduled_debits(force=False, user=None, bucket=None, now=None):
+    """Check savings goals for scheduled debits, filtered by user if specified.
+
+    `now` is the clock reading used for every goal in the run (defaults to
+    timezone.now()), so callers never need to patch the global clock. Batch
+    runs (no user) are rate-limited with the default token bucket unless a
+    bucket is passed in explicitly.
+    """
+    if user:
+        return _check_debits(force, user, bucket, now, journal=None)
+    
+    # Batch runs are recorded in the scheduler run journal
+    with SchedulerJournal('auto_debits', now=now) as journal:
+        return _check_debits(force, user, bucket or get_default_bucket(), now, journal)
+
+def _check_debits(force, user, bucket, now, journal):
+    """Body of check_scheduled_debits, optionally recording into a run journal"""
     processed_count = 0
     processed_goals = []
-    now = timezone.now()
+    if now is None:
+        now = timezone.now()
     
     logger.info(f"Starting scheduled debit check at {now}{' (FORCED)' if force else ''}")
     
@@ -24,15 +43,17 @@ def check_scheduled_debits(force=False, user=None):
     # If a specific user is provided, filter by that user
     if user:
         active_goals_query = active_goals_query.filter(user=user)
-        logger.info(f"Checking debits for user {user.username} only")
+        logger.debug(f"Checking debits for user {user.username} only")
     
-    active_goals = active_goals_query
+    active_goals = list(active_goals_query)
+    if journal:
+        journal.scanned(len(active_goals))
     
-    logger.info(f"Found {active_goals.count()} active goals with auto-debit enabled")
+    logger.debug(f"Found {len(active_goals)} active goals with auto-debit enabled")
     
     for goal in active_goals:
         # Pass the force parameter to the goal's processing method
-        success, message = goal.process_scheduled_debit(force=force)
+        success, message = goal.process_scheduled_debit(force=force, bucket=bucket, now=now)
         if success:
             processed_count += 1
             processed_goals.append({
@@ -41,53 +62,66 @@ def check_scheduled_debits(force=False, user=None):
                 'amount': float(goal.monthly_contribution),
                 'message': message
             })
-            logger.info(f"Processed debit for goal '{goal.name}' ({goal.id}): {message}")
+            if journal:
+                journal.posted(None if force else goal.scheduled_debit_at(now))
+            logger.debug(f"Processed debit for goal '{goal.name}' ({goal.id}): {message}")
         else:
+            if journal and message.startswith('Error'):
+                journal.error()
             logger.debug(f"Skipped debit for goal '{goal.name}' ({goal.id}): {message}")
     
     logger.info(f"Completed scheduled debit check. Processed {processed_count} debits.")
     return processed_count, processed_goals
 
-def process_recurring_transactions():
-    today = date.today()
+def process_recurring_transactions(bucket=None, now=None):
+    """Post every recurring transaction that is due at `now` (defaults to timezone.now())"""
+    if now is None:
+        now = timezone.now()
+    today = now.date()
     processed_count = 0
+    if bucket is None:
+        bucket = get_default_bucket()
     
-    # Get all active recurring transactions
-    recurring_transactions = RecurringTransaction.objects.filter(
-        is_active=True,
-        start_date__lte=today
-    )
-    
-    for rt in recurring_transactions:
-        # Check if it's time to process this transaction
-        if rt.should_process_today():
+    with SchedulerJournal('recurring', now=now) as journal:
+        # Get all active recurring transactions
+        recurring_transactions = list(RecurringTransaction.objects.filter(
+            is_active=True,
+            start_date__lte=today
+        ))
+        journal.scanned(len(recurring_transactions))
+        
+        for rt in recurring_transactions:
+            # Check if it's time to process this transaction
+            if not rt.should_process_today(now=now):
+                continue
+            
+            bucket.acquire()
             try:
                 with transaction.atomic():
                     # Create the transaction
                     transaction_obj = Transaction.objects.create(
-                        user=rt.user,
+                        user_id=rt.user_id,
                         amount=rt.amount,
                         description=f"Recurring {rt.transaction_type}: {rt.name}",
                         date=today,
                         transaction_type=rt.transaction_type
                     )
+                    if rt.transaction_type == 'expense':
+                        file_expense(transaction_obj)
                     
                     # Create notification for the transaction
-                    action_word = "credited" if rt.transaction_type == "income" else "debited"
-                    TransactionNotification.objects.create(
-                        user=rt.user,
-                        transaction=transaction_obj,
-                        message=f"Your {rt.name} of ₹{rt.amount} has been {action_word} to your account.",
-                        notification_type=rt.transaction_type
-                    )
+                    TransactionNotification.create_for(transaction_obj, 'recurring_posted', name=rt.name)
                     
                     # Update last processed date
                     rt.last_processed = today
                     rt.save()
-                    
-                    processed_count += 1
-                    logger.info(f"Processed recurring transaction: {rt.name}")
+                
+                processed_count += 1
+                # Lag runs to the commit, so time spent waiting for a token counts
+                journal.posted(rt.scheduled_at(now))
+                logger.debug(f"Processed recurring transaction: {rt.name}")
             except Exception as e:
+                journal.error()
                 logger.error(f"Error processing transaction {rt.name}: {str(e)}")
     
     logger.info(f"Completed processing {processed_count} recurring transactions")
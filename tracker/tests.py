@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import categorizer
+from .cache import bump_version, cached_per_user, get_cache, get_version, memoize, stats
+from .categorization import apply_rules, categorize_uncategorized, merge_categories
+from .digests import DigestBuilder
+from .dispatch import TokenBucket, jitter_offset, jittered_time
+from .events import get_user_version
+from .forecasting import BudgetForecaster
+from .fragments import render_panel
+from .journal import SchedulerJournal
+from .ledger import backfill
+from .money import from_minor, to_minor
+from .projections import ProjectionRunner
+from .recommendations import FinancialRecommendationEngine
+from .search import filter_transactions, parse_filters, transaction_page
+from .tasks import check_scheduled_debits, process_recurring_transactions
+from .models import (
+    AccountBalance, Budget, BudgetPeriodSpend, CategoryRule, EmailOutbox, Expense, ExpenseCategory, GoalTotal,
+    LedgerEvent, MonthlyRollup, ProjectionCheckpoint, RecurringTransaction, SavingsGoal, Transaction,
+    TransactionNotification, UserProfile
+)
+from .utils import backoff_delay, queue_email, send_otp_email, send_queued_emails
+from .views import _ledger_event_stream, get_goal_balance_history, get_user_categories
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept (or refuse) messages from Django's SMTP backend"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 stand-in ESMTP')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.reply('250-stand-in')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 stand-in')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(data_line)
+                with server.lock:
+                    refuse = server.refuse_next > 0
+                    if refuse:
+                        server.refuse_next -= 1
+                    else:
+                        server.messages.append((recipients, b''.join(data)))
+                self.reply('451 Try again later' if refuse else '250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+        self.refuse_next = 0
+
+
+class EmailOutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.smtp = StandInSMTPServer()
+        cls.smtp_thread = threading.Thread(target=cls.smtp.serve_forever, daemon=True)
+        cls.smtp_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.smtp.shutdown()
+        cls.smtp.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.smtp.connections = 0
+        self.smtp.messages = []
+        self.smtp.refuse_next = 0
+        self.settings_override = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_TIMEOUT=5,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_otp_email_is_queued_not_sent(self):
+        user = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        send_otp_email(user, '123456')
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.to_email, 'alice@example.com')
+        self.assertEqual(email.status, 'pending')
+        self.assertIn('123456', email.body)
+        self.assertIn('123456', email.html_body)
+        self.assertEqual(self.smtp.connections, 0)
+
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(3):
+            queue_email(f'user{i}@example.com', 'Hello', 'Body')
+
+        sent, failed = send_queued_emails(batch_size=10)
+
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(
+            sorted(recipients[0] for recipients, _ in self.smtp.messages),
+            ['user0@example.com', 'user1@example.com', 'user2@example.com']
+        )
+        self.assertFalse(EmailOutbox.objects.exclude(status='sent').exists())
+
+    def test_batch_size_limits_each_run(self):
+        for i in range(5):
+            queue_email(f'user{i}@example.com', 'Hello', 'Body')
+
+        self.assertEqual(send_queued_emails(batch_size=2), (2, 0))
+        self.assertEqual(EmailOutbox.objects.filter(status='pending').count(), 3)
+
+    def test_refused_email_backs_off_and_is_retried(self):
+        email = queue_email('bob@example.com', 'Hello', 'Body')
+        self.smtp.refuse_next = 1
+        now = timezone.now()
+
+        self.assertEqual(send_queued_emails(now=now), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.next_attempt_at, now + timedelta(seconds=backoff_delay(1)))
+        self.assertIn('451', email.last_error)
+
+        # Not due yet, so nothing is picked up
+        self.assertEqual(send_queued_emails(now=now + timedelta(seconds=1)), (0, 0))
+
+        self.assertEqual(send_queued_emails(now=email.next_attempt_at), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'sent')
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        email = queue_email('carol@example.com', 'Hello', 'Body')
+        self.smtp.refuse_next = 10
+        now = timezone.now()
+
+        for _ in range(3):
+            send_queued_emails(max_attempts=3, now=now)
+            now += timedelta(seconds=backoff_delay(3))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+        self.assertEqual(email.attempts, 3)
+        self.assertEqual(send_queued_emails(max_attempts=3, now=now), (0, 0))
+
+    def test_unreachable_server_keeps_emails_queued(self):
+        queue_email('dave@example.com', 'Hello', 'Body')
+
+        with override_settings(EMAIL_PORT=1):
+            self.assertEqual(send_queued_emails(), (0, 1))
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual(backoff_delay(1), 60)
+        self.assertEqual(backoff_delay(2), 120)
+        self.assertEqual(backoff_delay(3), 240)
+        self.assertEqual(backoff_delay(20), 60 * 60)
+
+
+class BudgetAlertTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('erin', 'erin@example.com', 'pw')
+        self.food = ExpenseCategory.objects.create(user=self.user, name='Food')
+        self.today = timezone.now().date()
+        self.budget = Budget.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal('100'),
+            start_date=self.today.replace(day=1)
+        )
+
+    def add_expense(self, amount, category=None, day=None):
+        transaction_obj = Transaction.objects.create(
+            user=self.user,
+            amount=amount,
+            description='Lunch',
+            date=day or self.today,
+            transaction_type='expense'
+        )
+        Expense.objects.create(transaction=transaction_obj, category=category or self.food)
+        return transaction_obj
+
+    def counter(self):
+        return BudgetPeriodSpend.objects.get(budget=self.budget, period_start=self.today.replace(day=1))
+
+    def alerts(self):
+        return list(TransactionNotification.objects.filter(
+            user=self.user,
+            template_code__in=['budget_warning', 'budget_exceeded']
+        ).order_by('id').values_list('template_code', flat=True))
+
+    def test_counter_follows_creates_edits_and_deletes(self):
+        first = self.add_expense('30')
+        self.add_expense('20')
+        self.assertEqual(self.counter().spent, Decimal('50'))
+
+        first.amount = Decimal('10')
+        first.save()
+        self.assertEqual(self.counter().spent, Decimal('30'))
+
+        first.delete()
+        self.assertEqual(self.counter().spent, Decimal('20'))
+        self.assertEqual(self.counter().spent, Budget.objects.with_spent(self.today).get().spent)
+
+    def test_moving_an_expense_to_another_category_moves_its_spend(self):
+        travel = ExpenseCategory.objects.create(user=self.user, name='Travel')
+        travel_budget = Budget.objects.create(
+            user=self.user, category=travel, amount=Decimal('100'), start_date=self.today.replace(day=1)
+        )
+        transaction_obj = self.add_expense('40')
+
+        expense = transaction_obj.expense_details
+        expense.category = travel
+        expense.save()
+
+        self.assertEqual(self.counter().spent, Decimal('0'))
+        self.assertEqual(BudgetPeriodSpend.objects.get(budget=travel_budget).spent, Decimal('40'))
+
+    def test_each_threshold_alerts_once_per_period(self):
+        self.add_expense('50')
+        self.assertEqual(self.alerts(), [])
+
+        self.add_expense('35')
+        self.add_expense('5')
+        self.assertEqual(self.alerts(), ['budget_warning'])
+
+        self.add_expense('15')
+        self.add_expense('15')
+        self.assertEqual(self.alerts(), ['budget_warning', 'budget_exceeded'])
+        self.assertEqual(self.counter().alert_level, 100)
+
+    def test_dropping_below_a_threshold_rearms_it(self):
+        self.add_expense('60')
+        big = self.add_expense('45')
+        self.assertEqual(self.alerts(), ['budget_exceeded'])
+
+        # The alert goes with the transaction that raised it
+        big.delete()
+        self.assertEqual(self.counter().alert_level, 0)
+        self.assertEqual(self.alerts(), [])
+
+        self.add_expense('25')
+        self.assertEqual(self.alerts(), ['budget_warning'])
+
+    def test_expenses_outside_the_budget_dates_are_ignored(self):
+        self.budget.start_date = self.today
+        self.budget.save()
+        if self.today.day > 1:
+            self.add_expense('90', day=self.today - timedelta(days=1))
+        self.add_expense('10')
+
+        self.assertEqual(self.counter().spent, Decimal('10'))
+        self.assertEqual(self.alerts(), [])
+
+    def test_counter_is_seeded_from_existing_expenses(self):
+        self.add_expense('70')
+        BudgetPeriodSpend.objects.all().delete()
+
+        self.add_expense('15')
+
+        self.assertEqual(self.counter().spent, Decimal('85'))
+        self.assertEqual(self.alerts(), ['budget_warning'])
+
+
+    def test_deleting_the_user_removes_budgeted_expenses(self):
+        self.add_expense(Decimal('90'))
+        self.user.delete()
+        self.assertFalse(Budget.objects.exists())
+        self.assertFalse(BudgetPeriodSpend.objects.exists())
+
+    def test_digest_counts_each_expense_once(self):
+        UserProfile.objects.create(user=self.user)
+        transaction_obj = self.add_expense(Decimal('90'))
+        TransactionNotification.create_for(transaction_obj, 'expense_added')
+        self.assertEqual(self.alerts(), ['budget_warning'])
+
+        [(_, email)] = DigestBuilder('daily').build_batch([self.user])
+        self.assertIn('Expenses: 1 posting,', email.body)
+        self.assertIn('You have used 90% of your Food budget', email.body)
+
+
+class BudgetSpentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('remy', 'remy@example.com', 'pw')
+        # Budget.spent reads the month of datetime.now(), so with_spent is given the same day
+        self.today = datetime.now().date()
+        self.month_start = self.today.replace(day=1)
+        self.month_end = self.month_start + relativedelta(months=1, days=-1)
+
+    def budget(self, name, start_date, end_date=None):
+        category = ExpenseCategory.objects.create(user=self.user, name=name)
+        return Budget.objects.create(
+            user=self.user, category=category, amount=Decimal('1000'), start_date=start_date, end_date=end_date
+        )
+
+    def add_expense(self, budget, amount, day):
+        transaction_obj = Transaction.objects.create(
+            user=self.user, amount=amount, description='Spend', date=day, transaction_type='expense'
+        )
+        Expense.objects.create(transaction=transaction_obj, category=budget.category)
+
+    def assertSpentMatches(self, budget, expected):
+        annotated = Budget.objects.with_spent(self.today).get(pk=budget.pk)
+        self.assertIn('annotated_spent', annotated.__dict__)
+        self.assertEqual(annotated.spent, Budget.objects.get(pk=budget.pk).spent)
+        self.assertEqual(annotated.spent, Decimal(expected))
+
+    def test_budget_without_expenses_spends_zero(self):
+        self.assertSpentMatches(self.budget('Food', self.month_start), '0')
+
+    def test_only_the_current_month_counts(self):
+        budget = self.budget('Food', self.month_start - relativedelta(months=2))
+        self.add_expense(budget, '1', self.month_start - timedelta(days=1))
+        self.add_expense(budget, '10', self.month_start)
+        self.add_expense(budget, '20', self.month_end)
+        self.add_expense(budget, '100', self.month_end + timedelta(days=1))
+        self.assertSpentMatches(budget, '30')
+
+    def test_budget_dates_clip_the_month(self):
+        middle = self.month_start + timedelta(days=10)
+        starts_mid_month = self.budget('Travel', middle)
+        self.add_expense(starts_mid_month, '1', middle - timedelta(days=1))
+        self.add_expense(starts_mid_month, '10', middle)
+        self.add_expense(starts_mid_month, '20', self.month_end)
+        self.assertSpentMatches(starts_mid_month, '30')
+
+        ends_mid_month = self.budget('Rent', self.month_start - relativedelta(months=1), end_date=middle)
+        self.add_expense(ends_mid_month, '10', self.month_start)
+        self.add_expense(ends_mid_month, '20', middle)
+        self.add_expense(ends_mid_month, '100', middle + timedelta(days=1))
+        self.assertSpentMatches(ends_mid_month, '30')
+
+        starts_next_month = self.budget('Gifts', self.month_end + timedelta(days=1))
+        self.add_expense(starts_next_month, '10', self.month_end)
+        self.assertSpentMatches(starts_next_month, '0')
+
+        ended_last_month = self.budget(
+            'Books', self.month_start - relativedelta(months=2), end_date=self.month_start - timedelta(days=1)
+        )
+        self.add_expense(ended_last_month, '10', self.month_start)
+        self.assertSpentMatches(ended_last_month, '0')
+
+class BudgetForecastTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('frank', 'frank@example.com', 'pw')
+        self.food = ExpenseCategory.objects.create(user=self.user, name='Food')
+        self.now = timezone.make_aware(datetime(2026, 4, 10, 12, 0))
+        self.today = self.now.date()
+
+    def spend_daily(self, start, end, amount='10'):
+        day = start
+        while day <= end:
+            transaction_obj = Transaction.objects.create(
+                user=self.user, amount=amount, description='Groceries', date=day, transaction_type='expense'
+            )
+            Expense.objects.create(transaction=transaction_obj, category=self.food)
+            day += timedelta(days=1)
+
+    def test_steady_spend_projects_to_a_full_month(self):
+        self.spend_daily(date(2026, 1, 1), date(2026, 4, 10))
+        budget = Budget.objects.create(user=self.user, category=self.food, amount=Decimal('250'), start_date=date(2026, 1, 1))
+
+        forecaster = BudgetForecaster(now=self.now)
+        self.assertEqual(forecaster.update(forecaster.budgets_to_forecast()), 1)
+
+        budget.refresh_from_db()
+        self.assertEqual(budget.forecast_spend, Decimal('300.00'))
+        self.assertEqual(budget.forecast_for(self.today), Decimal('300.00'))
+        self.assertIsNone(budget.forecast_for(date(2026, 5, 1)))
+
+    def test_budget_starting_mid_month_projects_its_own_window(self):
+        self.spend_daily(date(2026, 4, 1), date(2026, 4, 10))
+        budget = Budget.objects.create(user=self.user, category=self.food, amount=Decimal('250'), start_date=date(2026, 4, 6))
+
+        projected, = BudgetForecaster(now=self.now).forecast([budget])
+
+        # 50 spent over 5 days of a 25-day window
+        self.assertAlmostEqual(projected, 250.0)
+
+
+class DefaultCategoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('gina', 'gina@example.com', 'pw')
+
+    def names(self, user):
+        return set(ExpenseCategory.objects.for_user(user).values_list('name', flat=True))
+
+    def test_registration_copies_no_categories(self):
+        self.client.post('/register/', {
+            'username': 'hank',
+            'email': 'hank@example.com',
+            'password': 'pw',
+            'confirm_password': 'pw',
+            'reset_word': 'word',
+        })
+
+        hank = User.objects.get(username='hank')
+        self.assertFalse(ExpenseCategory.objects.filter(user=hank).exists())
+        self.assertEqual(self.names(hank), set(ExpenseCategory.DEFAULT_NAMES))
+
+    def test_own_categories_and_hidden_defaults_override_the_catalogue(self):
+        ExpenseCategory.objects.create(user=self.user, name='Travel')
+        ExpenseCategory.objects.defaults().get(name='Insurance').hidden_by.add(self.user)
+
+        categories = list(ExpenseCategory.objects.for_user(self.user).filter(name__in=['Travel', 'Insurance']))
+
+        self.assertEqual([(c.name, c.user_id) for c in categories], [('Travel', self.user.id)])
+
+    def test_update_categories_folds_copies_into_the_catalogue(self):
+        copies = {
+            name: ExpenseCategory.objects.create(user=self.user, name=name)
+            for name in ExpenseCategory.DEFAULT_NAMES if name != 'Other'
+        }
+        transaction_obj = Transaction.objects.create(
+            user=self.user, amount='5', description='Bus', date=date(2026, 4, 2), transaction_type='expense'
+        )
+        Expense.objects.create(transaction=transaction_obj, category=copies['Transportation'])
+        budget = Budget.objects.create(user=self.user, category=copies['Transportation'], amount=Decimal('50'))
+        rule = CategoryRule.objects.create(user=self.user, category=copies['Transportation'], description_contains='bus')
+
+        call_command('update_categories', stdout=StringIO())
+        call_command('update_categories', stdout=StringIO())
+
+        transportation = ExpenseCategory.objects.defaults().get(name='Transportation')
+        self.assertFalse(ExpenseCategory.objects.filter(user=self.user).exists())
+        self.assertEqual(Expense.objects.get(transaction=transaction_obj).category_id, transportation.id)
+        budget.refresh_from_db()
+        self.assertEqual(budget.category_id, transportation.id)
+        self.assertEqual(CategoryRule.objects.get(pk=rule.pk).category_id, transportation.id)
+        # 'Other' had been deleted from the copied set, so it stays hidden
+        self.assertEqual(self.names(self.user), set(ExpenseCategory.DEFAULT_NAMES) - {'Other'})
+
+
+class RecategorizationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ivy', 'ivy@example.com', 'pw')
+        self.misc = ExpenseCategory.objects.create(user=self.user, name='Misc')
+        self.travel = ExpenseCategory.objects.create(user=self.user, name='Travel')
+        self.today = timezone.now().date()
+
+    def add_expense(self, description, amount, category=None):
+        transaction_obj = Transaction.objects.create(
+            user=self.user, amount=amount, description=description, date=self.today, transaction_type='expense'
+        )
+        return Expense.objects.create(transaction=transaction_obj, category=category or self.misc)
+
+    def categories(self):
+        return dict(Expense.objects.filter(
+            transaction__user=self.user
+        ).values_list('transaction__description', 'category__name'))
+
+    def test_rules_apply_in_chunks_and_highest_priority_wins(self):
+        flights = ExpenseCategory.objects.create(user=self.user, name='Flights')
+        for i in range(5):
+            self.add_expense(f'Uber trip {i}', '10')
+        self.add_expense('Uber to airport', '80')
+        self.add_expense('Coffee', '5')
+        CategoryRule.objects.create(user=self.user, category=self.travel, description_contains='uber')
+        CategoryRule.objects.create(user=self.user, category=flights, description_contains='uber', min_amount=50, priority=1)
+
+        results = apply_rules(self.user, chunk_size=2)
+
+        self.assertEqual([moved for _, moved in results], [6, 1])
+        categories = self.categories()
+        self.assertEqual(categories['Uber trip 3'], 'Travel')
+        self.assertEqual(categories['Uber to airport'], 'Flights')
+        self.assertEqual(categories['Coffee'], 'Misc')
+
+    def test_rules_rebuild_touched_budget_counters(self):
+        budget = Budget.objects.create(
+            user=self.user, category=self.travel, amount=Decimal('100'), start_date=self.today.replace(day=1)
+        )
+        self.add_expense('Taxi', '30', category=self.travel)
+        self.add_expense('Train ticket', '50')
+        CategoryRule.objects.create(user=self.user, category=self.travel, description_contains='train')
+
+        apply_rules(self.user)
+
+        counter = BudgetPeriodSpend.objects.get(budget=budget)
+        self.assertEqual(counter.spent, Decimal('80'))
+        self.assertEqual(counter.alert_level, 80)
+
+    def test_merge_moves_expenses_budgets_and_rules(self):
+        self.add_expense('Bus', '10', category=self.travel)
+        budget = Budget.objects.create(user=self.user, category=self.travel, amount=Decimal('100'))
+        rule = CategoryRule.objects.create(user=self.user, category=self.travel, description_contains='bus')
+
+        self.assertEqual(merge_categories(self.user, self.travel, self.misc), 1)
+
+        self.assertFalse(ExpenseCategory.objects.filter(pk=self.travel.pk).exists())
+        self.assertEqual(self.categories(), {'Bus': 'Misc'})
+        budget.refresh_from_db()
+        rule.refresh_from_db()
+        self.assertEqual((budget.category_id, rule.category_id), (self.misc.id, self.misc.id))
+
+
+class CategorizerTests(TestCase):
+    def setUp(self):
+        # Indexes are cached per process, and ids are reused between tests
+        categorizer.forget_all()
+        self.user = User.objects.create_user('jo', 'jo@example.com', 'pw')
+        self.food = ExpenseCategory.objects.create(user=self.user, name='Food')
+        self.travel = ExpenseCategory.objects.create(user=self.user, name='Travel')
+        self.today = timezone.now().date()
+
+    def add_expense(self, description, category=None, amount='10'):
+        transaction_obj = Transaction.objects.create(
+            user=self.user, amount=amount, description=description, date=self.today, transaction_type='expense'
+        )
+        return Expense.objects.create(transaction=transaction_obj, category=category)
+
+    def test_suggests_from_merchant_prefix_and_tokens(self):
+        for i in range(3):
+            self.add_expense(f'Uber eats order #{i}', self.food)
+        self.add_expense('Uber trip to office', self.travel)
+        self.add_expense('Uber trip 2', self.travel)
+        self.add_expense('Train to Pune', self.travel)
+
+        self.assertEqual(categorizer.suggest_category(self.user.id, 'UBER EATS 4411'), self.food.id)
+        self.assertEqual(categorizer.suggest_category(self.user.id, 'uber trip home'), self.travel.id)
+        self.assertEqual(categorizer.suggest_category(self.user.id, 'Night train'), self.travel.id)
+        self.assertIsNone(categorizer.suggest_category(self.user.id, 'Dentist'))
+
+    def test_rules_take_precedence_over_history(self):
+        self.add_expense('Uber trip', self.travel)
+        CategoryRule.objects.create(user=self.user, category=self.food, description_contains='uber', max_amount=5)
+
+        self.assertEqual(categorizer.suggest_category(self.user.id, 'Uber trip', Decimal('3')), self.food.id)
+        self.assertEqual(categorizer.suggest_category(self.user.id, 'Uber trip', Decimal('30')), self.travel.id)
+
+    def test_falls_back_to_visible_default_categories(self):
+        utilities = ExpenseCategory.objects.defaults().get(name='Utilities')
+
+        self.assertEqual(categorizer.suggest_category(self.user.id, 'Utilities bill'), utilities.id)
+
+        utilities.hidden_by.add(self.user)
+        categorizer.forget(self.user.id)
+        self.assertIsNone(categorizer.suggest_category(self.user.id, 'Utilities bill'))
+
+    def test_learns_new_expenses_into_loaded_index(self):
+        self.assertIsNone(categorizer.suggest_category(self.user.id, 'Gym membership'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_expense('Gym membership', self.food)
+
+        self.assertEqual(categorizer.suggest_category(self.user.id, 'gym membership march'), self.food.id)
+
+    def test_add_expense_without_category_uses_suggestion(self):
+        self.add_expense('Coffee beans', self.food)
+        self.client.force_login(self.user)
+
+        response = self.client.post('/add-expense/', {'amount': '4', 'description': 'Coffee', 'date': self.today})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Expense.objects.get(transaction__description='Coffee').category, self.food)
+
+    def test_categorize_uncategorized_files_in_chunks(self):
+        self.add_expense('Metro card', self.travel)
+        for i in range(5):
+            self.add_expense(f'Metro card top-up {i}')
+        self.add_expense('Something else')
+
+        self.assertEqual(categorize_uncategorized(self.user, chunk_size=2), (6, 5))
+
+        self.assertEqual(
+            Expense.objects.filter(transaction__user=self.user, category=self.travel).count(), 6
+        )
+        self.assertTrue(Expense.objects.filter(transaction__description='Something else', category=None).exists())
+
+
+class TransactionSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('kai', 'kai@example.com', 'pw')
+        self.food = ExpenseCategory.objects.create(user=self.user, name='Food')
+        self.day = date(2026, 3, 1)
+
+    def add(self, description, amount, transaction_type='expense', category=None, days=0):
+        transaction_obj = Transaction.objects.create(
+            user=self.user, amount=amount, description=description,
+            date=self.day + timedelta(days=days), transaction_type=transaction_type
+        )
+        if transaction_type == 'expense':
+            Expense.objects.create(transaction=transaction_obj, category=category)
+        return transaction_obj
+
+    def search(self, **params):
+        transactions = filter_transactions(Transaction.objects.filter(user=self.user), parse_filters(params))
+        return sorted(transactions.values_list('description', flat=True))
+
+    def test_every_word_matches_a_word_prefix(self):
+        self.add('Coffee at Blue Tokai', '4')
+        self.add('Coffee beans', '12')
+        self.add('Decaf coffee', '5')
+        self.add('Toffee', '1')
+
+        self.assertEqual(self.search(q='coff'), ['Coffee at Blue Tokai', 'Coffee beans', 'Decaf coffee'])
+        self.assertEqual(self.search(q='COFFEE blue!'), ['Coffee at Blue Tokai'])
+        self.assertEqual(self.search(q='"offee'), [])
+
+    def test_index_follows_description_edits_and_deletes(self):
+        renamed = self.add('Groceries', '30')
+        deleted = self.add('Groceries again', '20')
+
+        renamed.description = 'Pharmacy'
+        renamed.save()
+        deleted.delete()
+
+        self.assertEqual(self.search(q='groceries'), [])
+        self.assertEqual(self.search(q='pharm'), ['Pharmacy'])
+
+    def test_combines_with_category_and_amount_filters(self):
+        self.add('Lunch', '8', category=self.food)
+        self.add('Lunch with team', '40', category=self.food)
+        self.add('Lunch box', '15')
+
+        self.assertEqual(self.search(q='lunch', category=str(self.food.id), min_amount='10'), ['Lunch with team'])
+        self.assertEqual(self.search(q='lunch', max_amount='20', min_amount='oops'), ['Lunch', 'Lunch box'])
+
+    def test_pages_carry_balances_over_filtered_out_rows(self):
+        self.add('Salary', '1000', transaction_type='income')
+        for i in range(5):
+            # Each day's snack comes after its rent, so the balance after rent leaves out that day's snack
+            self.add(f'Rent share {i}', '100', days=i + 1)
+            self.add(f'Snacks {i}', '1', days=i + 1)
+
+        filters = parse_filters({'q': 'rent'})
+        first, cursor = transaction_page(self.user, filters, page_size=2)
+        second, last_cursor = transaction_page(self.user, filters, cursor=cursor, page_size=2)
+        third, _ = transaction_page(self.user, filters, cursor=last_cursor, page_size=2)
+
+        rows = [(row['transaction'].description, row['balance']) for row in first + second + third]
+        self.assertEqual(rows, [
+            ('Rent share 4', Decimal('496')),
+            ('Rent share 3', Decimal('597')),
+            ('Rent share 2', Decimal('698')),
+            ('Rent share 1', Decimal('799')),
+            ('Rent share 0', Decimal('900')),
+        ])
+
+    def test_transactions_view_pages_search_results(self):
+        for i in range(3):
+            self.add(f'Metro {i}', '2')
+        self.client.force_login(self.user)
+
+        response = self.client.get('/transactions/', {'q': 'metro'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['transactions']), 3)
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_non_finite_amounts_are_left_out(self):
+        self.add('Bus', '3')
+        self.client.force_login(self.user)
+
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf'):
+            self.assertIsNone(parse_filters({'min_amount': value})['min_amount'])
+            self.assertIsNone(parse_filters({'max_amount': value})['max_amount'])
+            response = self.client.get('/transactions/', {'min_amount': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['transactions']), 1)
+
+
+class TransactionCategoryTests(TestCase):
+    def setUp(self):
+        categorizer.forget_all()
+        self.user = User.objects.create_user('lee', 'lee@example.com', 'pw')
+        self.food = ExpenseCategory.objects.create(user=self.user, name='Food')
+        self.travel = ExpenseCategory.objects.create(user=self.user, name='Travel')
+        self.transaction = Transaction.objects.create(
+            user=self.user, amount='12', description='Dinner', date=timezone.now().date(), transaction_type='expense'
+        )
+
+    def stored_category(self):
+        return Transaction.objects.values_list('category_id', flat=True).get(pk=self.transaction.pk)
+
+    def test_follows_expense_saves_and_deletes(self):
+        expense = Expense.objects.create(transaction=self.transaction, category=self.food)
+        self.assertEqual(self.stored_category(), self.food.id)
+
+        expense.category = self.travel
+        expense.save()
+        self.assertEqual(self.stored_category(), self.travel.id)
+
+        expense.delete()
+        self.assertIsNone(self.stored_category())
+
+    def test_stale_transaction_save_keeps_expense_category(self):
+        stale = Transaction.objects.get(pk=self.transaction.pk)
+        Expense.objects.create(transaction=self.transaction, category=self.food)
+
+        stale.amount = Decimal('15')
+        stale.save()
+
+        self.assertEqual(self.stored_category(), self.food.id)
+
+    def test_bulk_recategorization_and_category_deletion(self):
+        Expense.objects.create(transaction=self.transaction, category=self.food)
+        CategoryRule.objects.create(user=self.user, category=self.travel, description_contains='dinner')
+
+        apply_rules(self.user)
+        self.assertEqual(self.stored_category(), self.travel.id)
+
+        self.travel.delete()
+        self.assertIsNone(self.stored_category())
+
+
+    def test_goal_contributions_stay_out_of_category_aggregates(self):
+        Expense.objects.create(transaction=self.transaction, category=self.food)
+        goal = SavingsGoal.objects.create(
+            user=self.user, name='Trip', target_amount='1000.00', monthly_contribution='100.00'
+        )
+        goal.add_contribution(Decimal('100.00'), timezone.now().date(), source='funds', description='To goal')
+
+        engine = FinancialRecommendationEngine(self.user)
+        engine._analyze_discretionary_spending()
+        engine._analyze_category_spending()
+        self.assertNotIn('High Discretionary Spending', [rec['title'] for rec in engine.recommendations])
+        self.assertIn('High Spending in Food', [rec['title'] for rec in engine.recommendations])
+
+class MoneyTests(TestCase):
+    def test_minor_unit_conversions(self):
+        self.assertEqual(to_minor(Decimal('12.34')), 1234)
+        self.assertEqual(to_minor('0.005'), 1)
+        self.assertEqual(to_minor(19.99), 1999)
+        self.assertEqual(from_minor(-1205), Decimal('-12.05'))
+        self.assertEqual(str(from_minor(1200)), '12.00')
+
+    def test_saves_keep_paise_in_step(self):
+        user = User.objects.create_user('mo', 'mo@example.com', 'pw')
+        transaction_obj = Transaction.objects.create(
+            user=user, amount='1234.56', description='Rent', date=date(2026, 3, 1), transaction_type='expense'
+        )
+        self.assertEqual(Transaction.objects.values_list('amount_minor', flat=True).get(), 123456)
+
+        transaction_obj.amount = Decimal('0.10')
+        transaction_obj.save()
+        self.assertEqual(Transaction.objects.values_list('amount_minor', flat=True).get(), 10)
+
+    def test_download_keeps_the_requested_type(self):
+        user = User.objects.create_user('dl', 'dl@example.com', 'pw')
+        Transaction.objects.create(
+            user=user, amount='5.00', description='Tea', date=date(2026, 3, 1), transaction_type='expense'
+        )
+        self.client.force_login(user)
+        response = self.client.get('/download-transactions/', {'type': 'all'})
+        self.assertIn('filename="transactions.xlsx"', response['Content-Disposition'])
+
+
+class LedgerProjectionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('lee', 'lee@example.com', 'pw')
+        self.runner = ProjectionRunner()
+
+    def add(self, amount, day, transaction_type='expense'):
+        return Transaction.objects.create(
+            user=self.user, amount=amount, description='Entry', date=day, transaction_type=transaction_type
+        )
+
+    def projected(self):
+        balance = AccountBalance.objects.get(user=self.user)
+        rollups = {
+            rollup.month: (rollup.income_minor, rollup.expense_minor, rollup.transaction_count)
+            for rollup in MonthlyRollup.objects.filter(user=self.user)
+        }
+        goals = {
+            total.goal_id: (total.amount_minor, total.contributed_minor, total.contribution_count)
+            for total in GoalTotal.objects.filter(user=self.user)
+        }
+        return (balance.income_minor, balance.expense_minor, balance.balance_minor, balance.transaction_count), rollups, goals
+
+    def test_changes_append_events_with_snapshots(self):
+        transaction_obj = self.add('10.00', date(2026, 3, 5))
+        transaction_obj.description = 'Renamed'
+        transaction_obj.save()  # nothing projected changed
+        transaction_obj.amount = '12.50'
+        transaction_obj.date = '2026-04-01'
+        transaction_obj.save()
+        transaction_obj.delete()
+
+        events = list(LedgerEvent.objects.filter(entity='transaction').order_by('id'))
+        self.assertEqual([event.action for event in events], ['created', 'updated', 'deleted'])
+        self.assertEqual(events[1].before, {'type': 'expense', 'amount': 1000, 'date': '2026-03-05'})
+        self.assertEqual(events[1].after, {'type': 'expense', 'amount': 1250, 'date': '2026-04-01'})
+        self.assertIsNone(events[2].after)
+
+    def test_projections_follow_changes_and_rebuild_identically(self):
+        self.add('100.00', date(2026, 3, 1), 'income')
+        moved = self.add('20.00', date(2026, 3, 2))
+        removed = self.add('5.00', date(2026, 4, 2))
+        goal = SavingsGoal.objects.create(
+            user=self.user, name='Bike', target_amount='500.00', monthly_contribution='50.00'
+        )
+        goal.add_contribution(Decimal('50.00'), date(2026, 4, 3), source='manual', description='To goal')
+        self.runner.run()
+
+        moved.date = date(2026, 4, 10)
+        moved.save()
+        removed.delete()
+        self.assertEqual(self.runner.run()['balances'], 2)
+        self.assertEqual(self.runner.run()['balances'], 0)
+
+        expected = (
+            (10000, 7000, 3000, 3),
+            {date(2026, 3, 1): (10000, 0, 1), date(2026, 4, 1): (0, 7000, 2)},
+            {goal.id: (5000, 5000, 1)},
+        )
+        self.assertEqual(self.projected(), expected)
+        self.runner.rebuild()
+        self.assertEqual(self.projected(), expected)
+
+    def test_events_that_commit_late_are_folded_in(self):
+        self.add('10.00', date(2026, 3, 1))
+        self.add('20.00', date(2026, 3, 2))
+        self.add('30.00', date(2026, 3, 3))
+        # The middle event's transaction is still open while the later one is folded
+        in_flight = LedgerEvent.objects.filter(entity='transaction').order_by('id')[1]
+        LedgerEvent.objects.filter(pk=in_flight.pk).delete()
+        self.assertEqual(self.runner.run()['balances'], 2)
+        self.assertEqual(AccountBalance.objects.get(user=self.user).expense_minor, 4000)
+
+        in_flight.save(force_insert=True)
+        self.assertEqual(self.runner.run()['balances'], 1)
+        self.assertEqual(AccountBalance.objects.get(user=self.user).expense_minor, 6000)
+        self.assertNotIn(str(in_flight.id), ProjectionCheckpoint.objects.get(name='balances').gaps)
+
+    def test_gaps_expire_once_later_events_are_old(self):
+        self.add('10.00', date(2026, 3, 1))
+        self.add('20.00', date(2026, 3, 2))
+        self.add('30.00', date(2026, 3, 3))
+        rolled_back = LedgerEvent.objects.filter(entity='transaction').order_by('id')[1]
+        LedgerEvent.objects.filter(pk=rolled_back.pk).delete()
+        self.runner.run()
+        self.assertIn(str(rolled_back.id), ProjectionCheckpoint.objects.get(name='balances').gaps)
+
+        ProjectionRunner(gap_seconds=0).run()
+        self.assertEqual(ProjectionCheckpoint.objects.get(name='balances').gaps, {})
+
+    def test_backfill_logs_rows_that_predate_the_log(self):
+        kept = self.add('30.00', date(2026, 3, 1))
+        changed = self.add('40.00', date(2026, 3, 2))
+        # Pretend the log started after both rows were written, then one changed
+        LedgerEvent.objects.all().delete()
+        changed.amount = Decimal('45.00')
+        changed.save()
+
+        self.assertEqual(backfill(), 2)
+        self.assertEqual(backfill(), 0)
+        backfilled = dict(LedgerEvent.objects.filter(action='backfilled').values_list('entity_id', 'after'))
+        self.assertEqual(backfilled[kept.id]['amount'], 3000)
+        self.assertEqual(backfilled[changed.id]['amount'], 4000)
+
+        self.runner.rebuild()
+        self.assertEqual(self.projected()[0], (0, 7500, -7500, 2))
+
+
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cnt', 'cnt@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        transaction_obj = Transaction.objects.create(
+            user=self.user, amount='9.00', description='Snack', date=date(2026, 1, 5), transaction_type='expense'
+        )
+        self.notifications = [
+            TransactionNotification.create_for(transaction_obj, 'expense_added') for _ in range(4)
+        ]
+        self.client.force_login(self.user)
+
+    def counter(self):
+        return UserProfile.objects.values_list('unread_notifications', flat=True).get(user=self.user)
+
+    def test_counter_follows_creates_and_deletes(self):
+        self.assertEqual(self.counter(), 4)
+        self.notifications[0].delete()
+        self.assertEqual(self.counter(), 3)
+
+    def test_mark_given_ids_then_all_read(self):
+        ids = [self.notifications[0].id, self.notifications[1].id]
+        response = self.client.post('/notifications/mark-read/', {'ids': ids}, content_type='application/json')
+        self.assertEqual(response.json(), {'status': 'success', 'updated': 2, 'unread': 2})
+
+        response = self.client.post('/notifications/mark-read/')
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(self.counter(), 0)
+        self.assertFalse(TransactionNotification.objects.filter(is_read=False).exists())
+
+    def test_recount_repairs_a_drifted_counter(self):
+        UserProfile.objects.filter(user=self.user).update(unread_notifications=17)
+        TransactionNotification.recount_unread(self.user)
+        self.assertEqual(self.counter(), 4)
+
+
+class NotificationPruneTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pru', 'pru@example.com', 'pw')
+        transaction_obj = Transaction.objects.create(
+            user=self.user, amount='25.00', description='Lunch', date=date(2026, 1, 5), transaction_type='expense'
+        )
+        self.old_read = TransactionNotification.create_for(transaction_obj, 'expense_added')
+        self.old_unread = TransactionNotification.create_for(transaction_obj, 'expense_added')
+        self.new_read = TransactionNotification.create_for(transaction_obj, 'expense_added')
+        TransactionNotification.objects.filter(pk__in=[self.old_read.pk, self.new_read.pk]).update(is_read=True)
+        TransactionNotification.objects.filter(pk__in=[self.old_read.pk, self.old_unread.pk]).update(
+            created_at=timezone.now() - timedelta(days=120)
+        )
+
+    def test_archives_and_deletes_only_expired_read_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'archive.jsonl')
+            call_command('prune_notifications', days=90, chunk_size=1, archive=path, stdout=StringIO())
+            with open(path, encoding='utf-8') as archive:
+                rows = [json.loads(line) for line in archive]
+
+        self.assertEqual([row['id'] for row in rows], [self.old_read.pk])
+        self.assertEqual(rows[0]['template_code'], 'expense_added')
+        self.assertEqual(rows[0]['message'], 'Your Lunch of ₹25.00 has been debited from your account.')
+        self.assertEqual(
+            set(TransactionNotification.objects.values_list('pk', flat=True)), {self.old_unread.pk, self.new_read.pk}
+        )
+
+    def test_dry_run_removes_nothing(self):
+        out = StringIO()
+        call_command('prune_notifications', days=90, dry_run=True, stdout=out)
+        self.assertIn('1 read notifications', out.getvalue())
+        self.assertEqual(TransactionNotification.objects.count(), 3)
+
+
+class GoalBalanceHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('noor', 'noor@example.com', 'pw')
+        self.months = [date(2025, 12, 1), date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1), date(2026, 4, 1)]
+
+    def goal(self, name, current_amount):
+        goal = SavingsGoal.objects.create(
+            user=self.user, name=name, target_amount='500.00', monthly_contribution='50.00',
+            current_amount=current_amount
+        )
+        SavingsGoal.objects.filter(pk=goal.pk).update(created_at=datetime(2026, 1, 10, tzinfo=dt_timezone.utc))
+        return goal
+
+    def test_balances_run_across_contributions(self):
+        bike = self.goal('Bike', '100.00')
+        bike.add_contribution(Decimal('50.00'), date(2026, 1, 15), source='manual', description='Start')
+        bike.add_contribution(Decimal('25.00'), date(2026, 3, 2), source='manual', description='Bonus')
+        bike.add_contribution(Decimal('10.00'), date(2026, 3, 20), source='manual', description='Change')
+        trip = self.goal('Trip', '40.00')
+        trip.add_contribution(Decimal('5.50'), date(2026, 2, 28), source='manual', description='Start')
+
+        goals = SavingsGoal.objects.filter(user=self.user)
+        history = get_goal_balance_history(goals, self.months, date(2026, 4, 15))
+
+        # Money from before the first contribution is the opening balance; December predates the goals
+        self.assertEqual(history[bike.id], [0.0, 150.0, 150.0, 185.0, 185.0])
+        self.assertEqual(history[trip.id], [0.0, 40.0, 45.5, 45.5, 45.5])
+
+
+class SavingsGoalEditTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('sam', 'sam@example.com', 'pw')
+        self.goal = SavingsGoal.objects.create(
+            user=self.user, name='Bike', target_amount='500.00', monthly_contribution='50.00'
+        )
+        self.client.force_login(self.user)
+
+    def post_with_stale_goal(self, data):
+        # The form was loaded before a contribution landed
+        stale = SavingsGoal.objects.get(pk=self.goal.pk)
+        self.goal.add_contribution(Decimal('75.00'), date(2026, 3, 1), source='funds', description='Top up')
+        with mock.patch('tracker.views.get_object_or_404', return_value=stale):
+            self.client.post(f'/savings-goals/edit/{self.goal.pk}/', data)
+        return SavingsGoal.objects.get(pk=self.goal.pk)
+
+    def test_editing_keeps_concurrent_contributions(self):
+        goal = self.post_with_stale_goal({
+            'update_goal': '1', 'name': 'Road bike', 'target_amount': '600.00', 'monthly_contribution': '60.00',
+        })
+        self.assertEqual(goal.name, 'Road bike')
+        self.assertEqual(goal.current_amount, Decimal('75.00'))
+        self.assertEqual(
+            list(LedgerEvent.objects.filter(entity='goal').values_list('action', flat=True)), ['created', 'updated']
+        )
+
+    def test_completing_keeps_concurrent_contributions(self):
+        goal = self.post_with_stale_goal({'complete_goal': '1'})
+        self.assertTrue(goal.completed)
+        self.assertEqual(goal.current_amount, Decimal('75.00'))
+
+
+class DashboardTests(TransactionTestCase):
+    # The shell's queries run on pool threads with their own connections, so the rows must be committed
+    def test_dashboard_shell_renders_totals(self):
+        user = User.objects.create_user('dash', 'dash@example.com', 'pw')
+        UserProfile.objects.create(user=user, email_verified=True)
+        Transaction.objects.create(
+            user=user, amount='80.00', description='Salary', date=date(2026, 3, 1), transaction_type='income'
+        )
+        Transaction.objects.create(
+            user=user, amount='30.00', description='Rent', date=date(2026, 3, 2), transaction_type='expense'
+        )
+        self.client.force_login(user)
+
+        response = self.client.get('/dashboard/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['balance'], Decimal('50.00'))
+        self.assertEqual(len(response.context['recent_transactions']), 2)
+
+
+class DashboardPanelTests(TestCase):
+    def test_debit_refreshes_upcoming_debits_panel(self):
+        user = User.objects.create_user('pan', 'pan@example.com', 'pw')
+        today = timezone.now().date()
+        goal = SavingsGoal.objects.create(
+            user=user, name='Laptop', target_amount='900.00', monthly_contribution='90.00', debit_day=today.day
+        )
+        self.assertIn('Laptop', render_panel('upcoming_debits', user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            goal.add_contribution(
+                goal.monthly_contribution, today, source='auto', description='Debit', debit_time=goal.debit_time
+            )
+        self.assertNotIn('Laptop', render_panel('upcoming_debits', user))
+
+
+class SchedulerJournalTests(TestCase):
+    def test_lag_includes_time_spent_inside_the_run(self):
+        due = datetime(2026, 3, 1, 0, 0, tzinfo=dt_timezone.utc)
+        with SchedulerJournal('recurring', now=due) as journal:
+            time.sleep(0.05)  # a token-bucket wait
+            journal.posted(due)
+        self.assertGreaterEqual(journal.run.max_lag, 0.05)
+        self.assertEqual(journal.run.items_posted, 1)
+
+
+class SchedulerDispatchTests(TestCase):
+    def test_jitter_is_stable_and_inside_the_window(self):
+        offsets = [jitter_offset(f'goal:{pk}', window=900) for pk in range(500)]
+        self.assertTrue(all(0 <= offset < 900 for offset in offsets))
+        self.assertEqual(offsets, [jitter_offset(f'goal:{pk}', window=900) for pk in range(500)])
+        # Spread out rather than piled on a few instants
+        self.assertGreater(len(set(offsets)), 300)
+        self.assertEqual(jitter_offset('goal:1', window=0), 0)
+
+    def test_jittered_time_stays_on_the_same_day(self):
+        self.assertEqual(jittered_time(dt_time(23, 59), 'goal:7', window=86400), dt_time(23, 59, 59))
+        self.assertEqual(jittered_time(dt_time(0, 0), 'goal:7', window=0), dt_time(0, 0))
+
+    def test_token_bucket_limits_the_posting_rate(self):
+        clock = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            clock[0] += seconds
+
+        bucket = TokenBucket(2, burst=2, clock=lambda: clock[0], sleep=sleep)
+        for _ in range(6):
+            bucket.acquire()
+
+        # The burst goes out at once, then one posting every half second
+        self.assertEqual(waits, [0.5] * 4)
+        self.assertEqual(clock[0], 2.0)
+        self.assertEqual(TokenBucket(0).acquire(), 0.0)
+
+
+class InjectedClockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clo', 'clo@example.com', 'pw')
+        self.bucket = TokenBucket(0)
+
+    def at(self, day, hour=0, minute=0):
+        return datetime(2026, 3, day, hour, minute, tzinfo=dt_timezone.utc)
+
+    def test_debits_follow_the_given_clock(self):
+        goal = SavingsGoal.objects.create(
+            user=self.user, name='Car', target_amount='1000.00', monthly_contribution='100.00', debit_day=10
+        )
+        due = goal.scheduled_debit_at(self.at(10))
+
+        self.assertEqual(check_scheduled_debits(bucket=self.bucket, now=self.at(9, 23, 59))[0], 0)
+        self.assertEqual(check_scheduled_debits(bucket=self.bucket, now=due - timedelta(seconds=1))[0], 0)
+        self.assertEqual(check_scheduled_debits(bucket=self.bucket, now=due)[0], 1)
+        self.assertEqual(check_scheduled_debits(bucket=self.bucket, now=self.at(20))[0], 0)
+
+        goal.refresh_from_db()
+        self.assertEqual(goal.last_debit_date, date(2026, 3, 10))
+        self.assertEqual(goal.current_amount, Decimal('100.00'))
+
+    def test_recurring_postings_are_dated_by_the_given_clock(self):
+        recurring = RecurringTransaction.objects.create(
+            user=self.user, name='Rent', amount='500.00', transaction_type='expense', frequency='monthly',
+            start_date=date(2026, 1, 1), day_of_month=5
+        )
+        self.assertEqual(process_recurring_transactions(bucket=self.bucket, now=self.at(4, 23, 59)), 0)
+        self.assertEqual(process_recurring_transactions(bucket=self.bucket, now=self.at(5, 23, 59)), 1)
+        self.assertEqual(process_recurring_transactions(bucket=self.bucket, now=self.at(6)), 0)
+
+        self.assertEqual(Transaction.objects.get(user=self.user).date, date(2026, 3, 5))
+        recurring.refresh_from_db()
+        self.assertEqual(recurring.last_processed, date(2026, 3, 5))
+
+
+class LiveUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('liv', 'liv@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def add_income(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction_obj = Transaction.objects.create(
+                user=self.user, amount='40.00', description='Refund', date=date(2026, 3, 1), transaction_type='income'
+            )
+            return TransactionNotification.create_for(transaction_obj, 'income_added')
+
+    def test_version_endpoint_moves_with_ledger_changes(self):
+        before = self.client.get('/notifications/version/').json()['version']
+        self.add_income()
+        after = self.client.get('/notifications/version/').json()['version']
+        self.assertGreater(after, before)
+        self.assertEqual(after, get_user_version(self.user.id))
+
+    @override_settings(SSE_HEARTBEAT_SECONDS=0.05, SSE_MAX_DURATION_SECONDS=0.2)
+    def test_stream_pushes_new_notifications_and_balance(self):
+        notification = self.add_income()
+
+        async def collect():
+            return [chunk async for chunk in _ledger_event_stream(self.user.id, 0, 0)]
+
+        chunks = async_to_sync(collect)()
+
+        self.assertEqual(chunks[0], 'retry: 5000\n\n')
+        self.assertTrue(chunks[1].startswith(f'id: {notification.id}\nevent: notification\n'))
+        self.assertIn('credited to your account', chunks[1])
+        balance = json.loads(chunks[2].split('data: ', 1)[1])
+        self.assertEqual(Decimal(balance['balance']), Decimal('40'))
+        self.assertEqual(balance['version'], get_user_version(self.user.id))
+        # Nothing changed afterwards, so the rest is keepalives
+        self.assertEqual(set(chunks[3:]), {': keepalive\n\n'})
+
+
+class VersionedCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('cac', 'cac@example.com', 'pw')
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_memoize_hits_until_the_version_is_bumped(self):
+        hits, misses = stats.counts['hits'], stats.counts['misses']
+        self.assertEqual(memoize(self.user.id, 'total', self.compute), 1)
+        self.assertEqual(memoize(self.user.id, 'total', self.compute), 1)
+        self.assertEqual((stats.counts['hits'] - hits, stats.counts['misses'] - misses), (1, 1))
+
+        bump_version(self.user.id)
+        self.assertEqual(memoize(self.user.id, 'total', self.compute), 2)
+        # Bumping another scope leaves the data scope's entries alone
+        bump_version(self.user.id, scope='panel:x')
+        self.assertEqual(memoize(self.user.id, 'total', self.compute), 2)
+
+    def test_arguments_are_part_of_the_key(self):
+        @cached_per_user('double')
+        def double(user_id, value):
+            self.calls += 1
+            return value * 2
+
+        self.assertEqual((double(self.user.id, 2), double(self.user.id, 3), double(self.user.id, 2)), (4, 6, 4))
+        self.assertEqual(self.calls, 2)
+
+    def test_versions_are_shared_with_other_processes(self):
+        # A separate backend instance stands in for the scheduler's process
+        other_process = caches.create_connection('default')
+        version = get_version(self.user.id)
+        other_process.incr(f'tracker:data:version:{self.user.id}')
+        self.assertGreater(get_version(self.user.id), version)
+
+    def test_ledger_saves_invalidate_cached_categories(self):
+        self.assertNotIn('Pets', [category.name for category in get_user_categories(self.user.id)])
+        version = get_version(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpenseCategory.objects.create(user=self.user, name='Pets')
+
+        self.assertGreater(get_version(self.user.id), version)
+        self.assertIn('Pets', [category.name for category in get_user_categories(self.user.id)])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('etg', 'etg@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def add(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, amount='7.00', description='Tea', date=date(2026, 3, 1), transaction_type='expense'
+            )
+
+    def test_unchanged_pages_revalidate_with_304(self):
+        self.add()
+        for url in ('/transactions/', '/savings-analytics/', '/finance-insights/'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(again.status_code, 304, url)
+
+    def test_postings_from_another_process_get_a_fresh_page(self):
+        self.add()
+        first = self.client.get('/finance-insights/')
+        # A scheduler posting whose version bump never reaches this process
+        Transaction.objects.create(
+            user=self.user, amount='50.00', description='Auto debit', date=date(2026, 3, 2), transaction_type='expense'
+        )
+        again = self.client.get('/finance-insights/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+
+    def test_ledger_changes_get_a_fresh_page(self):
+        self.add()
+        first = self.client.get('/transactions/')
+        self.assertIn('Last-Modified', first)
+
+        self.add()
+        again = self.client.get('/transactions/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(len(again.context['transactions']), 2)
@@ -7,10 +7,12 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/panels/<str:panel>/', views.dashboard_panel, name='dashboard_panel'),
     path('transactions/', views.transactions, name='transactions'),
     path('download-transactions/', views.download_transactions, name='download_transactions'),
     path('add-income/', views.add_income, name='add_income'),
     path('add-expense/', views.add_expense, name='add_expense'),
+    path('add-expense/suggest-category/', views.suggest_expense_category, name='suggest_expense_category'),
     path('profile/', views.profile, name='profile'),
     path('update-email/', views.update_email, name='update_email'),
     path('change-password/', views.change_password, name='change_password'),
@@ -32,7 +34,9 @@ urlpatterns = [
     path('recurring-transactions/<int:transaction_id>/edit/', views.edit_recurring_transaction, name='edit_recurring_transaction'),
     path('recurring-transactions/<int:transaction_id>/delete/', views.delete_recurring_transaction, name='delete_recurring_transaction'),
     path('mark-notification-read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
-    path('check-transactions/', views.check_transactions, name='check_transactions'),
+    path('notifications/mark-read/', views.mark_notifications_read, name='mark_notifications_read'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
+    path('notifications/version/', views.notification_version, name='notification_version'),
     path('confirm-transaction/<int:transaction_id>/', views.confirm_transaction, name='confirm_transaction'),
     path('community/', views.community_view, name='community'),
     path('manage-categories/', views.manage_categories, name='manage_categories'),
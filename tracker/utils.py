@@ -1,6 +1,33 @@
-from django.core.mail import send_mail
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
+from django.db import transaction
 from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_BASE = 60  # seconds, doubled after every failed attempt
+OUTBOX_BACKOFF_MAX = 60 * 60
+OUTBOX_LEASE = 5 * 60  # how long a claimed batch is hidden from other senders
+
+
+def queue_email(to_email, subject, body, html_body=''):
+    """Add an email to the outbox; send_queued_emails delivers it"""
+    return EmailOutbox.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        html_body=html_body or ''
+    )
+
 
 def send_otp_email(user, otp):
     subject = 'Verify Your Email - BudgetBuddy'
@@ -9,12 +36,102 @@ def send_otp_email(user, otp):
         'otp': otp
     })
     plain_message = f'Your verification code is: {otp}'
-    
-    send_mail(
-        subject,
-        plain_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=False,
-    ) 
\ No newline at end of file
+
+    # Queued rather than sent so SMTP latency never lands on the request
+    queue_email(user.email, subject, plain_message, html_message)
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before retrying an email that has failed `attempts` times"""
+    return min(OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX)
+
+
+def _claim_batch(batch_size, now):
+    """Lease the next due emails so concurrent senders don't pick them up too"""
+    with transaction.atomic():
+        emails = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+                status='pending',
+                next_attempt_at__lte=now
+            ).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if emails:
+            EmailOutbox.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE)
+            )
+    return emails
+
+
+def _record_failure(email, error, now, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+        logger.error(f"Giving up on email {email.id} to {email.to_email}: {email.last_error}")
+    else:
+        email.next_attempt_at = now + timedelta(seconds=backoff_delay(email.attempts))
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_queued_emails(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS, now=None):
+    """Deliver one batch of due outbox emails over a single SMTP connection.
+
+    Returns a (sent, failed) tuple, where failed counts emails that will be
+    retried later or were given up on.
+    """
+    now = now or timezone.now()
+    emails = _claim_batch(batch_size, now)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing can go out this run; every claimed email backs off
+        logger.error(f"Could not connect to the mail server: {str(e)}")
+        for email in emails:
+            _record_failure(email, e, now, max_attempts)
+        return 0, len(emails)
+
+    try:
+        for index, email in enumerate(emails):
+            message = EmailMultiAlternatives(
+                email.subject,
+                email.body,
+                settings.DEFAULT_FROM_EMAIL,
+                [email.to_email],
+                connection=connection
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                _record_failure(email, e, now, max_attempts)
+                failed += 1
+                if isinstance(e, smtplib.SMTPServerDisconnected):
+                    # Reconnect so the rest of the batch can still go out
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception as reconnect_error:
+                        logger.error(f"Could not reconnect to the mail server: {str(reconnect_error)}")
+                        for remaining in emails[index + 1:]:
+                            _record_failure(remaining, reconnect_error, now, max_attempts)
+                            failed += 1
+                        break
+                continue
+
+            email.status = 'sent'
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+            sent += 1
+    finally:
+        connection.close()
+
+    return sent, failed
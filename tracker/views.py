@@ -2,11 +2,11 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.db.models import Sum, Count
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Sum, Count, F, Q, Max
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 import csv
 from datetime import datetime, time
-from .models import Transaction, ExpenseCategory, Expense, UserProfile, Budget, SavingsGoal, RecurringTransaction, TransactionNotification, Discussion, Comment
+from .models import Transaction, ExpenseCategory, CategoryRule, Expense, UserProfile, Budget, SavingsGoal, GoalContribution, RecurringTransaction, TransactionNotification, Discussion, Comment, LedgerEvent
 from django.contrib.auth.models import User
 from django.core.serializers.json import DjangoJSONEncoder
 import json
@@ -24,7 +24,21 @@ from dateutil.relativedelta import relativedelta
 from django.db.models import Avg
 from .recommendations import FinancialRecommendationEngine
 import math
+import asyncio
 from .utils import send_otp_email
+from .events import get_user_version, aget_user_version, wait_for_change
+from .fragments import PANELS, render_panel
+from .cache import cached_per_user
+from .categorization import apply_rules, merge_categories
+from .categorizer import suggest_category
+from .search import filter_transactions, parse_filters, transaction_page
+from .money import from_minor
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 def landing_page(request):
     if request.user.is_authenticated:
@@ -57,27 +71,6 @@ def register_view(request):
         # Generate and send OTP
         otp = profile.generate_otp()
         send_otp_email(user, otp)
-        
-        # Create default expense categories for the user
-        default_categories = [
-            'Food & Dining',
-            'Transportation',
-            'Housing',
-            'Entertainment',
-            'Utilities',
-            'Healthcare',
-            'Education',
-            'Shopping',
-            'Personal Care',
-            'Gifts & Donations',
-            'Travel',
-            'Insurance',
-            'Investments',
-            'Debt Payments',
-            'Other'
-        ]
-        for category in default_categories:
-            ExpenseCategory.objects.create(name=category, user=user)
             
         messages.success(request, 'Account created successfully. Please check your email for verification code.')
         return redirect('verify_otp')
@@ -146,103 +139,128 @@ def logout_view(request):
     logout(request)
     return redirect('landing_page')
 
-@login_required
-def dashboard(request):
-    # Get total income
-    total_income = Transaction.objects.filter(
-        user=request.user,
-        transaction_type='income'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+@cached_per_user('categories')
+def get_user_categories(user_id):
+    """The user's expense categories sorted by name (cached until their ledger changes)"""
+    return list(ExpenseCategory.objects.for_user(user_id).order_by('name'))
 
-    # Get total expenses
-    total_expenses = Transaction.objects.filter(
-        user=request.user,
-        transaction_type='expense'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+@cached_per_user('budget_status')
+def get_budget_status(user_id, today):
+    """Active budgets with this month's spend and alert styling, evaluated once and cached"""
+    budgets = []
+    for budget in Budget.objects.filter(user_id=user_id, is_active=True).select_related('category').with_spent(today):
+        spent = budget.spent
+        percentage = 100 if budget.amount == 0 else (spent / budget.amount) * 100
+        
+        alert_class = ""
+        if percentage >= 100:
+            alert_class = "bg-red-100 border-red-500 text-red-700"
+        elif percentage >= 80:
+            alert_class = "bg-yellow-100 border-yellow-500 text-yellow-700"
+        
+        # Stored by the nightly forecast_budgets run, so no extra query
+        forecast = budget.forecast_for(today)
+        
+        budgets.append({
+            'id': budget.id,
+            'category': budget.category,
+            'amount': budget.amount,
+            'spent': spent,
+            'remaining': budget.amount - spent,
+            'percentage_used': percentage,
+            'alert_class': alert_class,
+            'forecast_spend': forecast,
+            'forecast_over': forecast is not None and forecast > budget.amount,
+        })
+    return budgets
 
-    # Calculate balance
-    balance = total_income - total_expenses
+def _dashboard_totals(user_id):
+    totals = Transaction.objects.filter(user_id=user_id).aggregate(
+        income=Sum('amount', filter=Q(transaction_type='income')),
+        expenses=Sum('amount', filter=Q(transaction_type='expense'))
+    )
+    return totals['income'] or 0, totals['expenses'] or 0
 
-    # Get recent transactions
-    recent_transactions = Transaction.objects.filter(
-        user=request.user
-    ).order_by('-date')[:5]
-
-    # Get budgets
-    budgets = Budget.objects.filter(user=request.user)
-
-    # Get savings goals
-    savings_goals = SavingsGoal.objects.filter(user=request.user)
-
-    # Get upcoming debits
-    upcoming_debits = []
-    for goal in savings_goals:
-        if goal.auto_debit_enabled and not goal.completed:
-            next_debit = goal.next_debit_date
-            if next_debit:
-                days_until = (next_debit - timezone.now().date()).days
-                if 0 <= days_until <= 7:  # Show debits in next 7 days
-                    upcoming_debits.append({
-                        'goal': goal,
-                        'date': next_debit,
-                        'days_until': days_until
-                    })
+def _dashboard_recent_transactions(user_id):
+    return list(Transaction.objects.filter(user_id=user_id).order_by('-date')[:5])
 
-    # Get personalized recommendations
-    recommendation_engine = FinancialRecommendationEngine(request.user)
-    recommendations = recommendation_engine.analyze_financial_health()
-    
-    # Only show high-confidence recommendations on dashboard
-    dashboard_recommendations = [r for r in recommendations if r['confidence'] >= 0.85][:3]
-    
-    # Get recent notifications
-    recent_notifications = TransactionNotification.objects.filter(
-        user=request.user,
+def _dashboard_budgets(user_id):
+    return get_budget_status(user_id, timezone.now().date())
+
+def _dashboard_savings_goals(user_id):
+    return list(SavingsGoal.objects.filter(user_id=user_id))
+
+def _dashboard_notifications(user_id):
+    # Messages render from the linked transaction
+    notifications = list(TransactionNotification.objects.filter(
+        user_id=user_id,
         is_read=False
-    ).order_by('-created_at')[:5]
-    
-    # Get upcoming recurring transactions for the next 2 days
-    today = timezone.now().date()
-    tomorrow = today + timedelta(days=1)
-    
-    upcoming_recurring = []
-    pending_transactions = []
-    recurring_transactions = RecurringTransaction.objects.filter(
-        user=request.user,
-        is_active=True
+    ).select_related('transaction').order_by('-created_at')[:5])
+    return notifications, TransactionNotification.unread_count(user_id)
+
+# The dashboard's independent queries run side by side on this small pool. Its
+# threads keep their database connections between requests, so the pool size
+# bounds how many connections the dashboard holds open; none is opened per query.
+DASHBOARD_QUERY_WORKERS = getattr(settings, 'DASHBOARD_QUERY_WORKERS', 4)
+_dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_QUERY_WORKERS, thread_name_prefix='dashboard')
+
+def _on_pooled_connection(func):
+    """Run a blocking loader on a pool thread, reusing that thread's connection while it is usable"""
+    def run(*args):
+        for conn in connections.all(initialized_only=True):
+            # The server may have dropped an idle connection since the last request
+            if conn.connection is not None and not conn.is_usable():
+                conn.close()
+        return func(*args)
+    return sync_to_async(run, thread_sensitive=False, executor=_dashboard_executor)
+
+@login_required
+async def dashboard(request):
+    user = await request.auser()
+    
+    # The shell's queries don't depend on each other, so they run at the same
+    # time and the page waits for the slowest rather than the sum of all.
+    # Recommendations, upcoming debits and due recurring transactions are
+    # deferred panels that the page fetches from dashboard_panel after it has
+    # rendered.
+    (
+        (total_income, total_expenses),
+        recent_transactions,
+        budgets,
+        savings_goals,
+        (recent_notifications, unread_count),
+        data_version,
+    ) = await asyncio.gather(
+        _on_pooled_connection(_dashboard_totals)(user.id),
+        _on_pooled_connection(_dashboard_recent_transactions)(user.id),
+        _on_pooled_connection(_dashboard_budgets)(user.id),
+        _on_pooled_connection(_dashboard_savings_goals)(user.id),
+        _on_pooled_connection(_dashboard_notifications)(user.id),
+        aget_user_version(user.id),
     )
     
-    for rt in recurring_transactions:
-        # Calculate next occurrence
-        if rt.day_of_month == today.day or rt.day_of_month == tomorrow.day:
-            # Check if it hasn't been processed this month
-            if not rt.last_processed or rt.last_processed.month != today.month:
-                if rt.status == 'pending':
-                    pending_transactions.append(rt)
-                else:
-                    upcoming_recurring.append({
-                        'name': rt.name,
-                        'amount': rt.amount,
-                        'type': rt.transaction_type,
-                        'date': tomorrow if rt.day_of_month == tomorrow.day else today
-                    })
-    
     context = {
         'total_income': total_income,
         'total_expenses': total_expenses,
-        'balance': balance,
+        'balance': total_income - total_expenses,
         'recent_transactions': recent_transactions,
         'budgets': budgets,
         'savings_goals': savings_goals,
-        'upcoming_debits': upcoming_debits,
         'now': timezone.now(),
-        'recommendations': dashboard_recommendations,
         'notifications': recent_notifications,
-        'upcoming_recurring': upcoming_recurring,
-        'pending_transactions': pending_transactions,
+        'unread_count': unread_count,
+        'data_version': data_version,
     }
     
-    return render(request, 'tracker/dashboard.html', context)
+    # Context processors and the template still use the sync request.user
+    return await sync_to_async(render)(request, 'tracker/dashboard.html', context)
+
+@login_required
+def dashboard_panel(request, panel):
+    """One deferred dashboard panel as an HTML fragment, cached per user"""
+    if panel not in PANELS:
+        raise Http404("Unknown dashboard panel")
+    return HttpResponse(render_panel(panel, request.user))
 
 @login_required
 def add_income(request):
@@ -263,12 +281,7 @@ def add_income(request):
         )
         
         # Create notification for the income
-        TransactionNotification.objects.create(
-            user=request.user,
-            transaction=transaction,
-            message=f"Your {description} of ₹{amount} has been credited to your account.",
-            notification_type='income'
-        )
+        TransactionNotification.create_for(transaction, 'income_added')
         
         messages.success(request, 'Income added successfully')
         return redirect('dashboard')
@@ -277,7 +290,7 @@ def add_income(request):
 
 @login_required
 def add_expense(request):
-    categories = ExpenseCategory.objects.filter(user=request.user)
+    categories = get_user_categories(request.user.id)
     
     if request.method == 'POST':
         amount = request.POST.get('amount')
@@ -297,33 +310,27 @@ def add_expense(request):
         )
         
         # Create notification for the expense
-        TransactionNotification.objects.create(
-            user=request.user,
-            transaction=transaction,
-            message=f"Your {description} of ₹{amount} has been debited from your account.",
-            notification_type='expense'
-        )
+        TransactionNotification.create_for(transaction, 'expense_added')
         
         category = None
         if category_id:
-            category = get_object_or_404(ExpenseCategory, id=category_id, user=request.user)
+            category = get_object_or_404(ExpenseCategory.objects.for_user(request.user), id=category_id)
+        else:
+            # No choice made: file it where similar descriptions went before
+            suggested_id = suggest_category(request.user.id, description, transaction.amount)
+            if suggested_id:
+                category = ExpenseCategory.objects.get(id=suggested_id)
             
+        # Budget counters and threshold alerts are updated by signals on this insert
         Expense.objects.create(
             transaction=transaction,
             category=category
         )
         
-        # Check if this expense exceeds any budget
-        if category:
-            budget = Budget.objects.filter(user=request.user, category=category, is_active=True).first()
-            if budget:
-                spent = budget.spent
-                if spent > budget.amount:
-                    messages.warning(request, f'You have exceeded your budget for {category.name}! Budget: ₹{budget.amount}, Spent: ₹{spent}')
-                elif spent >= (budget.amount * decimal.Decimal('0.8')):
-                    messages.warning(request, f'You are approaching your budget limit for {category.name}! Budget: ₹{budget.amount}, Spent: ₹{spent}')
-        
-        messages.success(request, 'Expense added successfully')
+        if category and not category_id:
+            messages.success(request, f'Expense added successfully under {category.name}')
+        else:
+            messages.success(request, 'Expense added successfully')
         return redirect('dashboard')
         
     context = {
@@ -333,55 +340,63 @@ def add_expense(request):
     return render(request, 'tracker/add_expense.html', context)
 
 @login_required
+def suggest_expense_category(request):
+    """Suggested category for a description, for the add expense form"""
+    amount = request.GET.get('amount')
+    try:
+        amount = Decimal(amount) if amount else None
+    except decimal.InvalidOperation:
+        amount = None
+    category_id = suggest_category(request.user.id, request.GET.get('description', ''), amount)
+    return JsonResponse({'category_id': category_id})
+
+def _can_revalidate(request):
+    # A 304 would swallow flash messages waiting to be shown on the page
+    return request.user.is_authenticated and not len(messages.get_messages(request))
+
+def ledger_etag(request, *args, **kwargs):
+    """ETag for pages built only from the user's own data and today's date"""
+    if not _can_revalidate(request):
+        return None
+    # The data version moves on every save or delete of the user's ledger rows.
+    # The latest ledger event is read from the database, so postings made by
+    # another process change the tag even if its version bump never arrives.
+    last_event_id = LedgerEvent.objects.filter(user=request.user).aggregate(last=Max('id'))['last'] or 0
+    return (
+        f"{request.user.id}-{get_user_version(request.user.id)}-{last_event_id}"
+        f"-{timezone.now().date():%Y%m%d}"
+    )
+
+def transactions_last_modified(request, *args, **kwargs):
+    """Time of the user's latest transaction change, for If-Modified-Since"""
+    if not _can_revalidate(request):
+        return None
+    # Deletes don't move this; the ETag, which clients revalidate with first, covers them
+    return Transaction.objects.filter(user=request.user).aggregate(latest=Max('updated_at'))['latest']
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=ledger_etag, last_modified_func=transactions_last_modified)
 def transactions(request):
-    transaction_type = request.GET.get('type', 'all')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
-    # Get all transactions ordered by date ascending for balance calculation
-    all_transactions = Transaction.objects.filter(
-        user=request.user
-    ).order_by('date', 'id')
+    filters = parse_filters(request.GET)
     
-    # Calculate running balance for all transactions
-    balance_dict = {}
-    running_balance = 0
-    for transaction in all_transactions:
-        if transaction.transaction_type == 'income':
-            running_balance += transaction.amount
-        else:
-            running_balance -= transaction.amount
-        balance_dict[transaction.id] = running_balance
-    
-    # Get filtered transactions for display in descending order
-    filtered_transactions = Transaction.objects.filter(
-        user=request.user
-    ).order_by('-date', '-id')  # Changed to descending order
-    
-    if transaction_type == 'income':
-        filtered_transactions = filtered_transactions.filter(transaction_type='income')
-    elif transaction_type == 'expense':
-        filtered_transactions = filtered_transactions.filter(transaction_type='expense')
-        
-    if start_date:
-        filtered_transactions = filtered_transactions.filter(date__gte=start_date)
-        
-    if end_date:
-        filtered_transactions = filtered_transactions.filter(date__lte=end_date)
-    
-    # Prepare transactions with their respective balances
-    transactions_with_balance = []
-    for transaction in filtered_transactions:
-        transactions_with_balance.append({
-            'transaction': transaction,
-            'balance': balance_dict[transaction.id]
-        })
+    # One newest-first page, with each row's balance over all of the user's transactions
+    transactions_with_balance, next_cursor = transaction_page(
+        request.user, filters, cursor=request.GET.get('cursor')
+    )
     
     context = {
         'transactions': transactions_with_balance,
-        'transaction_type': transaction_type,
-        'start_date': start_date,
-        'end_date': end_date
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'categories': get_user_categories(request.user.id),
+        'transaction_type': filters['type'],
+        'q': filters['q'],
+        'category': filters['category'],
+        'min_amount': request.GET.get('min_amount', ''),
+        'max_amount': request.GET.get('max_amount', ''),
+        'start_date': request.GET.get('start_date', ''),
+        'end_date': request.GET.get('end_date', '')
     }
     
     return render(request, 'tracker/transactions.html', context)
@@ -392,20 +407,19 @@ def download_transactions(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     
-    # Get all transactions ordered by date ascending for balance calculation
+    # Running balance in paise over all transactions, oldest first, without loading model instances
     all_transactions = Transaction.objects.filter(
         user=request.user
-    ).order_by('date', 'id')
+    ).order_by('date', 'id').values_list('id', 'transaction_type', 'amount_minor')
     
-    # Calculate running balance for all transactions
     balance_dict = {}
     running_balance = 0
-    for transaction in all_transactions:
-        if transaction.transaction_type == 'income':
-            running_balance += transaction.amount
+    for transaction_id, row_type, amount_minor in all_transactions.iterator():
+        if row_type == 'income':
+            running_balance += amount_minor
         else:
-            running_balance -= transaction.amount
-        balance_dict[transaction.id] = running_balance
+            running_balance -= amount_minor
+        balance_dict[transaction_id] = running_balance
     
     # Get filtered transactions for Excel in ascending order
     transactions = Transaction.objects.filter(
@@ -438,6 +452,12 @@ def download_transactions(request):
         except ValueError:
             pass  # Skip invalid date
     
+    # The listing's search, category and amount filters narrow the download the same way
+    filters = parse_filters(request.GET)
+    if filters['q'] or filters['category'] or filters['min_amount'] is not None or filters['max_amount'] is not None:
+        transactions = filter_transactions(transactions, filters)
+        filename += '_filtered'
+    
     response = HttpResponse(
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         headers={'Content-Disposition': f'attachment; filename="{filename}.xlsx"'},
@@ -466,7 +486,7 @@ def download_transactions(request):
         worksheet.write(row, 1, transaction.transaction_type)  # Type
         worksheet.write(row, 2, transaction.description)  # Description
         worksheet.write(row, 3, amount_str)  # Amount
-        worksheet.write(row, 4, balance_dict[transaction.id])  # Balance
+        worksheet.write(row, 4, from_minor(balance_dict[transaction.id]))  # Balance
     
     # Set column widths
     worksheet.set_column(0, 0, 12)  # Date
@@ -573,10 +593,7 @@ def feedback_view(request):
 @login_required
 def budget(request):
     # Get user's expense categories
-    categories = ExpenseCategory.objects.filter(user=request.user)
-    
-    # Get existing budgets
-    budgets = Budget.objects.filter(user=request.user, is_active=True)
+    categories = get_user_categories(request.user.id)
     
     if request.method == 'POST':
         category_id = request.POST.get('category')
@@ -587,7 +604,7 @@ def budget(request):
             return redirect('budget')
             
         try:
-            category = ExpenseCategory.objects.get(id=category_id, user=request.user)
+            category = ExpenseCategory.objects.for_user(request.user).get(id=category_id)
             
             # Check if budget already exists for this category
             existing_budget = Budget.objects.filter(user=request.user, category=category, is_active=True).first()
@@ -612,19 +629,9 @@ def budget(request):
             
         return redirect('budget')
     
-    # For each budget, calculate how much has been spent
-    for budget in budgets:
-        budget.alert_class = ""
-        percentage = budget.percentage_used
-        
-        if percentage >= 100:
-            budget.alert_class = "bg-red-100 border-red-500 text-red-700"
-        elif percentage >= 80:
-            budget.alert_class = "bg-yellow-100 border-yellow-500 text-yellow-700"
-    
     context = {
         'categories': categories,
-        'budgets': budgets
+        'budgets': get_budget_status(request.user.id, timezone.now().date())
     }
     
     return render(request, 'tracker/budget.html', context)
@@ -698,6 +705,20 @@ def savings_goals(request):
         messages.success(request, f'Savings goal "{name}" created successfully')
         return redirect('savings_goals')
     
+    context = {
+        'goals': goals,
+        'range_1_31': range(1, 32),
+        'now': timezone.now(),
+        **get_goal_summary(request.user.id, timezone.now().date()),
+    }
+    
+    return render(request, 'tracker/savings_goals.html', context)
+
+@cached_per_user('goal_summary')
+def get_goal_summary(user_id, today):
+    """Totals, lifetime fund progress and chart data for the savings goals page"""
+    goals = SavingsGoal.objects.filter(user_id=user_id).order_by('completed', 'target_date')
+    
     # Initialize analytics data
     active_goals = goals.filter(completed=False)
     active_goals_count = active_goals.count()
@@ -707,9 +728,9 @@ def savings_goals(request):
 
     # Calculate monthly expenses for emergency fund
     monthly_expenses = Transaction.objects.filter(
-        user=request.user,
+        user_id=user_id,
         transaction_type='expense',
-        date__gte=timezone.now().date() - timedelta(days=30)
+        date__gte=today - timedelta(days=30)
     ).aggregate(total=Sum('amount'))['total'] or 0
 
     # Get or create lifetime savings goals
@@ -767,10 +788,7 @@ def savings_goals(request):
     current_amounts = [float(goal.current_amount) for goal in active_goals]
     remaining_amounts = [float(goal.remaining_amount) for goal in active_goals]
 
-    context = {
-        'goals': goals,
-        'range_1_31': range(1, 32),
-        'now': timezone.now(),
+    return {
         'goal_names': json.dumps(goal_names),
         'current_amounts': json.dumps(current_amounts),
         'remaining_amounts': json.dumps(remaining_amounts),
@@ -798,8 +816,6 @@ def savings_goals(request):
         'retirement_fund_percentage': retirement_fund_percentage,
         'retirement_fund_id': retirement_fund_id,
     }
-    
-    return render(request, 'tracker/savings_goals.html', context)
 
 def prepare_timeline_data(goals):
     """Prepare timeline data for savings growth chart"""
@@ -814,21 +830,20 @@ def prepare_timeline_data(goals):
         labels.append(current_date.strftime('%b %Y'))
         current_date = (current_date.replace(day=1) + timedelta(days=32)).replace(day=1)
     
+    # Month-end balances for every goal come from the contribution ledger
+    month_starts = []
+    current_date = start_date
+    while current_date <= end_date:
+        month_starts.append(current_date.replace(day=1))
+        current_date = (current_date.replace(day=1) + timedelta(days=32)).replace(day=1)
+    history = get_goal_balance_history(goals, month_starts, end_date)
+    
     # Create datasets for each goal
     datasets = []
     for goal in goals:
-        data = []
-        current_date = start_date
-        while current_date <= end_date:
-            # You'll need to implement logic to get the amount saved up to this date
-            # This is a placeholder - replace with actual historical data
-            amount = float(goal.current_amount)  # Replace with historical data
-            data.append(amount)
-            current_date = (current_date.replace(day=1) + timedelta(days=32)).replace(day=1)
-        
         datasets.append({
             'label': goal.name,
-            'data': data,
+            'data': history[goal.id],
             'borderColor': get_color_for_index(len(datasets)),
             'backgroundColor': get_color_for_index(len(datasets), 0.1),
             'fill': True
@@ -839,6 +854,47 @@ def prepare_timeline_data(goals):
         'datasets': datasets
     }
 
+def get_goal_balance_history(goals, month_starts, today):
+    """Return {goal_id: [balance at the end of each month]} built from GoalContribution.
+
+    Contributions are summed per goal and month in a single grouped query and
+    accumulated here. Money that predates the ledger is treated as an opening
+    balance so the latest point always matches the goal's current amount.
+    """
+    goals = list(goals)
+    monthly_totals = (
+        GoalContribution.objects.filter(goal__in=goals)
+        .annotate(month=TruncMonth('date'))
+        .values('goal_id', 'month')
+        .annotate(total=Sum('amount'))
+        .order_by('goal_id', 'month')
+    )
+    
+    totals_by_goal = {}
+    for row in monthly_totals:
+        month = row['month']
+        if isinstance(month, datetime):
+            month = month.date()
+        totals_by_goal.setdefault(row['goal_id'], []).append((month, row['total']))
+    
+    history = {}
+    for goal in goals:
+        totals = totals_by_goal.get(goal.id, [])
+        opening = goal.current_amount - sum((total for _, total in totals), Decimal('0'))
+        created = goal.created_at.date() if goal.created_at else None
+        
+        data = []
+        for month_start in month_starts:
+            month_end = min(month_start + relativedelta(months=1, days=-1), today)
+            if created and month_end < created:
+                data.append(0.0)
+                continue
+            contributed = sum((total for month, total in totals if month <= month_end), Decimal('0'))
+            data.append(round(float(opening + contributed), 2))
+        history[goal.id] = data
+    
+    return history
+
 def prepare_forecast_data(goals):
     """Prepare forecast data for completion chart"""
     labels = []
@@ -926,7 +982,11 @@ def edit_savings_goal(request, goal_id):
                 except (ValueError, TypeError):
                     goal.debit_day = 1
                     
-                goal.save()
+                # Only the edited fields: contributions and debits change the balance concurrently with F()
+                goal.save(update_fields=[
+                    'name', 'target_amount', 'monthly_contribution', 'target_date',
+                    'auto_debit_enabled', 'debit_time', 'debit_day', 'updated_at'
+                ])
                 messages.success(request, f'Savings goal "{name}" updated successfully')
             else:
                 messages.error(request, 'Please fill in all required fields')
@@ -934,18 +994,12 @@ def edit_savings_goal(request, goal_id):
         elif 'add_funds' in request.POST:
             amount = request.POST.get('amount')
             if amount:
-                goal.current_amount += Decimal(amount)
-                if goal.current_amount >= goal.target_amount:
-                    goal.completed = True
-                goal.save()
-                
-                # Create a transaction record for this contribution
-                transaction = Transaction.objects.create(
-                    user=request.user,
-                    amount=amount,
-                    description=f"Contribution to savings goal: {goal.name}",
-                    date=timezone.now(),
-                    transaction_type='expense'  # It's an expense because money is being set aside
+                # Balance, completion and the linked transaction are written atomically
+                goal.add_contribution(
+                    Decimal(amount),
+                    timezone.now().date(),
+                    source='funds',
+                    description=f"Contribution to savings goal: {goal.name}"
                 )
                 
                 messages.success(request, f'Added ₹{amount} to your savings goal')
@@ -954,7 +1008,7 @@ def edit_savings_goal(request, goal_id):
                 
         elif 'complete_goal' in request.POST:
             goal.completed = True
-            goal.save()
+            goal.save(update_fields=['completed', 'updated_at'])
             messages.success(request, f'Congratulations on completing your savings goal!')
         
         return redirect('savings_goals')
@@ -991,81 +1045,69 @@ def check_debits(request, force=False):
     
     logger.info(f"Starting check_debits view for user {request.user.username} with force={force_process}")
     
-    # Store original timezone function for restoration later
-    from django.utils import timezone
-    import datetime
-    original_now = timezone.now
-    
-    try:
-        if force_process:
-            # Create a better custom now function that appears to be in the future
-            def forced_now():
-                real_now = original_now()
-                # Make it appear to be after the scheduled time
-                return real_now.replace(hour=23, minute=59, second=59)
-            
-            # Replace timezone.now with our custom function temporarily
-            timezone.now = forced_now
-            logger.info("Using forced time for processing")
-        
-        # Process the debits with the force parameter, but only for the current user
-        debit_count, processed_goals = check_scheduled_debits(force=force_process, user=request.user)
-        
-        if debit_count > 0:
-            # Show success message with details
-            total_amount = sum(goal['amount'] for goal in processed_goals)
-            goal_names = ", ".join([goal['name'] for goal in processed_goals])
-            success_msg = (f"Successfully processed {debit_count} automatic debit(s) totaling ₹{total_amount:.2f} "
-                          f"for: {goal_names}. Your account balance has been updated.")
-            messages.success(request, success_msg)
-            logger.info(success_msg)
-        else:
-            # Query goals to check what's happening
-            from .models import SavingsGoal
-            today = datetime.datetime.now().date()
+    # Forced runs use an explicit clock set after every scheduled time today,
+    # instead of patching timezone.now for the whole process
+    now = timezone.now()
+    if force_process:
+        now = now.replace(hour=23, minute=59, second=59)
+        logger.info("Using forced time for processing")
+    
+    # Process the debits with the force parameter, but only for the current user
+    debit_count, processed_goals = check_scheduled_debits(force=force_process, user=request.user, now=now)
+    
+    if debit_count > 0:
+        # Show success message with details
+        total_amount = sum(goal['amount'] for goal in processed_goals)
+        goal_names = ", ".join([goal['name'] for goal in processed_goals])
+        success_msg = (f"Successfully processed {debit_count} automatic debit(s) totaling ₹{total_amount:.2f} "
+                      f"for: {goal_names}. Your account balance has been updated.")
+        messages.success(request, success_msg)
+        logger.info(success_msg)
+    else:
+        # Query goals to check what's happening
+        from .models import SavingsGoal
+        today = now.date()
+        
+        # Check only the current user's goals
+        goals_due_today = list(SavingsGoal.objects.filter(
+            user=request.user,
+            completed=False,
+            auto_debit_enabled=True
+        ))
+        
+        if goals_due_today:
+            # Debug info
+            debug_info = []
+            for goal in goals_due_today:
+                debit_date = goal.next_debit_date
+                days_until = getattr(goal, 'days_until_next_debit', None)
+                already_debited = goal.last_debit_date == today
+                debug_info.append(f"{goal.name}: due_date={debit_date}, days_until={days_until}, already_debited={already_debited}")
             
-            # Check only the current user's goals
-            goals_due_today = list(SavingsGoal.objects.filter(
-                user=request.user,
-                completed=False,
-                auto_debit_enabled=True
-            ))
+            logger.warning(f"No debits processed for user {request.user.username} despite having goals. Debug info: {', '.join(debug_info)}")
             
-            if goals_due_today:
-                # Debug info
-                debug_info = []
-                for goal in goals_due_today:
-                    debit_date = goal.next_debit_date
-                    days_until = getattr(goal, 'days_until_next_debit', None)
-                    already_debited = goal.last_debit_date == today
-                    debug_info.append(f"{goal.name}: due_date={debit_date}, days_until={days_until}, already_debited={already_debited}")
-                
-                logger.warning(f"No debits processed for user {request.user.username} despite having goals. Debug info: {', '.join(debug_info)}")
-                
-                if force_process:
-                    messages.warning(
-                        request, 
-                        "No debits were processed. This could be because your goals have already "
-                        "been debited today. Try again tomorrow or manually add funds."
-                    )
-                else:
-                    messages.info(
-                        request,
-                        "No automatic debits were due for processing at this time. Try using 'Process Now' "
-                        "to force immediate processing."
-                    )
+            if force_process:
+                messages.warning(
+                    request, 
+                    "No debits were processed. This could be because your goals have already "
+                    "been debited today. Try again tomorrow or manually add funds."
+                )
             else:
-                messages.info(request, "No automatic debits were due for processing at this time.")
-                
-    finally:
-        # Always restore the original function if we replaced it
-        timezone.now = original_now
-        
+                messages.info(
+                    request,
+                    "No automatic debits were due for processing at this time. Try using 'Process Now' "
+                    "to force immediate processing."
+                )
+        else:
+            messages.info(request, "No automatic debits were due for processing at this time.")
+    
     # Redirect back to the page they came from
     redirect_url = request.META.get('HTTP_REFERER', 'dashboard')
     return redirect(redirect_url)
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=ledger_etag)
 def savings_analytics(request):
     # Get all savings goals for this user
     goals = SavingsGoal.objects.filter(user=request.user).order_by('completed', 'target_date')
@@ -1100,17 +1142,19 @@ def savings_analytics(request):
         timeline_labels.append(next_date.strftime('%b %Y'))
         next_month = next_date
     
+    # Month-end balances for the past 6 months from the contribution ledger
+    past_month_starts = [
+        today.replace(day=1) - relativedelta(months=offset)
+        for offset in range(6, 0, -1)
+    ]
+    history = get_goal_balance_history(active_goals, past_month_starts, today)
+    
     # Create a dataset for each active goal
     for i, goal in enumerate(active_goals):
-        # Placeholder data - in a real app, you would query historical data
-        # For demonstration, we'll generate simulated growth data
-        starting_amount = float(goal.current_amount) * 0.6  # Simulated past value
         monthly_contribution = float(goal.monthly_contribution)
         
-        data = []
-        # Past 6 months (simulated)
-        for i in range(6):
-            data.append(round(starting_amount + (monthly_contribution * i), 2))
+        # Past 6 months (actual)
+        data = list(history[goal.id])
         
         # Current month (actual)
         data.append(float(goal.current_amount))
@@ -1212,6 +1256,8 @@ def get_color_for_index(index, alpha=1.0):
     return colors[index % len(colors)]
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=ledger_etag)
 def finance_insights(request):
     """View for comprehensive financial visualizations and insights"""
     from datetime import date, timedelta
@@ -1263,9 +1309,9 @@ def finance_insights(request):
         avg_goal_progress = 0
     
     # Calculate budget adherence (percentage of budgets under their limits)
-    budgets = Budget.objects.filter(user=request.user)
+    budgets = list(Budget.objects.filter(user=request.user).with_spent(today))
     on_track_budgets = sum(1 for budget in budgets if budget.spent <= budget.amount)
-    budget_adherence = (on_track_budgets / budgets.count() * 100) if budgets.count() > 0 else 0
+    budget_adherence = (on_track_budgets / len(budgets) * 100) if budgets else 0
     
     # Generate monthly labels and data for charts (past 6 months)
     monthly_labels = []
@@ -1302,9 +1348,9 @@ def finance_insights(request):
     
     # Get category breakdown data
     category_data = (
-        Expense.objects.filter(transaction__user=request.user)
+        Transaction.objects.filter(user=request.user, transaction_type='expense', expense_details__isnull=False)
         .values('category__name')
-        .annotate(total=Sum('transaction__amount'))
+        .annotate(total=Sum('amount'))
         .order_by('-total')
     )
     
@@ -1383,7 +1429,7 @@ def finance_insights(request):
             'description': 'Your expenses have increased significantly compared to last month. Review your spending patterns to identify areas for potential savings.'
         })
     
-    if not budgets.exists():
+    if not budgets:
         recommendations.append({
             'title': 'Set Up Budgets',
             'description': 'Creating budgets for different expense categories can help you better manage your spending and reach your financial goals.'
@@ -1403,9 +1449,9 @@ def finance_insights(request):
     
     # Get top spent category
     top_category = (
-        Expense.objects.filter(transaction__user=request.user)
+        Transaction.objects.filter(user=request.user, transaction_type='expense', expense_details__isnull=False)
         .values('category__name')
-        .annotate(total=Sum('transaction__amount'))
+        .annotate(total=Sum('amount'))
         .order_by('-total')
         .first()
     )
@@ -1574,65 +1620,123 @@ def delete_recurring_transaction(request, transaction_id):
 @login_required
 def mark_notification_read(request, notification_id):
     notification = get_object_or_404(TransactionNotification, id=notification_id, user=request.user)
-    notification.is_read = True
-    notification.save()
+    TransactionNotification.mark_read(request.user, ids=[notification.id])
     return JsonResponse({'status': 'success'})
 
 @login_required
-def check_transactions(request):
-    if request.method == 'POST':
-        processed_transactions = []
-        today = timezone.now().date()
-        current_time = timezone.now().time()
-        
-        # Get all active recurring transactions for today
-        transactions = RecurringTransaction.objects.filter(
-            user=request.user,
-            is_active=True,
-            day_of_month=today.day,
-            scheduled_time__lte=current_time
-        ).exclude(last_processed=today)
-        
-        for transaction in transactions:
-            try:
-                with transaction.atomic():
-                    # Create the transaction
-                    transaction_obj = Transaction.objects.create(
-                        user=transaction.user,
-                        amount=transaction.amount,
-                        description=f"Recurring {transaction.transaction_type}: {transaction.name}",
-                        date=today,
-                        transaction_type=transaction.transaction_type
-                    )
-                    
-                    # Create notification
-                    action_word = "credited" if transaction.transaction_type == "income" else "debited"
-                    TransactionNotification.objects.create(
-                        user=transaction.user,
-                        transaction=transaction_obj,
-                        message=f"Your {transaction.name} of ₹{transaction.amount} has been {action_word} to your account.",
-                        notification_type=transaction.transaction_type
-                    )
-                    
-                    # Update last processed date
-                    transaction.last_processed = today
-                    transaction.save()
-                    
-                    processed_transactions.append({
-                        'id': transaction.id,
-                        'name': transaction.name,
-                        'amount': str(transaction.amount),
-                        'type': transaction.transaction_type
-                    })
-            except Exception as e:
-                logger.error(f"Error processing transaction {transaction.name}: {str(e)}")
-        
-        return JsonResponse({
-            'status': 'success',
-            'processed_transactions': processed_transactions
-        })
+def mark_notifications_read(request):
+    """Mark all notifications, or just the posted ids, read in a single UPDATE"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
     
-    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body or '{}')
+        except json.JSONDecodeError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+        ids = payload.get('ids')
+    else:
+        ids = request.POST.getlist('ids') or None
+    
+    if ids is not None:
+        try:
+            ids = [int(notification_id) for notification_id in ids]
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid notification ids'}, status=400)
+    
+    updated = TransactionNotification.mark_read(request.user, ids=ids)
+    return JsonResponse({
+        'status': 'success',
+        'updated': updated,
+        'unread': TransactionNotification.unread_count(request.user),
+    })
+
+def _ledger_updates(user_id, last_notification_id):
+    """New notifications after last_notification_id plus current totals, for live updates"""
+    notifications = [
+        {
+            'id': notification.id,
+            'message': notification.message,
+            'notification_type': notification.notification_type,
+            'created_at': notification.created_at,
+        }
+        for notification in TransactionNotification.objects.filter(
+            user_id=user_id,
+            is_read=False,
+            id__gt=last_notification_id
+        ).select_related('transaction').order_by('id')[:20]
+    ]
+    totals = Transaction.objects.filter(user_id=user_id).aggregate(
+        income=Sum('amount', filter=Q(transaction_type='income')),
+        expenses=Sum('amount', filter=Q(transaction_type='expense'))
+    )
+    income = totals['income'] or 0
+    expenses = totals['expenses'] or 0
+    return {
+        'notifications': notifications,
+        'balance': {
+            'total_income': str(income),
+            'total_expenses': str(expenses),
+            'balance': str(income - expenses),
+        },
+    }
+
+def _sse_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder)}")
+    return "\n".join(lines) + "\n\n"
+
+async def _ledger_event_stream(user_id, last_notification_id, version):
+    """Yield SSE events whenever the user's data version changes"""
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 20)
+    max_duration = getattr(settings, 'SSE_MAX_DURATION_SECONDS', 300)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_duration
+    
+    yield "retry: 5000\n\n"
+    while loop.time() < deadline:
+        current = await aget_user_version(user_id)
+        if current != version:
+            version = current
+            updates = await sync_to_async(_ledger_updates)(user_id, last_notification_id)
+            for notification in updates['notifications']:
+                last_notification_id = notification['id']
+                yield _sse_event('notification', notification, event_id=last_notification_id)
+            yield _sse_event('balance', {**updates['balance'], 'version': version})
+            continue
+        
+        if not await wait_for_change(user_id, heartbeat):
+            yield ": keepalive\n\n"
+    # Clients reconnect automatically and resume from the last event id
+
+@login_required
+async def notification_stream(request):
+    """Server-Sent Events stream of new notifications and balance changes"""
+    user = await request.auser()
+    try:
+        last_notification_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_id') or 0)
+    except ValueError:
+        last_notification_id = 0
+    try:
+        version = int(request.GET.get('version') or 0)
+    except ValueError:
+        version = 0
+    
+    response = StreamingHttpResponse(
+        _ledger_event_stream(user.id, last_notification_id, version),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def notification_version(request):
+    """Cheap polling fallback: returns the user's data version straight from the cache"""
+    return JsonResponse({'version': get_user_version(request.user.id)})
 
 @login_required
 def community_view(request):
@@ -1665,8 +1769,11 @@ def community_view(request):
         ).order_by('-count')[:5]
         
         # Get most common expense categories
-        common_categories = ExpenseCategory.objects.values('name').annotate(
-            count=Count('name')
+        # Default categories are shared rows, so popularity is the number of users spending in each
+        common_categories = Transaction.objects.filter(category__isnull=False).values(
+            name=F('category__name')
+        ).annotate(
+            count=Count('user', distinct=True)
         ).order_by('-count')[:5]
         
         # Calculate user's savings rate
@@ -1743,10 +1850,14 @@ def manage_categories(request):
             name = request.POST.get('name', '').strip()
             if name:
                 # Check if category already exists for this user
-                if not ExpenseCategory.objects.filter(user=request.user, name=name).exists():
+                if not ExpenseCategory.objects.for_user(request.user).filter(name=name).exists():
+                    hidden_default = ExpenseCategory.objects.defaults().filter(name=name, hidden_by=request.user).first()
                     # Validate category name length
                     if len(name) > 100:
                         messages.error(request, 'Category name is too long. Maximum length is 100 characters.')
+                    elif hidden_default:
+                        hidden_default.hidden_by.remove(request.user)
+                        messages.success(request, f'Category "{name}" added successfully')
                     else:
                         ExpenseCategory.objects.create(
                             user=request.user,
@@ -1761,46 +1872,71 @@ def manage_categories(request):
             category_id = request.POST.get('category_id')
             if category_id:
                 try:
-                    category = ExpenseCategory.objects.get(id=category_id, user=request.user)
+                    category = ExpenseCategory.objects.for_user(request.user).get(id=category_id)
+                    if category.is_default:
+                        # Shared categories are only hidden from this user; past expenses keep them
+                        category.hidden_by.add(request.user)
+                        messages.success(request, f'Category "{category.name}" deleted successfully')
                     # Check if category has any associated expenses
-                    if Expense.objects.filter(category=category).exists():
-                        messages.error(request, f'Cannot delete "{category.name}" as it has associated expenses')
+                    elif Expense.objects.filter(category=category).exists():
+                        messages.error(request, f'Cannot delete "{category.name}" as it has associated expenses. Merge it into another category instead.')
                     else:
                         category.delete()
                         messages.success(request, f'Category "{category.name}" deleted successfully')
                 except ExpenseCategory.DoesNotExist:
                     messages.error(request, 'Category not found')
+        elif action == 'merge':
+            categories = ExpenseCategory.objects.for_user(request.user)
+            try:
+                source = categories.get(id=request.POST.get('source_id'))
+                target = categories.get(id=request.POST.get('target_id'))
+                moved = merge_categories(request.user, source, target)
+                messages.success(request, f'Merged "{source.name}" into "{target.name}" ({moved} expenses moved)')
+            except (ExpenseCategory.DoesNotExist, ValueError):
+                messages.error(request, 'Please choose two different categories to merge')
+        elif action == 'add_rule':
+            try:
+                category = ExpenseCategory.objects.for_user(request.user).get(id=request.POST.get('category_id'))
+                min_amount = request.POST.get('min_amount') or None
+                max_amount = request.POST.get('max_amount') or None
+                rule = CategoryRule(
+                    user=request.user,
+                    category=category,
+                    description_contains=request.POST.get('description_contains', '').strip()[:100],
+                    min_amount=Decimal(min_amount) if min_amount else None,
+                    max_amount=Decimal(max_amount) if max_amount else None,
+                    priority=int(request.POST.get('priority') or 0)
+                )
+                if not (rule.description_contains or rule.min_amount is not None or rule.max_amount is not None):
+                    messages.error(request, 'A rule needs a description or an amount to match')
+                else:
+                    rule.save()
+                    messages.success(request, f'Rule added: {rule}')
+            except ExpenseCategory.DoesNotExist:
+                messages.error(request, 'Category not found')
+            except (ValueError, decimal.InvalidOperation):
+                messages.error(request, 'Please enter valid amounts and priority')
+        elif action == 'delete_rule':
+            CategoryRule.objects.filter(user=request.user, id=request.POST.get('rule_id')).delete()
+            messages.success(request, 'Rule removed')
+        elif action == 'apply_rules':
+            results = apply_rules(request.user)
+            messages.success(request, f'Rules applied to {sum(moved for _, moved in results)} past expenses')
     
     # Get all categories for the current user
-    user_categories = ExpenseCategory.objects.filter(user=request.user).order_by('name')
-    
-    # Define default categories
-    default_categories = [
-        'Food & Dining',
-        'Transportation',
-        'Housing',
-        'Entertainment',
-        'Utilities',
-        'Healthcare',
-        'Education',
-        'Shopping',
-        'Personal Care',
-        'Gifts & Donations',
-        'Travel',
-        'Insurance',
-        'Investments',
-        'Debt Payments',
-        'Other'
-    ]
+    user_categories = get_user_categories(request.user.id)
+    
+    default_categories = list(ExpenseCategory.objects.defaults().order_by('name').values_list('name', flat=True))
     
     # Filter out default categories that the user already has
-    existing_category_names = set(user_categories.values_list('name', flat=True))
+    existing_category_names = {category.name for category in user_categories}
     suggested_categories = [cat for cat in default_categories if cat not in existing_category_names]
     
     context = {
         'user_categories': user_categories,
         'suggested_categories': suggested_categories,
-        'default_categories': default_categories
+        'default_categories': default_categories,
+        'category_rules': CategoryRule.objects.filter(user=request.user).select_related('category')
     }
     
     return render(request, 'tracker/manage_categories.html', context)